@@ -5,11 +5,14 @@ Created on 2015/01/25
 @author: samuraitaiga
 '''
 from __future__ import absolute_import, division
+import logging
 import os
+import uuid
+from metatrader import instrument
 from metatrader.mt5 import get_mt5
 from metatrader.mt5 import DEFAULT_MT5_NAME
 from metatrader.report import BacktestReport
-from metatrader.report import OptimizationReport
+from metatrader.report import read_optimization_report
 
 try:
     from builtins import str
@@ -20,12 +23,37 @@ except ImportError:
 finally:
     from builtins import str
 
+# Model in config file
+MODEL_EVERY_TICK = 0
+MODEL_OHLC_M1 = 1
+MODEL_OPEN_PRICES = 2
+MODEL_MATH = 3
+MODEL_REAL_TICKS = 4
+
+# Optimization in config file
+OPTIMIZATION_DISABLED = 0
+OPTIMIZATION_SLOW_COMPLETE = 1
+OPTIMIZATION_FAST_GENETIC = 2
+OPTIMIZATION_ALL_SYMBOLS = 3
+
+# OptimizationCriterion in config file
+CRITERION_BALANCE_MAX = 0
+CRITERION_BALANCE_PROFIT_FACTOR = 1
+CRITERION_BALANCE_EXPECTED_PAYOFF = 2
+CRITERION_BALANCE_DRAWDOWN = 3
+CRITERION_BALANCE_RECOVERY_FACTOR = 4
+CRITERION_BALANCE_SHARPE_RATIO = 5
+CRITERION_CUSTOM = 6
+CRITERION_COMPLEX = 7
+
 
 class BackTest(object):
     """
     Attributes:
       ea_name(string): ea name
       param(dict): ea parameter
+        e.g.: {'MovingPeriod': {'type': 'int', 'value': 12, 'max': 48, 'interval': 4}}
+        type is one of bool, int and double. max and interval are used in optimization
       account_login(int): backtest account login
       symbol(string): currency symbol. e.g.: USDJPY
       from_date(datetime.datetime): backtest from date
@@ -39,15 +67,36 @@ class BackTest(object):
         3 - Math calculations
         4 - Every tick based on real ticks
       optimization(bool): optimization flag. optimization is enabled if True
+      optimization_mode(int): algorithm of optimize
+        1 - Slow complete algorithm
+        2 - Fast genetic based algorithm
+        3 - All symbols selected in Market Watch
+      optimization_criterion(int): criterion of optimize
+        0 - Maximum balance
+        1 - Balance * Profit factor
+        2 - Balance * Expected payoff
+        3 - (100% - Drawdown) * Balance
+        4 - Balance * Recovery factor
+        5 - Balance * Sharpe ratio
+        6 - Custom criterion from OnTester
+        7 - Complex criterion
       replace_report(bool): replace report flag. replace report is enabled if True
       visual:
         0: Disabled
         1: Enabled
+      work_dir(string): dir to write .ini file, e.g. on tmpfs/RAM disk.
+        Tester dir of terminal is used if None
+      cleanup(bool): remove .ini, .set and read report after each run if True.
+        report is kept if read_report is False
+      run_id(string): unique id of the last run. None before first run
+      run_name(string): name of .ini, .set and report of the last run. <ea_name>_<run_id>
 
     """
 
     def __init__(self, ea_name, param, account_login, symbol, period, from_date, to_date, deposit, deposit_currency, leverage,
-                    model = 4, replace_report = True, read_report = True, portable_mode = True, visual = 0):
+                    model = 4, replace_report = True, read_report = True, portable_mode = True, visual = 0,
+                    work_dir = None, cleanup = True,
+                    optimization_mode = OPTIMIZATION_SLOW_COMPLETE, optimization_criterion = CRITERION_BALANCE_MAX):
         self.ea_full_path = ea_name
         self.ea_path, self.ea_name = os.path.split(ea_name)
         self.param = param
@@ -64,15 +113,31 @@ class BackTest(object):
         self.read_report = read_report
         self.portable_mode = portable_mode
         self.optimization = False
+        self.optimization_mode = optimization_mode
+        self.optimization_criterion = optimization_criterion
         self.visual = visual
+        self.work_dir = work_dir
+        self.cleanup = cleanup
+        self.run_id = None
+        self.run_name = self.ea_name
+
+    def _new_run(self):
+        """
+        Notes:
+          give this run a unique id. .ini, .set and report are named after it,
+          so runs of the same ea don't overwrite each other's files in a shared data dir.
+        """
+        self.run_id = uuid.uuid4().hex[:16]
+        self.run_name = '%s_%s' % (self.ea_name, self.run_id)
 
     def _prepare(self, alias=DEFAULT_MT5_NAME):
         """
         Notes:
           create backtest config file and parameter file
         """
-        self._create_conf(alias=alias)
-        self._create_param(alias=alias)
+        with instrument.phase(instrument.PHASE_PREPARE):
+            self._create_conf(alias=alias)
+            self._create_param(alias=alias)
 
     def _create_conf(self, alias=DEFAULT_MT5_NAME):
         """
@@ -138,70 +203,86 @@ class BackTest(object):
                 Visual=1
         """
 
-        mt5 = get_mt5(alias = alias, portable_mode = self.portable_mode)
-        #print ('_create_conf, self.portable_mode: %r, mt5.appdata_path: %s' % (self.portable_mode, mt5.appdata_path))
-        conf_file = os.path.join(mt5.appdata_path, 'Tester', '%s.ini' % self.ea_name)
+        conf_file = self._get_ini_abs_path(alias = alias, portable_mode = self.portable_mode)
+
+        with open(conf_file, 'w') as fp:
+            fp.write(self._get_conf())
+
+    def _get_conf(self, run_name=None):
+        """
+        Args:
+          run_name(string): name of .set file and report. run_name of the last run is used if None
+        Returns:
+          conf(string): content of config file(.ini) written by _create_conf
+        """
+        if run_name is None:
+            run_name = self.run_name
 
         # shutdown_terminal must be True.
         # If false, popen don't end and backtest report analyze don't start.
         shutdown_terminal = True
 
-        with open(conf_file, 'w') as fp:
-            fp.write('[Common]\n')
-            fp.write('Login=%s\n' % str(self.account_login))
-            fp.write('ProxyEnable=0\n')
-            fp.write('ProxyType=0\n')
-            fp.write('ProxyAddress=192.168.0.1:3128\n')
-            fp.write('ProxyLogin=10\n')
-            fp.write('ProxyPassword=10\n')
-            fp.write('KeepPrivate=1\n')
-            fp.write('NewsEnable=0\n')
-            fp.write('CertInstall=1\n')
-            fp.write('\n')
-            fp.write('[Tester]\n')
-            fp.write(';--- The Expert Advisor is located in platform_data_directory\MQL5\Experts\n')
-            fp.write('Expert=%s\n' % self.ea_full_path)
-            fp.write(';--- The Expert Advisor parameters are available in platform_installation_directory\MQL5\Profiles\Tester\\n')
-            fp.write('ExpertParameters=%s.set\n' % self.ea_name)
-            fp.write(';--- The symbol for testing/optimization\n')
-            fp.write('Symbol=%s\n' % self.symbol)
-            fp.write(';--- The timeframe for testing/optimization\n')
-            fp.write('Period=%s\n' % self.period)
-            fp.write(';--- Emulated account number\n')
-            fp.write('Login=%s\n' % str(self.account_login))
-            fp.write(';--- Initial deposit\n')
-            fp.write('Deposit=%s\n' % str(self.deposit))
-            fp.write(';--- Deposit Currency\n')
-            fp.write('Currency=%s\n' % str(self.deposit_currency))
-            fp.write(';--- Leverage for testing\n')
-            fp.write('Leverage=1:%s\n' % str(self.leverage))
-            fp.write(';--- 0 = The "All Ticks" mode\n')
-            fp.write('Model=%s\n' % self.model)
-            fp.write(';--- 0 = Execution of trade orders without any delay\n')
-            fp.write('ExecutionMode=0\n')
-            fp.write(';--- 0: No optimization\n')
-            fp.write(';--- 1: Slow optimization\n')
-            int_optimization = 0
-            if self.optimization == True:
-                int_optimization = 1
-            fp.write('Optimization=%d\n' % int_optimization)
-            fp.write(';--- Optimization criterion - Maximum balance value\n')
-            fp.write('OptimizationCriterion=0\n')
-            fp.write(';--- Dates of beginning and end of the testing range\n')
-            fp.write('FromDate=%s\n' % self.from_date.strftime('%Y.%m.%d'))
-            fp.write('ToDate=%s\n' % self.to_date.strftime('%Y.%m.%d'))
-            fp.write(';--- 0 = No forward testing\n')
-            fp.write('ForwardMode=0\n')
-            fp.write(';--- Start date of forward testing\n')
-            fp.write('ForwardDate=%s\n' % self.to_date.strftime('%Y.%m.%d'))
-            fp.write(';--- A file with a report will be saved to the folder platform_installation_directory\n')
-            fp.write('Report=%s\n' % self.ea_name)
-            fp.write(';--- If the specified report already exists, it will be overwritten\n')
-            fp.write('ReplaceReport=%s\n' % str(self.replace_report).lower())
-            fp.write(';--- Set automatic platform shutdown upon completion of testing/optimization\n')
-            fp.write('ShutdownTerminal=%s\n' % str(shutdown_terminal).lower())
-            fp.write(';;--- Enable (1) or Disable (0) the visual test mode. If the parameter is not specified, the current setting is used.\n')
-            fp.write('Visual=%s\n' % self.visual)
+        lines = []
+        write = lines.append
+        write('[Common]\n')
+        write('Login=%s\n' % str(self.account_login))
+        write('ProxyEnable=0\n')
+        write('ProxyType=0\n')
+        write('ProxyAddress=192.168.0.1:3128\n')
+        write('ProxyLogin=10\n')
+        write('ProxyPassword=10\n')
+        write('KeepPrivate=1\n')
+        write('NewsEnable=0\n')
+        write('CertInstall=1\n')
+        write('\n')
+        write('[Tester]\n')
+        write(';--- The Expert Advisor is located in platform_data_directory\MQL5\Experts\n')
+        write('Expert=%s\n' % self.ea_full_path)
+        write(';--- The Expert Advisor parameters are available in platform_installation_directory\MQL5\Profiles\Tester\\\n')
+        write('ExpertParameters=%s.set\n' % run_name)
+        write(';--- The symbol for testing/optimization\n')
+        write('Symbol=%s\n' % self.symbol)
+        write(';--- The timeframe for testing/optimization\n')
+        write('Period=%s\n' % self.period)
+        write(';--- Emulated account number\n')
+        write('Login=%s\n' % str(self.account_login))
+        write(';--- Initial deposit\n')
+        write('Deposit=%s\n' % str(self.deposit))
+        write(';--- Deposit Currency\n')
+        write('Currency=%s\n' % str(self.deposit_currency))
+        write(';--- Leverage for testing\n')
+        write('Leverage=1:%s\n' % str(self.leverage))
+        write(';--- 0 = The "All Ticks" mode\n')
+        write('Model=%s\n' % self.model)
+        write(';--- 0 = Execution of trade orders without any delay\n')
+        write('ExecutionMode=0\n')
+        write(';--- 0: No optimization\n')
+        write(';--- 1: Slow complete algorithm\n')
+        write(';--- 2: Fast genetic based algorithm\n')
+        write(';--- 3: All symbols selected in Market Watch\n')
+        int_optimization = OPTIMIZATION_DISABLED
+        if self.optimization == True:
+            int_optimization = self.optimization_mode
+        write('Optimization=%d\n' % int_optimization)
+        write(';--- Optimization criterion. 0 = Maximum balance value\n')
+        write('OptimizationCriterion=%d\n' % self.optimization_criterion)
+        write(';--- Dates of beginning and end of the testing range\n')
+        write('FromDate=%s\n' % self.from_date.strftime('%Y.%m.%d'))
+        write('ToDate=%s\n' % self.to_date.strftime('%Y.%m.%d'))
+        write(';--- 0 = No forward testing\n')
+        write('ForwardMode=0\n')
+        write(';--- Start date of forward testing\n')
+        write('ForwardDate=%s\n' % self.to_date.strftime('%Y.%m.%d'))
+        write(';--- A file with a report will be saved to the folder platform_installation_directory\n')
+        write('Report=%s\n' % run_name)
+        write(';--- If the specified report already exists, it will be overwritten\n')
+        write('ReplaceReport=%s\n' % str(self.replace_report).lower())
+        write(';--- Set automatic platform shutdown upon completion of testing/optimization\n')
+        write('ShutdownTerminal=%s\n' % str(shutdown_terminal).lower())
+        write(';;--- Enable (1) or Disable (0) the visual test mode. If the parameter is not specified, the current setting is used.\n')
+        write('Visual=%s\n' % self.visual)
+
+        return ''.join(lines)
 
     def _create_param(self, alias=DEFAULT_MT5_NAME):
         """
@@ -213,88 +294,191 @@ class BackTest(object):
         Args:
           ea_name(string): ea name
         """
-        mt5 = get_mt5(alias = alias, portable_mode = self.portable_mode)
-        #print ('_create_param, self.portable_mode: %r, mt5.appdata_path: %s' % (self.portable_mode, mt5.appdata_path))
-        param_file = os.path.join(mt5.appdata_path, 'MQL5', 'Profiles', 'Tester', '%s.set' % self.ea_name)
+        param_file = self._get_set_abs_path(alias = alias)
 
         with open(param_file, 'w') as fp:
-            for k in self.param:
-                values = self.param[k].copy()
-                data_type = values.pop('type')
-                value = values.pop('value')
-
-                # Populate value based on data type
-                if data_type == 'bool':
-                    if bool(value) == False:
-                        fp.write('%s=false||' % (k))
-                    else:
-                        fp.write('%s=true||' % (k))
-                elif data_type == 'int':
-                    fp.write('%s=%s||' % (k, value))
+            fp.write(self._get_param())
+
+    def _get_param(self):
+        """
+        Returns:
+          param(string): content of ea parameter file(.set) written by _create_param
+        """
+        lines = []
+        write = lines.append
+
+        for k in self.param:
+            values = self.param[k].copy()
+            data_type = values.pop('type')
+            value = values.pop('value')
+
+            # Populate value based on data type
+            if data_type == 'bool':
+                if bool(value) == False:
+                    write('%s=false||' % (k))
                 else:
-                    raise ('Unexpected data type of %s!' % (data_type))
+                    write('%s=true||' % (k))
+            elif data_type in ('int', 'double'):
+                write('%s=%s||' % (k, value))
+            else:
+                raise ValueError('Unexpected data type of %s!' % (data_type))
 
-                if self.optimization:
-                    if values.has_key('max') and values.has_key('interval'):
-                        interval = values.pop('interval')
-                        maximum = values.pop('max')
-                        fp.write('%s||%s||%s||Y\n' % (value, interval, maximum))
+            if self.optimization:
+                if 'max' in values and 'interval' in values:
+                    interval = values.pop('interval')
+                    maximum = values.pop('max')
+                    write('%s||%s||%s||Y\n' % (value, interval, maximum))
+                else:
+                    # if this value won't be optimized, write unused dummy data for same format.
+                    if data_type == 'bool':
+                        write('false||0||true||N\n')
                     else:
-                        # if this value won't be optimized, write unused dummy data for same format.
-                        if data_type == 'bool':
-                            fp.write('false||0||true||N\n')
-                        else:
-                            fp.write('0||0||0||N\n')
+                        write('0||0||0||N\n')
+            else:
+                if type(value) == str:
+                    # this ea arg is string, skip items
+                    pass
                 else:
-                    if type(value) == str:
-                        # this ea arg is string, skip items
-                        pass
+                    # write unused dummy data for same format.
+                    if data_type == 'bool':
+                        write('false||0||true||N\n')
                     else:
-                        # write unused dummy data for same format.
-                        if data_type == 'bool':
-                            fp.write('false||0||true||N\n')
-                        else:
-                            fp.write('0||0||0||N\n')
+                        write('0||0||0||N\n')
+
+        return ''.join(lines)
 
     def _get_ini_abs_path(self, alias=DEFAULT_MT5_NAME, portable_mode = False):
+        if self.work_dir is not None:
+            return os.path.join(self.work_dir, '%s.ini' % self.run_name)
+
         mt5 = get_mt5(alias = alias, portable_mode = portable_mode)
         #print ('_get_ini_abs_path, portable_mode: %r, mt5.appdata_path: %s' % (portable_mode, mt5.appdata_path))
-        conf_file = os.path.join(mt5.appdata_path, 'Tester', '%s.ini' % self.ea_name)
+        conf_file = os.path.join(mt5.appdata_path, 'Tester', '%s.ini' % self.run_name)
         return conf_file
 
-    def run(self, alias=DEFAULT_MT5_NAME):
+    def _get_set_abs_path(self, alias=DEFAULT_MT5_NAME):
+        # terminal reads .set only from MQL5\Profiles\Tester of its data dir
+        mt5 = get_mt5(alias = alias, portable_mode = self.portable_mode)
+        return os.path.join(mt5.appdata_path, 'MQL5', 'Profiles', 'Tester', '%s.set' % self.run_name)
+
+    def _get_cache_key(self, alias=DEFAULT_MT5_NAME):
         """
-        Notes:
-          run backtest
+        Returns:
+          key(string): hash of .ini, .set and compiled ea which identifies this backtest.
+            None if compiled ea is not found, then the backtest is not cached
         """
-        self.optimization = False
-        ret = None
-
-        self._prepare(alias=alias)
-        bt_ini = self._get_ini_abs_path(alias = alias, portable_mode = self.portable_mode)
+        from metatrader.cache import make_key, file_hash
 
         mt5 = get_mt5(alias = alias, portable_mode = self.portable_mode)
-        #print ('run, self.portable_mode: %r, mt5.appdata_path: %s, bt_ini: %s' % (self.portable_mode, mt5.appdata_path, bt_ini))
-        mt5.run(self.ea_name, conf=bt_ini, portable_mode = self.portable_mode)
+        ea_file = os.path.join(mt5.appdata_path, 'MQL5', 'Experts', '%s.ex5' % self.ea_full_path)
+        ea_hash = file_hash(ea_file)
+        if ea_hash is None:
+            logging.warning('%s is not found, report cache is not used' % ea_file)
+            return None
+        report_type = 'optimization' if self.optimization else 'backtest'
+        # run id is left out, it differs on every run
+        return make_key(report_type, self._get_conf(run_name=self.ea_name), self._get_param(), ea_hash)
+
+    def _cleanup(self, alias=DEFAULT_MT5_NAME):
+        """
+        Notes:
+          remove .ini and .set of the last run, and its report(with charts) if it was read.
+        """
+        paths = [self._get_ini_abs_path(alias = alias, portable_mode = self.portable_mode),
+                 self._get_set_abs_path(alias = alias)]
 
         if self.read_report == True:
-            ret = BacktestReport(self)
-        return ret
+            mt5 = get_mt5(alias = alias, portable_mode = self.portable_mode)
+            for name in os.listdir(mt5.appdata_path):
+                if name.startswith(self.run_name):
+                    paths.append(os.path.join(mt5.appdata_path, name))
 
-    def optimize(self, alias=DEFAULT_MT5_NAME):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _launch(self, report_class, alias=DEFAULT_MT5_NAME, cache=None):
         """
+        Notes:
+          run terminal with newly created .ini and .set, and read report.
+        Args:
+          report_class(callable): called as report_class(backtest, alias=alias) to read report
         """
-        self.optimization = True
         ret = None
-        self._prepare(alias=alias)
-        bt_ini = self._get_ini_abs_path(alias = alias, portable_mode = self.portable_mode)
 
+        cache_key = None
+        if cache is not None and self.read_report == True:
+            cache_key = self._get_cache_key(alias=alias)
+            if cache_key is not None:
+                ret = cache.get(cache_key)
+                if ret is not None:
+                    return ret
+
+        self._new_run()
+        try:
+            with instrument.context(ea_name=self.ea_name, run_id=self.run_id, alias=alias,
+                                    optimization=self.optimization):
+                self._prepare(alias=alias)
+                bt_ini = self._get_ini_abs_path(alias = alias, portable_mode = self.portable_mode)
+
+                mt5 = get_mt5(alias = alias, portable_mode = self.portable_mode)
+                #print ('run, self.portable_mode: %r, mt5.appdata_path: %s, bt_ini: %s' % (self.portable_mode, mt5.appdata_path, bt_ini))
+                mt5.run(self.ea_name, conf=bt_ini, portable_mode = self.portable_mode)
+
+                if self.read_report == True:
+                    with instrument.phase(instrument.PHASE_REPORT, report_bytes=self._get_report_size(alias)):
+                        ret = report_class(self, alias=alias)
+                    if cache_key is not None:
+                        cache.put(cache_key, ret)
+        finally:
+            if self.cleanup == True:
+                self._cleanup(alias=alias)
+        return ret
+
+    def _get_report_size(self, alias=DEFAULT_MT5_NAME):
+        """
+        Returns:
+          size(int): bytes of report of the last run. None if not found
+        """
         mt5 = get_mt5(alias = alias, portable_mode = self.portable_mode)
-        #print ('optimize, self.portable_mode: %r, mt5.appdata_path: %s, bt_ini: %s' % (self.portable_mode, mt5.appdata_path, bt_ini))
-        mt5.run(self.ea_name, conf=bt_ini, portable_mode = self.portable_mode)
+        for ext in ('xml', 'htm', 'html'):
+            report_file = os.path.join(mt5.appdata_path, '%s.%s' % (self.run_name, ext))
+            if os.path.isfile(report_file):
+                return os.path.getsize(report_file)
+        return None
 
-        if self.read_report == True:
-            ret = OptimizationReport(self)
+    def run(self, alias=DEFAULT_MT5_NAME, cache=None, store=None):
+        """
+        Notes:
+          run backtest
+        Args:
+          alias(string): mt5 alias to run backtest
+          cache(metatrader.cache.ReportCache): report is taken from cache without running terminal
+            if identical backtest was run before. not used if read_report is False
+          store(metatrader.store.PassStore): result is stored as a pass if not None
+        """
+        self.optimization = False
+        ret = self._launch(BacktestReport, alias=alias, cache=cache)
+        if store is not None and ret is not None:
+            store.put(self, ret)
+        return ret
+
+    def optimize(self, alias=DEFAULT_MT5_NAME, cache=None, store=None):
+        """
+        Notes:
+          run optimization
+        Args:
+          alias(string): mt5 alias to run optimization
+          cache(metatrader.cache.ReportCache): report is taken from cache without running terminal
+            if identical optimization was run before. not used if read_report is False
+          store(metatrader.store.PassStore): every pass is stored if not None
+        """
+        self.optimization = True
+        ret = self._launch(read_optimization_report, alias=alias, cache=cache)
+        if store is not None and ret is not None:
+            store.put_results(self, ret.results)
         return ret
 
 
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  on-disk cache of parsed reports.
+  key is the hash of everything which decides the result of a backtest:
+  content of .ini and .set files and the compiled ea binary.
+  so an identical backtest is answered from the cache without running the terminal.
+"""
+from __future__ import absolute_import
+import hashlib
+import logging
+import os
+import pickle
+import threading
+
+# default max size of cache dir
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+CACHE_EXT = '.pickle'
+
+
+def make_key(*contents):
+    """
+    Args:
+      contents(string): contents which identify a backtest
+    Returns:
+      key(string): sha256 hex digest of contents
+    """
+    sha = hashlib.sha256()
+    for content in contents:
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        # length prefix keeps ('ab', 'c') and ('a', 'bc') apart
+        sha.update(str(len(content)).encode('ascii') + b':' + content)
+    return sha.hexdigest()
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Returns:
+      hash(string): sha256 hex digest of file content. None if file does not exist
+    """
+    if not os.path.isfile(path):
+        return None
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        while True:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ReportCache(object):
+    """
+    Notes:
+      reports are pickled into cache_dir as <key>.pickle.
+      least recently used entries are evicted when total size exceeds max_bytes.
+      total size is kept as a running sum after the first scan of cache_dir, and cache_dir is scanned
+      again only to evict. so entries put by other processes are counted at the next eviction.
+      one cache can be shared by threads, e.g. by BacktestFarm workers.
+    Attributes:
+      cache_dir(string): abs path of cache dir
+      max_bytes(int): max total size of cached reports
+      hits(int): num of reports answered from cache
+      misses(int): num of lookups not in cache
+      evictions(int): num of evicted reports
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # total size of entries, None until cache_dir is scanned
+        self._bytes = None
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXT)
+
+    def get(self, key):
+        """
+        Returns:
+          report(object): cached report. None if not cached
+        """
+        path = self._path(key)
+        report = None
+        try:
+            with open(path, 'rb') as fp:
+                report = pickle.load(fp)
+            # mtime is the last access time for LRU eviction
+            os.utime(path, None)
+        except (IOError, OSError):
+            pass
+        except Exception as e:
+            logging.warning('broken cache entry %s is ignored: %s', path, e)
+
+        with self._lock:
+            if report is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return report
+
+    def put(self, key, report):
+        """
+        Notes:
+          store report and evict old entries if cache is full.
+          failure to store is logged and never raised, the report is just not cached.
+        """
+        path = self._path(key)
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.current_thread().ident)
+        try:
+            with open(tmp_path, 'wb') as fp:
+                pickle.dump(report, fp, pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                # another thread may put the same key, the last one wins
+                os.replace(tmp_path, path)
+                if self._bytes is not None:
+                    self._bytes += size - old_size
+        except Exception as e:
+            logging.warning('report is not cached to %s: %s', path, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        if self._bytes is None or self._bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Notes:
+          remove least recently used entries until total size is not more than max_bytes.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(CACHE_EXT):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except OSError:
+                    pass
+                total -= size
+            self._bytes = total
+
+    def clear(self):
+        """
+        Notes:
+          remove every cached report.
+        """
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(CACHE_EXT):
+                    os.remove(os.path.join(self.cache_dir, name))
+            self._bytes = 0
+
+    @property
+    def stats(self):
+        """
+        Returns:
+          stats(dict): hits, misses, evictions, hit_rate, entries and bytes of cache
+        """
+        entries = 0
+        size = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_EXT):
+                try:
+                    size += os.path.getsize(os.path.join(self.cache_dir, name))
+                    entries += 1
+                except OSError:
+                    # evicted by another thread
+                    pass
+
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / float(lookups) if lookups else 0.0,
+                'entries': entries,
+                'bytes': size}
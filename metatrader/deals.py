@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  deals table of backtest report as numpy arrays.
+  the table is found by its header row, and rows are collected as texts while the report
+  is parsed, then every column is decoded at once into a typed array.
+"""
+from __future__ import absolute_import
+import numpy as np
+
+# attribute name, column title in report and dtype
+DEAL_COLUMNS = (('time', 'Time', 'datetime64[s]'),
+                ('type', 'Type', np.str_),
+                ('direction', 'Direction', np.str_),
+                ('volume', 'Volume', np.float64),
+                ('price', 'Price', np.float64),
+                ('commission', 'Commission', np.float64),
+                ('swap', 'Swap', np.float64),
+                ('profit', 'Profit', np.float64),
+                ('balance', 'Balance', np.float64))
+
+# header row of deals table has these titles at least
+REQUIRED_TITLES = ('Time', 'Type', 'Profit', 'Balance')
+
+
+def _to_float_array(texts):
+    # mt5 writes thousands separated by space, e.g. 10 000.00. empty cell is nan
+    try:
+        return np.array(texts, dtype=np.float64)
+    except ValueError:
+        values = []
+        for text in texts:
+            text = text.replace(' ', '').replace('\xa0', '')
+            values.append(float(text) if text else np.nan)
+        return np.array(values, dtype=np.float64)
+
+
+def _to_time_array(texts):
+    # e.g.: 2018.01.02 03:04:05 -> 2018-01-02T03:04:05
+    return np.array([text.strip().replace('.', '-').replace(' ', 'T') or 'NaT' for text in texts],
+                    dtype='datetime64[s]')
+
+
+class DealTable(object):
+    """
+    Notes:
+      deals of backtest in time order. every attribute is a numpy array of the same length.
+      e.g.:
+        deals = report.deals
+        closed = deals.direction == 'out'
+        returns = np.diff(deals.balance[closed])
+    Attributes:
+      time(numpy.ndarray): datetime64[s] time of deal
+      type(numpy.ndarray): buy, sell or balance
+      direction(numpy.ndarray): in, out or empty for balance
+      volume(numpy.ndarray): lots
+      price(numpy.ndarray): deal price
+      commission(numpy.ndarray): commission
+      swap(numpy.ndarray): swap
+      profit(numpy.ndarray): profit
+      balance(numpy.ndarray): balance after deal
+    """
+
+    def __init__(self, columns):
+        for name, _, _ in DEAL_COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def from_texts(cls, texts):
+        """
+        Args:
+          texts(dict(string:list(string))): cell texts of each column. missing column becomes empty
+        """
+        size = max([len(values) for values in texts.values()] or [0])
+        columns = {}
+        for name, _, dtype in DEAL_COLUMNS:
+            values = texts.get(name)
+            if values is None:
+                values = [''] * size
+            if dtype == 'datetime64[s]':
+                columns[name] = _to_time_array(values)
+            elif dtype == np.float64:
+                columns[name] = _to_float_array(values)
+            else:
+                columns[name] = np.array([v.strip() for v in values], dtype=dtype)
+        return cls(columns)
+
+
+class DealTableBuilder(object):
+    """
+    Notes:
+      row handler of metatrader.parser.ReportParser.
+      after the header row of deals table is seen, rows with the same num of cells are kept
+      as texts of each column and not stored in the parsed tables.
+    """
+
+    def __init__(self):
+        self._indices = None
+        self._width = None
+        self._texts = None
+
+    def __call__(self, table_index, row):
+        """
+        Returns:
+          consumed(bool): True if row is a deal or the deals header
+        """
+        if self._texts is not None and len(row) == self._width:
+            for name, index in self._indices:
+                self._texts[name].append(row[index].text)
+            return True
+
+        titles = [cell.text.strip() for cell in row]
+        if all(title in titles for title in REQUIRED_TITLES):
+            self._width = len(row)
+            self._indices = [(name, titles.index(title)) for name, title, _ in DEAL_COLUMNS if title in titles]
+            self._texts = dict((name, []) for name, _ in self._indices)
+            return True
+
+        if self._texts is not None:
+            # end of deals table, e.g. a footer row
+            self._width = None
+        return False
+
+    def build(self):
+        """
+        Returns:
+          deals(DealTable): deals seen so far. empty if report has no deals table
+        """
+        return DealTable.from_texts(self._texts or {})
+
+
+def read_deals(html):
+    """
+    Notes:
+      decode deals table of a part of report.
+    Args:
+      html(string): html which contains the deals table
+    Returns:
+      deals(DealTable): deals table
+    """
+    from metatrader.parser import ReportParser
+
+    builder = DealTableBuilder()
+    document = ReportParser(row_handler=builder)
+    document.feed(html)
+    document.close()
+    return builder.build()
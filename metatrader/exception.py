@@ -17,4 +17,20 @@ class InvalidReportFormat(Exception):
         self.err_msg = err_msg
     
     def __str__(self):
-        return '%s seems invalid format. %s not found' % (self.report_file, self.err_msg)
\ No newline at end of file
+        return '%s seems invalid format. %s not found' % (self.report_file, self.err_msg)
+
+
+class TerminalTimeout(RuntimeError):
+    '''
+    exception when terminal does not exit in time
+    '''
+
+    def __init__(self, cmd, timeout):
+        '''
+        Constructor
+        '''
+        self.cmd = cmd
+        self.timeout = timeout
+
+    def __str__(self):
+        return 'terminal with cmd[%s] did not exit in %s seconds. killed' % (self.cmd, self.timeout)
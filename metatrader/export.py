@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  streaming export of backtest results to csv, parquet or arrow.
+  results are turned into flat records and written in batches of batch_size rows,
+  so an optimization report of any size is exported with flat memory.
+  parquet and arrow need pyarrow, csv needs nothing.
+  columns are fixed by the first batch. ea params are columns prefixed by param_.
+
+  e.g.:
+    export_optimization(backtest, 'passes.parquet')
+    export([backtest.run() for backtest in backtests], 'runs.csv')
+    table = read_arrow('passes.arrow')
+"""
+from __future__ import absolute_import
+import csv
+import logging
+import os
+
+from metatrader.mt5 import DEFAULT_MT5_NAME
+from metatrader.store import RESULT_FIELDS
+
+PARAM_PREFIX = 'param_'
+DEFAULT_BATCH_SIZE = 10000
+
+# test conditions of each result
+CONDITION_FIELDS = ('ea_name', 'symbol', 'from_date', 'to_date', 'model')
+DEFAULT_FIELDS = ('initial_deposit',) + tuple(name for name, _ in RESULT_FIELDS) + ('pass_number',)
+
+# arrow type of known columns, so a column which is None in the whole first batch is still typed
+ARROW_TYPES = dict([('ea_name', 'string'),
+                    ('symbol', 'string'),
+                    ('from_date', 'timestamp[us]'),
+                    ('to_date', 'timestamp[us]'),
+                    ('model', 'int64'),
+                    ('initial_deposit', 'double'),
+                    ('pass_number', 'int64')] +
+                   [(name, {'REAL': 'double', 'INTEGER': 'int64'}[sql_type]) for name, sql_type in RESULT_FIELDS])
+
+FORMAT_CSV = 'csv'
+FORMAT_PARQUET = 'parquet'
+FORMAT_ARROW = 'arrow'
+EXTENSIONS = {'.csv': FORMAT_CSV,
+              '.parquet': FORMAT_PARQUET,
+              '.arrow': FORMAT_ARROW,
+              '.feather': FORMAT_ARROW}
+
+
+def get_record(result, fields=DEFAULT_FIELDS):
+    """
+    Args:
+      result(ShortReport, BacktestReport or StoredPass): a result
+      fields(tuple(string)): attributes of result to export. missing attribute is None
+    Returns:
+      record(dict): test conditions, fields and ea params of result
+    """
+    record = {}
+    for name in CONDITION_FIELDS + tuple(fields):
+        record[name] = getattr(result, name, None)
+    for name, value in (getattr(result, 'param', None) or {}).items():
+        # param of BacktestReport is the ea param spec of backtest, e.g. {'type': 'int', 'value': 12}
+        if isinstance(value, dict):
+            value = value.get('value')
+        record[PARAM_PREFIX + name] = value
+    return record
+
+
+class BatchWriter(object):
+    """
+    Notes:
+      base class of writers. records are buffered and written every batch_size rows.
+    Attributes:
+      path(string): abs path of output
+      batch_size(int): num of rows of a batch
+      columns(list(string)): columns fixed by the first batch. None until then
+      rows(int): num of rows written
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.columns = None
+        self.rows = 0
+        self._batch = []
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_results(self, results, fields=DEFAULT_FIELDS):
+        """
+        Args:
+          results(iterable): results. consumed only once
+        Returns:
+          rows(int): num of rows written so far
+        """
+        for result in results:
+            self.write(get_record(result, fields=fields))
+        return self.rows
+
+    def flush(self):
+        if not self._batch:
+            return
+        if self.columns is None:
+            self.columns = self._get_columns(self._batch)
+        unknown = set(k for record in self._batch for k in record) - set(self.columns)
+        if unknown:
+            logging.warning('columns not in the first batch are not exported: %s' % ', '.join(sorted(unknown)))
+        self._write_batch(dict((name, [record.get(name) for record in self._batch]) for name in self.columns))
+        self.rows += len(self._batch)
+        self._batch = []
+
+    @staticmethod
+    def _get_columns(batch):
+        # conditions and results first, then params in order of appearance
+        columns = []
+        seen = set()
+        for record in batch:
+            for name in sorted(record, key=lambda k: (k.startswith(PARAM_PREFIX), k not in CONDITION_FIELDS)):
+                if name not in seen:
+                    seen.add(name)
+                    columns.append(name)
+        return columns
+
+    def _write_batch(self, columns):
+        raise NotImplementedError()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CsvWriter(BatchWriter):
+    """
+    Notes:
+      csv with a header row. None is an empty cell and datetime is iso format.
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        super(CsvWriter, self).__init__(path, batch_size=batch_size)
+        self._fp = open(path, 'w')
+        self._writer = csv.writer(self._fp, lineterminator='\n')
+
+    def _write_batch(self, columns):
+        if not self.rows:
+            self._writer.writerow(self.columns)
+        values = [columns[name] for name in self.columns]
+        for row in zip(*values):
+            self._writer.writerow(['' if v is None else v.isoformat() if hasattr(v, 'isoformat') else v
+                                   for v in row])
+
+    def close(self):
+        if self._fp is not None:
+            super(CsvWriter, self).close()
+            self._fp.close()
+            self._fp = None
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        err_msg = 'pyarrow is required to export parquet or arrow. use csv or install pyarrow'
+        logging.error(err_msg)
+        raise ImportError(err_msg)
+
+
+class ArrowWriter(BatchWriter):
+    """
+    Notes:
+      parquet file or arrow ipc file written as one row group or record batch per batch.
+      schema is fixed by the first batch. known columns get ARROW_TYPES, the others are inferred,
+      and a column of unknown type which is None in the whole first batch is a string column.
+    Attributes:
+      format(string): FORMAT_PARQUET or FORMAT_ARROW
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE, format=FORMAT_PARQUET):
+        super(ArrowWriter, self).__init__(path, batch_size=batch_size)
+        self._pa = _import_pyarrow()
+        self.format = format
+        self.schema = None
+        self._writer = None
+        self._sink = None
+        self._text_columns = set()
+
+    def _get_array(self, name, values):
+        pa = self._pa
+        if name in ARROW_TYPES:
+            return pa.array(values, type=pa.type_for_alias(ARROW_TYPES[name]))
+        array = pa.array(values)
+        if pa.types.is_null(array.type):
+            self._text_columns.add(name)
+            return pa.array(values, type=pa.string())
+        return array
+
+    def _write_batch(self, columns):
+        pa = self._pa
+        arrays = [columns[name] for name in self.columns]
+        arrays = [[None if v is None else str(v) for v in values] if name in self._text_columns else values
+                  for name, values in zip(self.columns, arrays)]
+        if self.schema is None:
+            batch = pa.RecordBatch.from_arrays([self._get_array(name, values)
+                                                for name, values in zip(self.columns, arrays)],
+                                               names=self.columns)
+            self.schema = batch.schema
+            if self.format == FORMAT_PARQUET:
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                self._sink = pa.OSFile(self.path, 'wb')
+                self._writer = pa.ipc.new_file(self._sink, self.schema)
+        else:
+            batch = pa.RecordBatch.from_arrays([pa.array(values, type=field.type)
+                                                for values, field in zip(arrays, self.schema)],
+                                               schema=self.schema)
+
+        if self.format == FORMAT_PARQUET:
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        super(ArrowWriter, self).close()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+
+def get_writer(path, batch_size=DEFAULT_BATCH_SIZE, format=None):
+    """
+    Args:
+      path(string): abs path of output
+      format(string): csv, parquet or arrow. guessed from extension of path if None
+    Returns:
+      writer(BatchWriter): writer of format
+    """
+    if format is None:
+        format = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if format == FORMAT_CSV:
+        return CsvWriter(path, batch_size=batch_size)
+    if format in (FORMAT_PARQUET, FORMAT_ARROW):
+        return ArrowWriter(path, batch_size=batch_size, format=format)
+    err_msg = 'unknown export format of %s' % path
+    logging.error(err_msg)
+    raise ValueError(err_msg)
+
+
+def export(results, path, batch_size=DEFAULT_BATCH_SIZE, format=None, fields=DEFAULT_FIELDS):
+    """
+    Notes:
+      write results to path in batches.
+    Args:
+      results(iterable): ShortReport, BacktestReport or StoredPass. consumed only once
+      path(string): abs path of output
+      format(string): csv, parquet or arrow. guessed from extension of path if None
+      fields(tuple(string)): attributes of result to export
+    Returns:
+      rows(int): num of rows written
+    """
+    with get_writer(path, batch_size=batch_size, format=format) as writer:
+        writer.write_results(results, fields=fields)
+    return writer.rows
+
+
+def export_optimization(backtest, path, alias=DEFAULT_MT5_NAME, report_file=None, **kwargs):
+    """
+    Notes:
+      export passes while the optimization report is streamed, no ShortReport list is built.
+      xml report is read if report_file ends with .xml or xml report of alias exists.
+    Args:
+      backtest(metatrader.backtest.BackTest): optimized backtest
+      path(string): abs path of output
+      alias(string): mt5 alias which ran the optimization
+      report_file(string): abs path of report. report in data dir of alias is used if None
+      kwargs: see export
+    Returns:
+      rows(int): num of rows written
+    """
+    from metatrader.report import OptimizationReport, XmlOptimizationReport, get_report_abs_path
+
+    if report_file is None:
+        xml_report = get_report_abs_path(backtest.run_name, alias=alias, ext='xml')
+        if os.path.isfile(xml_report):
+            report_file = xml_report
+
+    reader = OptimizationReport
+    if report_file is not None and report_file.lower().endswith('.xml'):
+        reader = XmlOptimizationReport
+    return export(reader.iter_results(backtest, alias=alias, report_file=report_file), path, **kwargs)
+
+
+def read_arrow(path):
+    """
+    Notes:
+      memory map an arrow ipc file written by export.
+      columns of the table point into the mapped file, nothing is copied until accessed,
+      e.g. table.column('profit').to_numpy() of a column without null is zero copy.
+    Returns:
+      table(pyarrow.Table): exported records
+    """
+    pa = _import_pyarrow()
+    source = pa.memory_map(path, 'r')
+    return pa.ipc.open_file(source).read_all()
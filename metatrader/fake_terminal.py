@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  stand-in terminal for load tests and CI on linux.
+  install() writes an executable named terminal64.exe(and terminal.exe) into a data dir,
+  which behaves like a terminal started by metatrader.mt5.MT5.run:
+  it reads the ini given by /config:, sleeps for a modelled duration,
+  optionally fails or hangs, and writes a deterministic report derived from the .set file.
+  a backtest writes an htm report readable by BacktestReport,
+  an optimization writes an xml report with one pass per candidate of the .set file.
+  the executable is a python script with shebang, so it runs on posix only.
+
+  behavior is set by fake_terminal.json in the data dir:
+    base_seconds(float): duration of every run
+    seconds_per_day(float): duration per day of FromDate..ToDate
+    model_factors(dict): multiplier of duration per Model of ini
+    jitter(float): duration varies by up to this fraction, deterministic per .set
+    fail_rate(float): fraction of runs exiting with exit_code
+    hang_rate(float): fraction of runs never exiting
+    exit_code(int): exit code of failed runs
+    seed(int): seed of failures, hangs and results
+    profit_param(string): if set, profit of a run is the value of this ea param instead of a random one
+
+  e.g.:
+    install(data_dir, base_seconds=0.5, fail_rate=0.05)
+    mt5.initialize(data_dir, portable_mode=True, alias='fake')
+"""
+from __future__ import absolute_import, division
+import hashlib
+import itertools
+import json
+import os
+import stat
+import sys
+import time
+from datetime import datetime
+
+CONFIG_FILE = 'fake_terminal.json'
+EXECUTABLES = ('terminal64.exe', 'terminal.exe')
+
+DEFAULT_CONFIG = {'base_seconds': 0.0,
+                  'seconds_per_day': 0.0,
+                  # every tick, 1 minute ohlc, open price only, math, real ticks
+                  'model_factors': {'0': 1.0, '1': 0.2, '2': 0.05, '3': 0.01, '4': 1.5},
+                  'jitter': 0.0,
+                  'fail_rate': 0.0,
+                  'hang_rate': 0.0,
+                  'exit_code': 1,
+                  'seed': 0,
+                  'profit_param': None}
+
+# shebang script run as terminal. package dir is put on sys.path so no install is needed.
+# data dir is where the script is, so a clone by metatrader.pool works on its own data dir
+LAUNCHER = '''#!%(python)s
+import os, sys
+sys.path.insert(0, %(package_root)r)
+from metatrader.fake_terminal import main
+sys.exit(main(sys.argv[1:], os.path.dirname(os.path.abspath(__file__))))
+'''
+
+SUB_DIRS = ('Profiles', 'Tester', 'tester',
+            os.path.join('MQL5', 'Experts'), os.path.join('MQL5', 'Libraries'),
+            os.path.join('MQL5', 'Profiles', 'Tester'))
+
+
+def install(data_dir, **config):
+    """
+    Notes:
+      create data dir with the dirs required by metatrader.mt5 and the fake terminal executables.
+    Args:
+      data_dir(string): abs path of portable data dir
+      config: behavior of fake terminal, see DEFAULT_CONFIG
+    Returns:
+      data_dir(string): data_dir
+    """
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError('unknown fake terminal config %s' % ', '.join(sorted(unknown)))
+
+    for sub_dir in SUB_DIRS:
+        path = os.path.join(data_dir, sub_dir)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    merged = dict(DEFAULT_CONFIG)
+    merged.update(config)
+    with open(os.path.join(data_dir, CONFIG_FILE), 'w') as fp:
+        json.dump(merged, fp, indent=1, sort_keys=True)
+
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for name in EXECUTABLES:
+        exe = os.path.join(data_dir, name)
+        with open(exe, 'w') as fp:
+            fp.write(LAUNCHER % {'python': sys.executable, 'package_root': package_root})
+        os.chmod(exe, os.stat(exe).st_mode | stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
+    return data_dir
+
+
+def read_ini(path):
+    """
+    Returns:
+      ini(dict(string:string)): key and value of every section. comments are skipped
+    """
+    ini = {}
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if not line or line.startswith(';') or line.startswith('['):
+                continue
+            if '=' in line:
+                key, value = line.split('=', 1)
+                ini[key.strip()] = value.strip()
+    return ini
+
+
+def read_set(path):
+    """
+    Returns:
+      param(list(tuple(string, string, list))): name, value and values to optimize of each ea param.
+        values to optimize is empty if the param is not optimized
+    """
+    param = []
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if not line or line.startswith(';') or '=' not in line:
+                continue
+            name, fields = line.split('=', 1)
+            fields = fields.split('||')
+            value = fields[0]
+            values = []
+            if len(fields) >= 5 and fields[4].upper() == 'Y':
+                values = _get_range(fields[1], fields[2], fields[3])
+            param.append((name, value, values))
+    return param
+
+
+def _get_range(start, step, stop):
+    if start.lower() in ('true', 'false'):
+        return ['false', 'true']
+    start, step, stop = float(start), float(step), float(stop)
+    if step <= 0:
+        return ['%.10g' % start]
+    count = int((stop - start) / step + 1e-9) + 1
+    return ['%.10g' % (start + i * step) for i in range(count)]
+
+
+def _unit(*keys):
+    # deterministic float in [0, 1) from keys
+    digest = hashlib.sha256('|'.join(str(k) for k in keys).encode('utf-8')).hexdigest()
+    return int(digest[:13], 16) / float(16 ** 13)
+
+
+def get_result(param, deposit, seed, profit_param=None):
+    """
+    Notes:
+      deterministic result of a backtest with param values.
+    Args:
+      param(list(tuple(string, string))): name and value of each ea param
+      deposit(float): initial deposit
+      seed(int): seed of results
+      profit_param(string): name of ea param whose value is profit. random profit if None
+    Returns:
+      result(dict): profit, total_trades, gross_profit, gross_loss, profit_factor, expected_payoff,
+        max_drawdown and max_drawdown_rate
+    """
+    key = ';'.join('%s=%s' % p for p in sorted(param))
+    values = dict(param)
+    if profit_param in values:
+        profit = round(float(values[profit_param]), 2)
+    else:
+        profit = round((_unit(seed, key, 'profit') - 0.4) * deposit * 0.5, 2)
+    total_trades = 1 + int(_unit(seed, key, 'trades') * 500)
+    gross_loss = -round(_unit(seed, key, 'loss') * deposit * 0.5 + 1, 2)
+    gross_profit = round(profit - gross_loss, 2)
+    max_drawdown = round(-gross_loss * _unit(seed, key, 'drawdown'), 2)
+    return {'profit': profit,
+            'total_trades': total_trades,
+            'gross_profit': gross_profit,
+            'gross_loss': gross_loss,
+            'profit_factor': round(gross_profit / -gross_loss, 2),
+            'expected_payoff': round(profit / total_trades, 2),
+            'max_drawdown': max_drawdown,
+            'max_drawdown_rate': round(max_drawdown * 100.0 / deposit, 2)}
+
+
+def write_backtest_report(path, result, deposit):
+    rows = [('Initial deposit', '%.2f' % deposit),
+            ('Total net profit', '%.2f' % result['profit']),
+            ('Gross profit', '%.2f' % result['gross_profit']),
+            ('Gross loss', '%.2f' % result['gross_loss']),
+            ('Profit factor', '%.2f' % result['profit_factor']),
+            ('Expected payoff', '%.2f' % result['expected_payoff']),
+            ('Maximal drawdown', '%.2f (%.2f%%)' % (result['max_drawdown'], result['max_drawdown_rate'])),
+            ('Total trades', '%d' % result['total_trades'])]
+    with open(path, 'w') as fp:
+        fp.write('<html><body><div style="font: 20pt Times New Roman"><b>Strategy Tester Report</b></div>\n')
+        fp.write('<table>\n')
+        for label, value in rows:
+            fp.write('<tr><td>%s</td><td>%s</td></tr>\n' % (label, value))
+        fp.write('</table></body></html>\n')
+
+
+def write_optimization_report(path, param, deposit, seed, profit_param=None):
+    optimized = [(name, values) for name, _, values in param if values]
+    fixed = [(name, value) for name, value, values in param if not values]
+    titles = ['Pass', 'Result', 'Profit', 'Expected Payoff', 'Profit Factor', 'Equity DD %', 'Trades']
+
+    with open(path, 'w') as fp:
+        fp.write('<?xml version="1.0"?>\n<Workbook xmlns="urn:schemas-microsoft-com:office:spreadsheet">\n')
+        fp.write('<DocumentProperties><Deposit>%s USD</Deposit></DocumentProperties>\n' % deposit)
+        fp.write('<Worksheet><Table>\n<Row>')
+        for title in titles + [name for name, _ in optimized]:
+            fp.write('<Cell><Data>%s</Data></Cell>' % title)
+        fp.write('</Row>\n')
+
+        for i, values in enumerate(itertools.product(*[v for _, v in optimized])):
+            result = get_result(fixed + list(zip([n for n, _ in optimized], values)), deposit, seed, profit_param)
+            cells = [i, deposit + result['profit'], result['profit'], result['expected_payoff'],
+                     result['profit_factor'], result['max_drawdown_rate'], result['total_trades']] + list(values)
+            fp.write('<Row>' + ''.join('<Cell><Data>%s</Data></Cell>' % c for c in cells) + '</Row>\n')
+        fp.write('</Table></Worksheet></Workbook>\n')
+
+
+def get_duration(config, ini, set_content):
+    """
+    Returns:
+      seconds(float): modelled duration of the run
+    """
+    days = 0.0
+    try:
+        from_date = datetime.strptime(ini.get('FromDate', ini.get('TestFromDate')), '%Y.%m.%d')
+        to_date = datetime.strptime(ini.get('ToDate', ini.get('TestToDate')), '%Y.%m.%d')
+        days = max(0, (to_date - from_date).days + 1)
+    except (TypeError, ValueError):
+        pass
+
+    factor = float(config['model_factors'].get(ini.get('Model', ini.get('TestModel', '0')), 1.0))
+    seconds = config['base_seconds'] + config['seconds_per_day'] * days * factor
+    if config['jitter']:
+        seconds *= 1 + config['jitter'] * (2 * _unit(config['seed'], set_content, 'jitter') - 1)
+    return max(0.0, seconds)
+
+
+def main(argv, data_dir):
+    """
+    Notes:
+      entry point of fake terminal. argv is the command line given by MT5.get_cmd or MT4.get_cmd.
+    Returns:
+      exit code(int): 0 if succeeded
+    """
+    conf = None
+    for arg in argv:
+        if arg.startswith('/config:'):
+            conf = arg[len('/config:'):]
+        elif not arg.startswith('/'):
+            # mt4 takes ini as a plain argument
+            conf = arg
+    if conf is None:
+        sys.stderr.write('fake terminal: /config:<ini> is required\n')
+        return 2
+
+    with open(os.path.join(data_dir, CONFIG_FILE)) as fp:
+        config = json.load(fp)
+    ini = read_ini(conf)
+
+    set_name = ini.get('ExpertParameters', ini.get('TestExpertParameters'))
+    set_file = None
+    for set_dir in (os.path.join('MQL5', 'Profiles', 'Tester'), 'tester'):
+        if set_name and os.path.isfile(os.path.join(data_dir, set_dir, set_name)):
+            set_file = os.path.join(data_dir, set_dir, set_name)
+    param = read_set(set_file) if set_file else []
+    set_content = ';'.join('%s=%s' % (name, value) for name, value, _ in param)
+
+    time.sleep(get_duration(config, ini, set_content))
+
+    if _unit(config['seed'], set_content, 'hang') < config['hang_rate']:
+        while True:
+            time.sleep(3600)
+    if _unit(config['seed'], set_content, 'fail') < config['fail_rate']:
+        sys.stderr.write('fake terminal: failed by fail_rate\n')
+        return config['exit_code']
+
+    deposit = float(ini.get('Deposit', ini.get('TestDeposit', 10000)))
+    report = os.path.join(data_dir, ini.get('Report', ini.get('TestReport', 'report')))
+    if ini.get('Optimization', ini.get('TestOptimization', '0')) not in ('0', 'false'):
+        write_optimization_report(report + '.xml', param, deposit, config['seed'], config.get('profit_param'))
+    else:
+        result = get_result([(name, value) for name, value, _ in param], deposit, config['seed'],
+                            config.get('profit_param'))
+        write_backtest_report(report + '.htm', result, deposit)
+    return 0
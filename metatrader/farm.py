@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  run many backtests in parallel over several mt5 terminals.
+  every terminal registered by metatrader.mt5.initialize(alias=...) is one worker,
+  so a job is dispatched to whichever terminal becomes idle first.
+"""
+from __future__ import absolute_import, division
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from metatrader.mt5 import DEFAULT_MT5_NAME
+
+
+class FarmResult(object):
+    """
+    Notes:
+      result of one job run by BacktestFarm
+    Attributes:
+      backtest(metatrader.backtest.BackTest): the job
+      alias(string): mt5 alias which ran the job
+      report(BacktestReport or OptimizationReport): report of the job.
+        None if the job failed or read_report of the job is False
+      error(Exception): exception raised by the job. None if the job succeeded
+      elapsed(float): wall clock seconds spent by the job
+    """
+
+    def __init__(self, backtest, alias, report=None, error=None, elapsed=0.0):
+        self.backtest = backtest
+        self.alias = alias
+        self.report = report
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+
+class BacktestFarm(object):
+    """
+    Notes:
+      run backtests concurrently, one thread per mt5 alias.
+      each alias must be initialized by metatrader.mt5.initialize beforehand.
+      files of each run are named after its run id, so several aliases may share a data dir.
+      a BackTest object must not be passed twice in one batch.
+
+      e.g.:
+        farm = BacktestFarm(['mt5-1', 'mt5-2'])
+        for result in farm.run(backtests):
+            print(result.backtest.param, result.report.profit)
+        print(farm.jobs_per_hour)
+    Attributes:
+      aliases(list(string)): mt5 aliases used as workers
+      cache(metatrader.cache.ReportCache): report cache passed to each job. None disables cache
+      store(metatrader.store.PassStore): pass store passed to each job. None disables store
+      cost_model(metatrader.scheduler.CostModel): if not None, a batch is dispatched longest expected job first
+        and duration of each succeeded job is learned. jobs are listed up front then
+      completed(int): num of succeeded jobs of the last batch
+      failed(int): num of failed jobs of the last batch
+      elapsed(float): wall clock seconds of the last batch
+    """
+
+    def __init__(self, aliases=(DEFAULT_MT5_NAME,), cache=None, store=None, cost_model=None):
+        if not aliases:
+            raise ValueError('at least one mt5 alias is required')
+        self.aliases = list(aliases)
+        self.cache = cache
+        self.store = store
+        self.cost_model = cost_model
+        self.completed = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    @property
+    def jobs_per_hour(self):
+        """
+        Returns:
+          throughput of the last batch in jobs per hour of wall clock time
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return (self.completed + self.failed) * 3600.0 / self.elapsed
+
+    def predict_makespan(self, backtests):
+        """
+        Notes:
+          expected wall clock seconds of a batch by cost_model, before running it
+        """
+        from metatrader.scheduler import CostModel, predict_makespan
+        makespan, _ = predict_makespan(list(backtests), len(self.aliases), self.cost_model or CostModel())
+        return makespan
+
+    def run(self, backtests):
+        """
+        Notes:
+          run backtests and yield FarmResult in order of completion
+        Args:
+          backtests(iterable(metatrader.backtest.BackTest)): jobs. pulled one by one when a terminal is idle
+        """
+        return self._dispatch(backtests, 'run')
+
+    def optimize(self, backtests):
+        """
+        Notes:
+          run optimizations and yield FarmResult in order of completion
+        Args:
+          backtests(iterable(metatrader.backtest.BackTest)): jobs. pulled one by one when a terminal is idle
+        """
+        return self._dispatch(backtests, 'optimize')
+
+    def _dispatch(self, backtests, method):
+        # jobs are pulled lazily, so backtests may be a generator which decides
+        # the next job from the results seen so far, unless they are ordered by cost model
+        if self.cost_model is not None:
+            from metatrader.scheduler import order_jobs
+            backtests = order_jobs(backtests, self.cost_model)
+        jobs = iter(backtests)
+        jobs_lock = threading.Lock()
+        stop = threading.Event()
+        results = queue.Queue()
+
+        self.completed = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        started = time.time()
+
+        for alias in self.aliases:
+            worker = threading.Thread(target=self._work, args=(alias, method, jobs, jobs_lock, stop, results))
+            worker.daemon = True
+            worker.start()
+
+        try:
+            running = len(self.aliases)
+            while running:
+                result = results.get()
+                if result is None:
+                    # a worker has no more job
+                    running -= 1
+                    continue
+                if isinstance(result, Exception):
+                    raise result
+
+                if result.succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.elapsed = time.time() - started
+                yield result
+        finally:
+            # consumer stopped iterating. let workers finish the running jobs only.
+            stop.set()
+
+    def _work(self, alias, method, jobs, jobs_lock, stop, results):
+        while not stop.is_set():
+            with jobs_lock:
+                try:
+                    backtest = next(jobs)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    # error of job generator is raised in the consumer
+                    stop.set()
+                    results.put(e)
+                    break
+
+            started = time.time()
+            report = None
+            error = None
+            try:
+                report = getattr(backtest, method)(alias=alias, cache=self.cache, store=self.store)
+            except Exception as e:
+                logging.error('%s of %s on mt5[%s] failed: %s', method, backtest.ea_name, alias, e)
+                error = e
+            elapsed = time.time() - started
+            if error is None and self.cost_model is not None:
+                self.cost_model.observe(backtest, elapsed)
+            results.put(FarmResult(backtest, alias, report, error, elapsed))
+        results.put(None)
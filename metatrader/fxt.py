@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  generator of mt4 tester tick files(.fxt) from history(.hst) bars.
+  mt4 generates tester/history/<symbol><period>_<model>.fxt on every test run, which takes most of
+  the time of a short test. fxt files are generated here ahead of time for a matrix of
+  symbol x period x model, cached by hash of the input, and installed read only into tester/history
+  so that the terminal uses them as they are instead of generating them again.
+
+  ticks of a bar follow open -> low -> high -> close for a bullish bar and open -> high -> low -> close
+  for a bearish bar, as the terminal does without lower period data:
+    every tick: ticks of a bar are its tick volume clipped to 4..max_ticks, evenly along the path
+    control points: 4 ticks, one on each point of the path
+    open prices: 1 tick at open
+
+  file layout(v405):
+    header(728 bytes): version, copyright, server, symbol, period, model, bars, from/to date,
+      symbol properties such as spread and digits, margin and swap settings
+    tick(56 bytes): bar time(int64), open, high, low, close, volume(double) of the forming bar,
+      tick time(int32) and flag(int32)
+
+  e.g.:
+    installed = install_matrix(mt4.appdata_path, 'MetaQuotes-Demo', ['USDJPY', 'EURUSD'], ['M15', 'H1'],
+                               [MODEL_EVERY_TICK, MODEL_OPEN_PRICES], datetime(2018, 1, 1), datetime(2019, 1, 1),
+                               cache_dir, spread=20)
+"""
+from __future__ import absolute_import, division
+import hashlib
+import json
+import logging
+import os
+import stat
+from datetime import datetime
+
+import numpy as np
+
+from metatrader.history import HistoryFile, get_history_path, iter_histories, PERIOD_MINUTES
+from metatrader.pool import LINK_HARDLINK, link_file
+
+FXT_VERSION = 405
+HEADER_SIZE = 728
+TICK_SIZE = 56
+
+MODEL_EVERY_TICK = 0
+MODEL_CONTROL_POINTS = 1
+MODEL_OPEN_PRICES = 2
+
+# flag of tick to run the expert on it
+TICK_FLAG_RUN_EXPERT = 1
+DEFAULT_MAX_TICKS = 60
+
+COPYRIGHT = b'Copyright 2001-2015, MetaQuotes Software Corp.'
+
+HEADER_DTYPE = np.dtype([('version', '<i4'),
+                         ('copyright', 'S64'),
+                         ('description', 'S128'),
+                         ('symbol', 'S12'),
+                         ('period', '<i4'),
+                         ('model', '<i4'),
+                         ('bars', '<i4'),
+                         ('fromdate', '<i4'),
+                         ('todate', '<i4'),
+                         ('total_ticks', '<i4'),
+                         ('modelquality', '<f8'),
+                         ('currency', 'S12'),
+                         ('spread', '<i4'),
+                         ('digits', '<i4'),
+                         ('padding1', '<i4'),
+                         ('point', '<f8'),
+                         ('lot_min', '<i4'),
+                         ('lot_max', '<i4'),
+                         ('lot_step', '<i4'),
+                         ('stops_level', '<i4'),
+                         ('gtc_pendings', '<i4'),
+                         ('padding2', '<i4'),
+                         ('contract_size', '<f8'),
+                         ('tick_value', '<f8'),
+                         ('tick_size', '<f8'),
+                         ('profit_mode', '<i4'),
+                         ('swap_enable', '<i4'),
+                         ('swap_type', '<i4'),
+                         ('padding3', '<i4'),
+                         ('swap_long', '<f8'),
+                         ('swap_short', '<f8'),
+                         ('swap_rollover3days', '<i4'),
+                         ('leverage', '<i4'),
+                         ('free_margin_mode', '<i4'),
+                         ('margin_mode', '<i4'),
+                         ('margin_stopout', '<i4'),
+                         ('margin_stopout_mode', '<i4'),
+                         ('margin_initial', '<f8'),
+                         ('margin_maintenance', '<f8'),
+                         ('margin_hedged', '<f8'),
+                         ('margin_divider', '<f8'),
+                         ('margin_currency', 'S12'),
+                         ('padding4', '<i4'),
+                         ('comm_base', '<f8'),
+                         ('comm_type', '<i4'),
+                         ('comm_lots', '<i4'),
+                         ('from_bar', '<i4'),
+                         ('to_bar', '<i4'),
+                         ('start_period', '<i4', (6,)),
+                         ('set_from', '<i4'),
+                         ('set_to', '<i4'),
+                         ('freeze_level', '<i4'),
+                         ('generating_errors', '<i4'),
+                         ('reserved', '<i4', (60,))])
+
+TICK_DTYPE = np.dtype([('otm', '<i8'),
+                       ('open', '<f8'),
+                       ('high', '<f8'),
+                       ('low', '<f8'),
+                       ('close', '<f8'),
+                       ('volume', '<f8'),
+                       ('ctm', '<i4'),
+                       ('flag', '<i4')])
+
+# symbol properties written to header. the terminal checks them against the symbol,
+# so they should be given as the symbol spec of the trade server
+DEFAULT_SPEC = {'currency': 'USD',
+                'lot_min': 1,
+                'lot_max': 10000,
+                'lot_step': 1,
+                'stops_level': 0,
+                'gtc_pendings': 0,
+                'contract_size': 100000.0,
+                'tick_value': 0.0,
+                'profit_mode': 0,
+                'swap_enable': 1,
+                'swap_type': 0,
+                'swap_long': 0.0,
+                'swap_short': 0.0,
+                'swap_rollover3days': 3,
+                'leverage': 100,
+                'free_margin_mode': 1,
+                'margin_mode': 0,
+                'margin_stopout': 30,
+                'margin_stopout_mode': 0,
+                'margin_initial': 0.0,
+                'margin_maintenance': 0.0,
+                'margin_hedged': 50000.0,
+                'margin_divider': 1.0,
+                'margin_currency': 'USD',
+                'comm_base': 0.0,
+                'comm_type': 0,
+                'comm_lots': 1,
+                'freeze_level': 0}
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _to_seconds(date):
+    return int((date - EPOCH).total_seconds())
+
+
+def get_fxt_name(symbol, period, model):
+    """
+    Returns:
+      name(string): file name used by the terminal, e.g. USDJPY15_0.fxt
+    """
+    return '%s%d_%d.fxt' % (symbol, PERIOD_MINUTES.get(period, period), model)
+
+
+def get_ticks_per_bar(bars, model, max_ticks=DEFAULT_MAX_TICKS):
+    """
+    Returns:
+      counts(numpy.ndarray): num of ticks of each bar
+    """
+    if model == MODEL_OPEN_PRICES:
+        return np.ones(len(bars), dtype=np.int64)
+    if model == MODEL_CONTROL_POINTS:
+        return np.full(len(bars), 4, dtype=np.int64)
+    volume = bars['volume'] if 'volume' in bars.dtype.names else bars['tick_volume']
+    return np.clip(np.asarray(volume, dtype=np.int64), 4, max(4, max_ticks))
+
+
+def generate_ticks(bars, times, model, period, digits, max_ticks=DEFAULT_MAX_TICKS):
+    """
+    Notes:
+      ticks of every bar at once. each tick carries the bar formed up to the tick.
+    Args:
+      bars(numpy.ndarray): bars of HistoryFile
+      times(numpy.ndarray): open time of each bar in seconds
+      model(int): MODEL_EVERY_TICK, MODEL_CONTROL_POINTS or MODEL_OPEN_PRICES
+      period(int): period in minutes
+      digits(int): digits of price
+    Returns:
+      ticks(numpy.ndarray): ticks as TICK_DTYPE
+    """
+    counts = get_ticks_per_bar(bars, model, max_ticks=max_ticks)
+    total = int(counts.sum())
+    bar_index = np.repeat(np.arange(len(bars)), counts)
+    starts = np.cumsum(counts) - counts
+    step = np.arange(total) - np.repeat(starts, counts)
+    n = counts[bar_index]
+
+    open_, high, low, close = [np.asarray(bars[name], dtype=np.float64)[bar_index]
+                               for name in ('open', 'high', 'low', 'close')]
+    bullish = close >= open_
+    # path of 3 segments: open -> first extreme -> second extreme -> close
+    first = np.where(bullish, low, high)
+    second = np.where(bullish, high, low)
+
+    position = np.where(n > 1, step * 3.0 / np.maximum(n - 1, 1), 0.0)
+    segment = np.minimum(position.astype(np.int64), 2)
+    fraction = position - segment
+    start = np.choose(segment, [open_, first, second])
+    stop = np.choose(segment, [first, second, close])
+    price = np.round(start + fraction * (stop - start), digits)
+
+    # running high and low of the forming bar follow from the segment
+    running_high = np.where(bullish,
+                            np.choose(segment, [open_, np.maximum(open_, price), high]),
+                            np.choose(segment, [np.maximum(open_, price), high, high]))
+    running_low = np.where(bullish,
+                           np.choose(segment, [np.minimum(open_, price), low, low]),
+                           np.choose(segment, [open_, np.minimum(open_, price), low]))
+
+    ticks = np.zeros(total, dtype=TICK_DTYPE)
+    bar_time = np.asarray(times, dtype=np.int64)[bar_index]
+    ticks['otm'] = bar_time
+    ticks['open'] = open_
+    ticks['high'] = np.maximum(running_high, price)
+    ticks['low'] = np.minimum(running_low, price)
+    ticks['close'] = price
+    ticks['volume'] = step + 1
+    ticks['ctm'] = bar_time + (step * period * 60) // n
+    ticks['flag'] = TICK_FLAG_RUN_EXPERT
+    return ticks
+
+
+def get_header(history, bars, times, model, total_ticks, from_date, to_date, spread, server='', spec=None):
+    """
+    Returns:
+      header(numpy.ndarray): header as HEADER_DTYPE
+    """
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    merged = dict(DEFAULT_SPEC)
+    merged.update(spec or {})
+    for name, value in merged.items():
+        header[name] = value.encode('ascii') if hasattr(value, 'encode') else value
+
+    point = 10.0 ** -history.digits
+    header['version'] = FXT_VERSION
+    header['copyright'] = COPYRIGHT
+    header['description'] = server.encode('ascii')
+    header['symbol'] = history.symbol.encode('ascii')
+    header['period'] = history.period
+    header['model'] = model
+    header['bars'] = len(bars)
+    header['fromdate'] = times[0] if len(times) else 0
+    header['todate'] = times[-1] if len(times) else 0
+    header['total_ticks'] = total_ticks
+    header['spread'] = spread
+    header['digits'] = history.digits
+    header['point'] = point
+    if not merged.get('tick_size'):
+        header['tick_size'] = point
+    header['from_bar'] = 0
+    header['to_bar'] = max(0, len(bars) - 1)
+    header['start_period'][0][0] = history.period
+    header['set_from'] = _to_seconds(from_date)
+    header['set_to'] = _to_seconds(to_date)
+    return header
+
+
+def get_cache_key(bars, history, model, from_date, to_date, spread, server='', spec=None,
+                  max_ticks=DEFAULT_MAX_TICKS):
+    """
+    Returns:
+      key(string): sha256 of bars used and every generation setting
+    """
+    digest = hashlib.sha256()
+    settings = {'version': FXT_VERSION,
+                'symbol': history.symbol,
+                'period': history.period,
+                'digits': history.digits,
+                'model': model,
+                'from_date': _to_seconds(from_date),
+                'to_date': _to_seconds(to_date),
+                'spread': spread,
+                'server': server,
+                'spec': spec or {},
+                'max_ticks': max_ticks}
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    digest.update(np.ascontiguousarray(bars).tobytes())
+    return digest.hexdigest()
+
+
+def write_fxt(path, header, ticks):
+    # written to a temporary file first, so a cached file is always complete
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as fp:
+        fp.write(header.tobytes())
+        fp.write(ticks.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_fxt(path):
+    """
+    Returns:
+      header(numpy.void), ticks(numpy.ndarray): header and memory mapped ticks
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+    count = (os.path.getsize(path) - HEADER_SIZE) // TICK_SIZE
+    if not count:
+        return header, np.zeros(0, dtype=TICK_DTYPE)
+    return header, np.memmap(path, dtype=TICK_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+def build_fxt(history, model, from_date, to_date, cache_dir, spread=0, server='', spec=None,
+              max_ticks=DEFAULT_MAX_TICKS):
+    """
+    Notes:
+      generate fxt of from_date <= bar time < to_date unless it is cached.
+    Args:
+      history(metatrader.history.HistoryFile): bars of symbol and period
+      model(int): MODEL_EVERY_TICK, MODEL_CONTROL_POINTS or MODEL_OPEN_PRICES
+      cache_dir(string): dir of generated fxt files
+      spread(int): spread in points
+      server(string): trade server name written to header
+      spec(dict): symbol properties overriding DEFAULT_SPEC
+    Returns:
+      path(string), generated(bool): abs path of cached fxt and False if it was cached already
+    """
+    bars = history.slice(from_date, to_date)
+    key = get_cache_key(bars, history, model, from_date, to_date, spread, server=server, spec=spec,
+                        max_ticks=max_ticks)
+    path = os.path.join(cache_dir, '%s.fxt' % key)
+    if os.path.isfile(path):
+        return path, False
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    times = bars['time'].astype('<i8')
+    ticks = generate_ticks(bars, times, model, history.period, history.digits, max_ticks=max_ticks)
+    header = get_header(history, bars, times, model, len(ticks), from_date, to_date, spread,
+                        server=server, spec=spec)
+    write_fxt(path, header, ticks)
+    # cached files are shared by hardlinks, nobody may change them
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return path, True
+
+
+def install_fxt(cached_path, appdata_path, symbol, period, model, link=LINK_HARDLINK):
+    """
+    Notes:
+      put cached fxt into tester/history of terminal as read only,
+      so the terminal can't overwrite it with one generated by itself.
+    Args:
+      link(string): see metatrader.pool.link_file
+    Returns:
+      path(string): abs path of installed fxt
+    """
+    history_dir = os.path.join(appdata_path, 'tester', 'history')
+    if not os.path.isdir(history_dir):
+        os.makedirs(history_dir)
+    path = os.path.join(history_dir, get_fxt_name(symbol, period, model))
+
+    if os.path.exists(path):
+        if os.path.samefile(path, cached_path):
+            return path
+        # installed file is a link to another cached fxt, whose mode must not change
+        try:
+            os.remove(path)
+        except OSError:
+            # windows doesn't remove read only files
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+            os.remove(path)
+    link_file(cached_path, path, link=link)
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return path
+
+
+def install_matrix(appdata_path, server, symbols, periods, models, from_date, to_date, cache_dir,
+                   spread=0, spec=None, max_ticks=DEFAULT_MAX_TICKS, link=LINK_HARDLINK, workers=4):
+    """
+    Notes:
+      build and install fxt of every symbol x period x model from history of appdata_path.
+      symbols are processed concurrently. a symbol without history is logged and skipped.
+    Args:
+      appdata_path(string): data dir of mt4
+      server(string): trade server name, which is the dir name in history
+      symbols(list(string)): e.g. ['USDJPY', 'EURUSD']
+      periods(list(string)): e.g. ['M15', 'H1']
+      models(list(int)): e.g. [MODEL_EVERY_TICK, MODEL_OPEN_PRICES]
+      cache_dir(string): dir of generated fxt files
+      spec(dict or dict(string:dict)): symbol properties, or properties of each symbol.
+        a symbol not in properties of each symbol gets DEFAULT_SPEC
+    Returns:
+      installed(list(string)): abs paths of installed fxt files
+    """
+    targets = {}
+    for symbol in symbols:
+        for period in periods:
+            targets[get_history_path(appdata_path, server, symbol, period)] = (symbol, period)
+
+    # properties of each symbol if any value is a dict
+    per_symbol = bool(spec) and any(isinstance(value, dict) for value in spec.values())
+
+    def build(history):
+        symbol, period = targets[history.path]
+        symbol_spec = spec.get(symbol) if per_symbol else spec
+        built = []
+        for model in models:
+            cached_path, _ = build_fxt(history, model, from_date, to_date, cache_dir, spread=spread,
+                                       server=server, spec=symbol_spec, max_ticks=max_ticks)
+            built.append((model, cached_path))
+        history.close()
+        return built
+
+    installed = []
+    for path, built in iter_histories(list(targets), build, workers=workers):
+        if isinstance(built, Exception):
+            logging.warning('fxt of %s is not built: %s', path, built)
+            continue
+        symbol, period = targets[path]
+        for model, cached_path in built:
+            installed.append(install_fxt(cached_path, appdata_path, symbol, period, model, link=link))
+    return installed
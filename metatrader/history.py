@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  reader of mt4 history(.hst) files as numpy structured arrays.
+  bars are memory mapped, so opening a file of millions of bars reads only its header,
+  and a date range is found by binary search on the time column.
+  used to check that history covers from_date..to_date of backtests before running terminals.
+
+  file layout:
+    header(148 bytes): version, copyright, symbol, period, digits, timesign, last_sync, unused
+    v400 bar(44 bytes): time(uint32), open, low, high, close, volume(double)
+    v401 bar(60 bytes): time(int64), open, high, low, close(double), tick_volume(int64), spread(int32),
+      real_volume(int64)
+
+  mt5 keeps bars and ticks in .hcc and .tkc files whose format is not published, they are not read here.
+
+  e.g.:
+    history = HistoryFile(get_history_path(mt4.appdata_path, 'MetaQuotes-Demo', 'USDJPY', 'M5'))
+    bars = history.slice(datetime(2018, 1, 1), datetime(2019, 1, 1))
+    closes = bars['close']
+"""
+from __future__ import absolute_import, division
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import numpy as np
+
+HEADER_SIZE = 148
+
+HEADER_DTYPE = np.dtype([('version', '<i4'),
+                         ('copyright', 'S64'),
+                         ('symbol', 'S12'),
+                         ('period', '<i4'),
+                         ('digits', '<i4'),
+                         ('timesign', '<i4'),
+                         ('last_sync', '<i4'),
+                         ('unused', '<i4', (13,))])
+
+BAR_DTYPES = {400: np.dtype([('time', '<u4'),
+                             ('open', '<f8'),
+                             ('low', '<f8'),
+                             ('high', '<f8'),
+                             ('close', '<f8'),
+                             ('volume', '<f8')]),
+              # int64 seconds is read as datetime64 without copy
+              401: np.dtype([('time', '<M8[s]'),
+                             ('open', '<f8'),
+                             ('high', '<f8'),
+                             ('low', '<f8'),
+                             ('close', '<f8'),
+                             ('tick_volume', '<i8'),
+                             ('spread', '<i4'),
+                             ('real_volume', '<i8')])}
+
+# period of BackTest in minutes, which is also in the name of .hst file, e.g. USDJPY5.hst
+PERIOD_MINUTES = {'M1': 1, 'M5': 5, 'M15': 15, 'M30': 30,
+                  'H1': 60, 'H4': 240, 'D1': 1440, 'W1': 10080, 'MN1': 43200}
+
+EPOCH = datetime(1970, 1, 1)
+
+# bars may start or end this much inside the range, e.g. from_date on a weekend
+DEFAULT_SLACK = timedelta(days=3)
+
+
+def _to_seconds(date):
+    return int((date - EPOCH).total_seconds())
+
+
+def get_history_path(appdata_path, server, symbol, period):
+    """
+    Args:
+      appdata_path(string): data dir of mt4
+      server(string): trade server name, which is the dir name in history
+      symbol(string): currency symbol. e.g.: USDJPY
+      period(string or int): e.g. M5 or 5
+    Returns:
+      path(string): abs path of .hst file
+    """
+    minutes = PERIOD_MINUTES.get(period, period)
+    return os.path.join(appdata_path, 'history', server, '%s%s.hst' % (symbol, minutes))
+
+
+class HistoryFile(object):
+    """
+    Notes:
+      one .hst file. bars is a read only memory map of the file, nothing is copied until accessed.
+    Attributes:
+      path(string): abs path of .hst file
+      version(int): 400 or 401
+      symbol(string): currency symbol
+      period(int): period in minutes
+      digits(int): digits of price
+      bars(numpy.ndarray): structured array of bars in time order
+    """
+
+    def __init__(self, path):
+        self.path = path
+        size = os.path.getsize(path)
+        if size < HEADER_SIZE:
+            err_msg = '%s is too small for a history file' % path
+            logging.error(err_msg)
+            raise IOError(err_msg)
+
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+        self.version = int(header['version'])
+        if self.version not in BAR_DTYPES:
+            err_msg = 'history file version %d of %s is not supported' % (self.version, path)
+            logging.error(err_msg)
+            raise IOError(err_msg)
+        self.symbol = header['symbol'].split(b'\0', 1)[0].decode('ascii')
+        self.period = int(header['period'])
+        self.digits = int(header['digits'])
+
+        dtype = BAR_DTYPES[self.version]
+        # a bar being written by the terminal at the end is ignored
+        count = (size - HEADER_SIZE) // dtype.itemsize
+        if count:
+            self.bars = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.bars = np.zeros(0, dtype=dtype)
+
+    def __len__(self):
+        return len(self.bars)
+
+    @property
+    def times(self):
+        """
+        Returns:
+          times(numpy.ndarray): datetime64[s] of each bar. v401 is a view, v400 is converted
+        """
+        times = self.bars['time']
+        if self.version == 400:
+            return times.astype('<i8').astype('<M8[s]')
+        return times
+
+    def _search(self, date):
+        if self.version == 400:
+            return np.searchsorted(self.bars['time'], max(_to_seconds(date), 0))
+        return np.searchsorted(self.bars['time'], np.datetime64(date, 's'))
+
+    def slice(self, from_date=None, to_date=None):
+        """
+        Args:
+          from_date(datetime.datetime): first time of bars. from the first bar if None
+          to_date(datetime.datetime): bars before this time. up to the last bar if None
+        Returns:
+          bars(numpy.ndarray): view of bars of from_date <= time < to_date
+        """
+        start = 0 if from_date is None else self._search(from_date)
+        stop = len(self.bars) if to_date is None else self._search(to_date)
+        return self.bars[start:max(start, stop)]
+
+    @property
+    def first_date(self):
+        return self._to_datetime(self.bars['time'][0]) if len(self.bars) else None
+
+    @property
+    def last_date(self):
+        return self._to_datetime(self.bars['time'][-1]) if len(self.bars) else None
+
+    def _to_datetime(self, value):
+        if self.version == 400:
+            return EPOCH + timedelta(seconds=int(value))
+        return EPOCH + timedelta(seconds=int(value.astype('<i8')))
+
+    def find_gaps(self, from_date=None, to_date=None, max_gap=timedelta(days=3)):
+        """
+        Notes:
+          weekends are about 2 days without bars, so the default max_gap finds only longer gaps.
+        Args:
+          max_gap(datetime.timedelta): gap between bars longer than this is reported
+        Returns:
+          gaps(list(tuple(datetime.datetime, datetime.datetime))): time of the bar before and after each gap
+        """
+        times = self.slice(from_date, to_date)['time'].astype('<i8')
+        if not len(times):
+            return []
+        diffs = np.diff(times)
+        indices = np.nonzero(diffs > max_gap.total_seconds())[0]
+        return [(EPOCH + timedelta(seconds=int(times[i])), EPOCH + timedelta(seconds=int(times[i + 1])))
+                for i in indices]
+
+    def covers(self, from_date, to_date, max_gap=None, slack=DEFAULT_SLACK):
+        """
+        Notes:
+          history covers the range if its bars start by from_date + slack and end by to_date - slack,
+          and no gap is longer than max_gap in the range.
+        Args:
+          max_gap(datetime.timedelta): gaps are not checked if None
+          slack(datetime.timedelta): allowed margin at both ends, for weekends and holidays
+        """
+        if not len(self.bars):
+            return False
+        period = timedelta(minutes=self.period)
+        if self.first_date > from_date + slack or self.last_date + period < to_date - slack:
+            return False
+        if max_gap is not None and self.find_gaps(from_date, to_date, max_gap=max_gap):
+            return False
+        return True
+
+    def close(self):
+        # memory map is closed when the array is released
+        self.bars = np.zeros(0, dtype=self.bars.dtype)
+
+
+def iter_histories(paths, func=None, workers=4):
+    """
+    Notes:
+      open history files and apply func in worker threads, yielding in order of completion.
+      page faults of memory maps are served concurrently, so checks of many symbols and periods
+      overlap their disk reads.
+      e.g.:
+        def check(history):
+            return history.covers(from_date, to_date)
+        for path, ok in iter_histories(paths, check):
+            ...
+    Args:
+      paths(iterable(string)): abs paths of .hst files
+      func(callable): called with HistoryFile. the HistoryFile itself is yielded if None
+      workers(int): num of threads
+    Yields:
+      path(string), result: result of func, or exception raised by opening the file or func
+    """
+    jobs = iter(paths)
+    jobs_lock = threading.Lock()
+    results = queue.Queue()
+
+    def work():
+        while True:
+            with jobs_lock:
+                path = next(jobs, None)
+            if path is None:
+                results.put(None)
+                return
+            try:
+                history = HistoryFile(path)
+                results.put((path, func(history) if func is not None else history))
+            except Exception as e:
+                results.put((path, e))
+
+    for _ in range(workers):
+        worker = threading.Thread(target=work)
+        worker.daemon = True
+        worker.start()
+
+    running = workers
+    while running:
+        result = results.get()
+        if result is None:
+            running -= 1
+            continue
+        yield result
+
+
+def check_coverage(backtests, appdata_path, server, max_gap=None, slack=DEFAULT_SLACK, workers=4):
+    """
+    Notes:
+      check history of every backtest before running terminals.
+    Args:
+      backtests(list(metatrader.backtest.BackTest)): backtests to run
+      appdata_path(string): data dir of mt4
+      server(string): trade server name
+      max_gap(datetime.timedelta), slack(datetime.timedelta): see HistoryFile.covers
+    Returns:
+      uncovered(list(metatrader.backtest.BackTest)): backtests whose history is missing or short
+    """
+    ranges = {}
+    for backtest in backtests:
+        path = get_history_path(appdata_path, server, backtest.symbol, backtest.period)
+        ranges.setdefault(path, []).append(backtest)
+
+    uncovered = []
+    for path, history in iter_histories(list(ranges), workers=workers):
+        if isinstance(history, Exception):
+            logging.warning('history %s is not readable: %s', path, history)
+            uncovered.extend(ranges[path])
+            continue
+        for backtest in ranges[path]:
+            # to_date of backtest is the last day tested
+            to_date = backtest.to_date + timedelta(days=1)
+            if not history.covers(backtest.from_date, to_date, max_gap=max_gap, slack=slack):
+                uncovered.append(backtest)
+    return uncovered
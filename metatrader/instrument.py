@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  phase level instrumentation of backtests.
+  each backtest emits one event per phase:
+    prepare  - writing .ini and .set
+    terminal - terminal run, with peak rss and cpu time of the terminal process
+    report   - reading report, with report size and parse rate
+  events are dicts passed to every registered sink. nothing is done if no sink is registered.
+
+  e.g.:
+    summary = Summary()
+    add_sink(summary)
+    add_sink(JsonLinesSink('events.jsonl'))
+    list(BacktestFarm(aliases).run(backtests))
+    print(summary.format())
+"""
+from __future__ import absolute_import, division
+import contextlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+_sinks = []
+_sinks_lock = threading.Lock()
+# fields added to every event of the thread, e.g. ea_name and alias of running backtest
+_context = threading.local()
+
+PHASE_PREPARE = 'prepare'
+PHASE_TERMINAL = 'terminal'
+PHASE_REPORT = 'report'
+
+# least seconds between writes of prometheus metrics file
+DEFAULT_PROMETHEUS_INTERVAL = 5.0
+
+# num of durations sampled per phase for p95, so memory of a summary is bounded on a long running farm
+RESERVOIR_SIZE = 1024
+
+
+def add_sink(sink):
+    """
+    Args:
+      sink(object): object with write(event). event is a dict
+    """
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def clear_sinks():
+    with _sinks_lock:
+        del _sinks[:]
+
+
+def emit(event):
+    """
+    Notes:
+      pass event to every sink. error of a sink is logged and never raised to the backtest.
+    """
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.write(event)
+        except Exception as e:
+            logging.warning('instrumentation sink %s failed: %s', sink, e)
+
+
+@contextlib.contextmanager
+def context(**fields):
+    """
+    Notes:
+      add fields to every event emitted in this thread in the with block.
+    """
+    saved = getattr(_context, 'fields', {})
+    merged = dict(saved)
+    merged.update(fields)
+    _context.fields = merged
+    try:
+        yield
+    finally:
+        _context.fields = saved
+
+
+@contextlib.contextmanager
+def phase(name, **fields):
+    """
+    Notes:
+      time the with block and emit it as an event of phase name.
+      the yielded dict is the event, so fields known only in the block can be added to it.
+      error is set to the exception message if the block raises.
+      parse_rate(bytes per second) is added if the event has report_bytes.
+    """
+    event = dict(getattr(_context, 'fields', {}))
+    event.update(fields)
+    event['phase'] = name
+    event['started'] = time.time()
+    event['error'] = None
+    timer = time.time
+    if hasattr(time, 'perf_counter'):
+        timer = time.perf_counter
+    started = timer()
+    try:
+        yield event
+    except Exception as e:
+        event['error'] = '%s: %s' % (e.__class__.__name__, e)
+        raise
+    finally:
+        event['elapsed'] = timer() - started
+        if event.get('report_bytes') is not None and event['elapsed'] > 0:
+            event['parse_rate'] = event['report_bytes'] / event['elapsed']
+        if _sinks:
+            emit(event)
+
+
+def wait_process(process):
+    """
+    Notes:
+      wait for exit of subprocess.Popen and collect its resource usage.
+      peak rss and cpu time are None if the platform doesn't tell them.
+    Returns:
+      returncode(int), usage(dict): usage has peak_rss(bytes) and cpu_time(seconds)
+    """
+    usage = {'peak_rss': None, 'cpu_time': None}
+
+    if hasattr(os, 'wait4'):
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+        except OSError:
+            # already reaped
+            return process.wait(), usage
+
+        if os.WIFSIGNALED(status):
+            process.returncode = -os.WTERMSIG(status)
+        else:
+            process.returncode = os.WEXITSTATUS(status)
+        # ru_maxrss is KB on linux and bytes on mac
+        scale = 1 if os.uname()[0] == 'Darwin' else 1024
+        usage['peak_rss'] = rusage.ru_maxrss * scale
+        usage['cpu_time'] = rusage.ru_utime + rusage.ru_stime
+        return process.returncode, usage
+
+    returncode = process.wait()
+    if os.name == 'nt':
+        try:
+            usage.update(_get_windows_usage(process._handle))
+        except Exception as e:
+            logging.debug('resource usage of terminal is not available: %s', e)
+    return returncode, usage
+
+
+def _get_windows_usage(handle):
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    ctypes.windll.psapi.GetProcessMemoryInfo(int(handle), ctypes.byref(counters), counters.cb)
+
+    creation, exit_, kernel, user = (wintypes.FILETIME() for _ in range(4))
+    ctypes.windll.kernel32.GetProcessTimes(int(handle), ctypes.byref(creation), ctypes.byref(exit_),
+                                           ctypes.byref(kernel), ctypes.byref(user))
+
+    def seconds(filetime):
+        # 100ns unit
+        return ((filetime.dwHighDateTime << 32) + filetime.dwLowDateTime) / 1e7
+
+    return {'peak_rss': counters.PeakWorkingSetSize, 'cpu_time': seconds(kernel) + seconds(user)}
+
+
+class LoggingSink(object):
+    """
+    Notes:
+      write each event as one log line
+    """
+
+    def __init__(self, level=logging.INFO, logger=None):
+        self.level = level
+        self.logger = logger or logging.getLogger('metatrader.instrument')
+
+    def write(self, event):
+        fields = ' '.join('%s=%s' % (k, event[k]) for k in sorted(event) if k not in ('phase', 'elapsed'))
+        self.logger.log(self.level, '%s %.3fs %s', event['phase'], event['elapsed'], fields)
+
+
+class JsonLinesSink(object):
+    """
+    Notes:
+      append each event to a file as one json line
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, event):
+        line = json.dumps(event, sort_keys=True, default=str)
+        with self._lock:
+            with open(self.path, 'a') as fp:
+                fp.write(line + '\n')
+
+
+def _percentile(values, rate):
+    ordered = sorted(values)
+    index = int(round(rate * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Summary(object):
+    """
+    Notes:
+      aggregate events of a batch per phase.
+      count, total, min and max are exact. p95 is estimated from a uniform sample of
+      reservoir_size durations, which is exact until a phase has more events than that.
+    Attributes:
+      phases(dict(string:dict)): raw aggregate of each phase
+      reservoir_size(int): max num of durations kept per phase
+    """
+
+    def __init__(self, reservoir_size=RESERVOIR_SIZE):
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self.reservoir_size = reservoir_size
+        self.phases = {}
+
+    def reset(self):
+        with self._lock:
+            self.phases = {}
+
+    def write(self, event):
+        with self._lock:
+            stats = self.phases.setdefault(event['phase'], {'elapsed': [],
+                                                            'count': 0,
+                                                            'total': 0.0,
+                                                            'min': None,
+                                                            'max': None,
+                                                            'errors': 0,
+                                                            'peak_rss': None,
+                                                            'cpu_time': None,
+                                                            'report_bytes': None})
+            elapsed = event['elapsed']
+            stats['count'] += 1
+            # reservoir sampling keeps every duration with the same probability
+            if len(stats['elapsed']) < self.reservoir_size:
+                stats['elapsed'].append(elapsed)
+            else:
+                index = self._random.randrange(stats['count'])
+                if index < self.reservoir_size:
+                    stats['elapsed'][index] = elapsed
+            stats['total'] += elapsed
+            stats['min'] = elapsed if stats['min'] is None else min(stats['min'], elapsed)
+            stats['max'] = elapsed if stats['max'] is None else max(stats['max'], elapsed)
+            if event.get('error') is not None:
+                stats['errors'] += 1
+            if event.get('peak_rss') is not None:
+                stats['peak_rss'] = max(stats['peak_rss'] or 0, event['peak_rss'])
+            if event.get('cpu_time') is not None:
+                stats['cpu_time'] = (stats['cpu_time'] or 0.0) + event['cpu_time']
+            if event.get('report_bytes') is not None:
+                stats['report_bytes'] = (stats['report_bytes'] or 0) + event['report_bytes']
+
+    def summary(self):
+        """
+        Returns:
+          summary(dict(string:dict)): count, errors, total, mean, min, max and p95 seconds of each phase,
+            and peak_rss, cpu_time, report_bytes and parse_rate where available
+        """
+        with self._lock:
+            ret = {}
+            for name, stats in self.phases.items():
+                total = stats['total']
+                ret[name] = {'count': stats['count'],
+                             'errors': stats['errors'],
+                             'total': total,
+                             'mean': total / stats['count'],
+                             'min': stats['min'],
+                             'max': stats['max'],
+                             'p95': _percentile(stats['elapsed'], 0.95),
+                             'peak_rss': stats['peak_rss'],
+                             'cpu_time': stats['cpu_time'],
+                             'report_bytes': stats['report_bytes'],
+                             'parse_rate': stats['report_bytes'] / total if stats['report_bytes'] and total > 0 else None}
+            return ret
+
+    def format(self):
+        """
+        Returns:
+          text(string): summary as a table, phases in order of time spent
+        """
+        summary = self.summary()
+        lines = ['%-10s %6s %6s %10s %10s %10s %10s' % ('phase', 'count', 'errors', 'total(s)', 'mean(s)', 'p95(s)', 'share')]
+        grand_total = sum(s['total'] for s in summary.values()) or 1.0
+        for name, s in sorted(summary.items(), key=lambda item: -item[1]['total']):
+            lines.append('%-10s %6d %6d %10.3f %10.3f %10.3f %9.1f%%'
+                         % (name, s['count'], s['errors'], s['total'], s['mean'], s['p95'],
+                            s['total'] * 100.0 / grand_total))
+        return '\n'.join(lines)
+
+
+class PrometheusSink(Summary):
+    """
+    Notes:
+      keep the summary in a prometheus text format file, e.g. for textfile collector of node exporter.
+      metrics are kept as running totals, and the file is replaced atomically at most once per interval
+      seconds, and on flush and close. so events on the hot path of a farm cost no file write.
+    Attributes:
+      path(string): abs path of metrics file
+      interval(float): least seconds between writes of the file
+    """
+
+    def __init__(self, path, prefix='metatrader', interval=DEFAULT_PROMETHEUS_INTERVAL):
+        super(PrometheusSink, self).__init__()
+        self.path = path
+        self.prefix = prefix
+        self.interval = interval
+        self._file_lock = threading.Lock()
+        self._last_write = None
+
+    def write(self, event):
+        super(PrometheusSink, self).write(event)
+        now = time.time()
+        if self._last_write is None or now - self._last_write >= self.interval:
+            self.flush()
+
+    def flush(self):
+        with self._file_lock:
+            self._last_write = time.time()
+            text = self.format_metrics()
+            tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+            with open(tmp_path, 'w') as fp:
+                fp.write(text)
+            os.replace(tmp_path, self.path)
+
+    def close(self):
+        self.flush()
+
+    def format_metrics(self):
+        metrics = [('phase_seconds_sum', 'counter', 'total', 'seconds spent in phase'),
+                   ('phase_seconds_count', 'counter', 'count', 'num of phases run'),
+                   ('phase_errors_total', 'counter', 'errors', 'num of failed phases'),
+                   ('phase_seconds_max', 'gauge', 'max', 'longest phase in seconds'),
+                   ('terminal_peak_rss_bytes', 'gauge', 'peak_rss', 'peak rss of terminal process'),
+                   ('terminal_cpu_seconds_total', 'counter', 'cpu_time', 'cpu time of terminal processes'),
+                   ('report_bytes_total', 'counter', 'report_bytes', 'size of read reports')]
+        with self._lock:
+            phases = sorted((phase_name, dict(stats)) for phase_name, stats in self.phases.items())
+        lines = []
+        for metric, metric_type, field, help_text in metrics:
+            name = '%s_%s' % (self.prefix, metric)
+            samples = [(phase_name, s[field]) for phase_name, s in phases if s[field] is not None]
+            if not samples:
+                continue
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+            for phase_name, value in samples:
+                lines.append('%s{phase="%s"} %s' % (name, phase_name, repr(float(value))))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  asyncio based terminal launcher. one event loop can supervise many terminals
+  without a thread per terminal.
+  python 3 only, it is imported lazily by MT5.run_async and MT4.run_async.
+
+  e.g.:
+    results = await asyncio.gather(mt5_1.run_async(conf=conf_1, timeout=3600),
+                                   mt5_2.run_async(conf=conf_2, timeout=3600))
+"""
+import asyncio
+import logging
+import os
+import signal
+
+from metatrader.exception import TerminalTimeout
+
+
+async def run_terminal(cmd, timeout=None, success_codes=(0, 3), name='terminal'):
+    """
+    Notes:
+      run terminal and wait for its exit.
+      the whole process tree is killed on timeout or cancellation.
+    Args:
+      cmd(string or list): command line string(run through the shell as subprocess.Popen does on windows)
+        or argument list
+      timeout(float): seconds to wait for terminal exit. wait forever if None
+      success_codes(tuple(int)): exit codes treated as success
+      name(string): terminal name used in error message
+    Returns:
+      returncode(int): exit code of terminal
+    """
+    if isinstance(cmd, (list, tuple)):
+        proc = await asyncio.create_subprocess_exec(*cmd, **_new_process_group())
+    else:
+        proc = await asyncio.create_subprocess_shell(cmd, **_new_process_group())
+
+    try:
+        await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        await kill_process_tree(proc)
+        err = TerminalTimeout(cmd, timeout)
+        logging.error(str(err))
+        raise err
+    except asyncio.CancelledError:
+        await kill_process_tree(proc)
+        raise
+
+    if proc.returncode not in success_codes:
+        err_msg = 'run %s with cmd[%s] failed with %d error code!!' % (name, cmd, proc.returncode)
+        logging.error(err_msg)
+        raise RuntimeError(err_msg)
+
+    return proc.returncode
+
+
+async def kill_process_tree(proc):
+    """
+    Notes:
+      kill process and all of its children, then reap it.
+    Args:
+      proc(asyncio.subprocess.Process): process started by run_terminal
+    """
+    if proc.returncode is None:
+        if os.name == 'nt':
+            killer = await asyncio.create_subprocess_exec('taskkill', '/F', '/T', '/PID', str(proc.pid),
+                                                          stdout=asyncio.subprocess.DEVNULL,
+                                                          stderr=asyncio.subprocess.DEVNULL)
+            await killer.wait()
+        else:
+            try:
+                # the terminal is the leader of its own process group
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+    await proc.wait()
+
+
+def _new_process_group():
+    # start the terminal in its own process group so that the tree can be killed at once
+    if os.name == 'nt':
+        import subprocess
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
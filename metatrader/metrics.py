@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  performance metrics of equity curves by vectorized numpy.
+  every function takes an equity curve as 1D array, or many curves as 2D array of
+  (num of curves, num of points), and reduces along the last axis.
+  curves of different length are stacked by stack(), which pads them with nan,
+  and nan is ignored by every metric.
+
+  e.g.:
+    reports = [backtest.run() for backtest in backtests]
+    equity, years = get_equity_curves(reports)
+    result = compute(equity, years=years)
+    best = np.nanargmax(result['sharpe_ratio'])
+"""
+from __future__ import absolute_import, division
+import contextlib
+import warnings
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400.0
+DAYS_PER_YEAR = 365.25
+
+
+def _divide(numerator, denominator):
+    # nan instead of inf and warnings where denominator is 0
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret = numerator / denominator
+    return np.where(denominator == 0, np.nan, ret)
+
+
+@contextlib.contextmanager
+def _ignore_empty():
+    # all nan rows, e.g. padding of a shorter curve, are nan without warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            yield
+
+
+def _nanmax(values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[-1] == 0:
+        return np.full(values.shape[:-1], np.nan)
+    with _ignore_empty():
+        return np.nanmax(values, axis=-1)
+
+
+def stack(curves):
+    """
+    Notes:
+      stack curves of different length into one 2D array padded with nan at the end.
+    Args:
+      curves(list(array like)): equity curves
+    Returns:
+      equity(numpy.ndarray): (num of curves, length of the longest curve)
+    """
+    length = max([len(curve) for curve in curves] or [0])
+    equity = np.full((len(curves), length), np.nan)
+    for i, curve in enumerate(curves):
+        equity[i, :len(curve)] = curve
+    return equity
+
+
+def get_equity_curve(deals):
+    """
+    Notes:
+      balance after the initial deposit and each closing deal. in deals are skipped,
+      so a point of the curve is one closed trade.
+    Args:
+      deals(metatrader.deals.DealTable): deals of backtest
+    Returns:
+      equity(numpy.ndarray): balance curve
+    """
+    if not len(deals):
+        return np.array([], dtype=np.float64)
+    closing = deals.direction != 'in'
+    closing[0] = True
+    return deals.balance[closing]
+
+
+def get_equity_curves(reports):
+    """
+    Args:
+      reports(list(metatrader.report.BacktestReport)): backtest reports
+    Returns:
+      equity(numpy.ndarray), years(numpy.ndarray): stacked equity curves and tested years of each report
+    """
+    equity = stack([get_equity_curve(report.deals) for report in reports])
+    years = np.array([(report.to_date - report.from_date).total_seconds() / SECONDS_PER_DAY / DAYS_PER_YEAR
+                      for report in reports], dtype=np.float64)
+    return equity, years
+
+
+def get_returns(equity):
+    """
+    Returns:
+      returns(numpy.ndarray): simple return of each step. one shorter than equity
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    return _divide(np.diff(equity, axis=-1), equity[..., :-1])
+
+
+def get_drawdown(equity):
+    """
+    Returns:
+      drawdown(numpy.ndarray), rate(numpy.ndarray): drawdown from the running peak in money and in %
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    # fmax skips nan, so padding never becomes a peak
+    peak = np.fmax.accumulate(equity, axis=-1)
+    drawdown = peak - equity
+    return drawdown, _divide(drawdown, peak) * 100.0
+
+
+def max_drawdown(equity):
+    """
+    Returns:
+      rate(float or numpy.ndarray): maximal drawdown in % of the running peak
+    """
+    return _nanmax(get_drawdown(equity)[1])
+
+
+def sharpe_ratio(equity, risk_free=0.0, periods_per_year=1.0):
+    """
+    Notes:
+      mean over standard deviation of returns per step, scaled by sqrt(periods_per_year).
+      a step is a closed trade for curves of get_equity_curve.
+    Args:
+      risk_free(float): risk free return per step
+      periods_per_year(float): num of steps per year, 1 leaves the ratio per step
+    """
+    excess = get_returns(equity) - risk_free
+    with _ignore_empty():
+        mean = np.nanmean(excess, axis=-1)
+        std = np.nanstd(excess, axis=-1, ddof=1)
+    return _divide(mean, std) * np.sqrt(periods_per_year)
+
+
+def sortino_ratio(equity, target=0.0, periods_per_year=1.0):
+    """
+    Notes:
+      mean excess return over downside deviation, which counts only returns below target.
+    Args:
+      target(float): target return per step
+      periods_per_year(float): num of steps per year
+    """
+    excess = get_returns(equity) - target
+    with _ignore_empty():
+        mean = np.nanmean(excess, axis=-1)
+        downside = np.sqrt(np.nanmean(np.minimum(excess, 0.0) ** 2, axis=-1))
+    return _divide(mean, downside) * np.sqrt(periods_per_year)
+
+
+def _last(equity):
+    # last value which is not nan padding
+    equity = np.asarray(equity, dtype=np.float64)
+    index = equity.shape[-1] - 1 - np.argmax(~np.isnan(equity[..., ::-1]), axis=-1)
+    return np.take_along_axis(equity, np.expand_dims(index, -1), axis=-1)[..., 0]
+
+
+def annual_return(equity, years):
+    """
+    Args:
+      years(float or numpy.ndarray): tested years of each curve
+    Returns:
+      rate(float or numpy.ndarray): compound annual growth in %
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    growth = _divide(_last(equity), equity[..., 0])
+    with _ignore_empty():
+        return (np.power(growth, _divide(1.0, years)) - 1.0) * 100.0
+
+
+def calmar_ratio(equity, years):
+    """
+    Notes:
+      annual return over maximal drawdown, both in %.
+    Args:
+      years(float or numpy.ndarray): tested years of each curve
+    """
+    return _divide(annual_return(equity, years), max_drawdown(equity))
+
+
+def ulcer_index(equity):
+    """
+    Notes:
+      root mean square of drawdown in %. depth and length of drawdowns both raise it.
+    """
+    rate = get_drawdown(equity)[1]
+    with _ignore_empty():
+        return np.sqrt(np.nanmean(rate ** 2, axis=-1))
+
+
+def time_under_water(equity, time=None):
+    """
+    Notes:
+      longest period below the running peak, from the point on the peak to the last point under it.
+    Args:
+      time(numpy.ndarray): datetime64 of each point, same shape as equity. None counts points
+    Returns:
+      duration(float or numpy.ndarray): num of points, or days if time is given
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    _, rate = get_drawdown(equity)
+    steps = np.broadcast_to(np.arange(equity.shape[-1]), equity.shape)
+    # index of the last point on the peak, carried forward over points under water
+    on_peak = ~(rate > 0)
+    last_peak = np.maximum.accumulate(np.where(on_peak, steps, 0), axis=-1)
+
+    if time is None:
+        elapsed = steps.astype(np.float64)
+    else:
+        time = np.asarray(time).astype('datetime64[s]')
+        elapsed = (time - time[..., :1]).astype(np.float64) / SECONDS_PER_DAY
+        elapsed[np.isnat(time)] = np.nan
+    duration = elapsed - np.take_along_axis(elapsed, last_peak, axis=-1)
+    return _nanmax(duration)
+
+
+def _windows(values, window):
+    # read only view of (..., num of windows, window) without copy
+    shape = values.shape[:-1] + (values.shape[-1] - window + 1, window)
+    strides = values.strides + (values.strides[-1],)
+    return np.lib.stride_tricks.as_strided(values, shape=shape, strides=strides, writeable=False)
+
+
+def rolling_drawdown(equity, window):
+    """
+    Notes:
+      maximal drawdown in % within each trailing window of points.
+      first window - 1 points are nan, so the result is aligned with equity.
+    Args:
+      window(int): num of points of a window
+    Returns:
+      rate(numpy.ndarray): same shape as equity
+    """
+    equity = np.ascontiguousarray(equity, dtype=np.float64)
+    ret = np.full(equity.shape, np.nan)
+    if window < 1 or equity.shape[-1] < window:
+        return ret
+
+    windows = _windows(equity, window)
+    peak = np.fmax.accumulate(windows, axis=-1)
+    rate = _divide(peak - windows, peak) * 100.0
+    ret[..., window - 1:] = _nanmax(rate)
+    return ret
+
+
+def compute(equity, years=None, time=None, periods_per_year=1.0):
+    """
+    Notes:
+      every metric of curves at once.
+    Args:
+      equity(numpy.ndarray): 1D curve or 2D curves
+      years(float or numpy.ndarray): tested years of each curve. calmar_ratio and annual_return are nan if None
+      time(numpy.ndarray): datetime64 of each point. time_under_water is in points if None
+      periods_per_year(float): num of steps per year for sharpe and sortino ratio
+    Returns:
+      metrics(dict(string:float or numpy.ndarray)): sharpe_ratio, sortino_ratio, calmar_ratio,
+        annual_return, max_drawdown, ulcer_index and time_under_water
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    nan = np.full(equity.shape[:-1], np.nan)
+    return {'sharpe_ratio': sharpe_ratio(equity, periods_per_year=periods_per_year),
+            'sortino_ratio': sortino_ratio(equity, periods_per_year=periods_per_year),
+            'calmar_ratio': calmar_ratio(equity, years) if years is not None else nan,
+            'annual_return': annual_return(equity, years) if years is not None else nan,
+            'max_drawdown': max_drawdown(equity),
+            'ulcer_index': ulcer_index(equity),
+            'time_under_water': time_under_water(equity, time=time)}
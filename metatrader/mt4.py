@@ -20,6 +20,8 @@ DEFAULT_MT4_NAME = 'default'
 # mt4 program file path is written in origin.txt
 ORIGIN_TXT = 'origin.txt'
 MT4_EXE = 'terminal.exe'
+# terminal.exe exits with 3 after testing when ShutdownTerminal is enabled
+SUCCESS_RETURN_CODES = (0, 3)
 
 
 class MT4(object):
@@ -57,6 +59,27 @@ class MT4(object):
             logging.error(err_msg)
             raise IOError(err_msg)
 
+    def get_cmd(self, conf, portable_mode=False):
+        """
+        Notes:
+          build command line of terminal.exe
+        Args:
+          conf(string): abs path of conf file.
+        Returns:
+          cmd(string or list): command line string on windows, argument list on posix
+        """
+        prog_raw = os.path.join(self.prog_path, MT4_EXE)
+
+        if os.name != 'nt':
+            # no shell on posix, so quoting is done by passing a list
+            return [prog_raw] + (['/portable'] if portable_mode == True else []) + [conf]
+
+        if portable_mode == False:
+            prog = '"%s"' % prog_raw
+        else:
+            prog = '"%s" /portable' % prog_raw
+        return '%s "%s"' % (prog, conf)
+
     def run(self, ea_name, conf=None, portable_mode=False):
         """
         Notes:
@@ -66,18 +89,19 @@ class MT4(object):
             details see mt4 help doc Client Terminal/Tools/Configuration at Startup
         """
         import subprocess
+        from metatrader import instrument
 
         if conf:
-            if portable_mode == False:
-                prog = '"%s"' % os.path.join(self.prog_path, MT4_EXE)
-            else:
-                prog = '"%s" /portable' % os.path.join(self.prog_path, MT4_EXE)
-            conf = '"%s"' % conf
-            cmd = '%s %s' % (prog, conf)
-
-            p = subprocess.Popen(cmd)
-            p.wait()
-            if ((p.returncode == 0) or (p.returncode == 3)):
+            cmd = self.get_cmd(conf, portable_mode=portable_mode)
+
+            with instrument.phase(instrument.PHASE_TERMINAL, terminal='mt4') as event:
+                p = subprocess.Popen(cmd)
+                _, usage = instrument.wait_process(p)
+                event.update(usage)
+                event['returncode'] = p.returncode
+                if p.returncode not in SUCCESS_RETURN_CODES:
+                    event['error'] = 'exit code %d' % p.returncode
+            if p.returncode in SUCCESS_RETURN_CODES:
                 # Logging info will cause command prompt to wait for enter key which is not required in this case
                 #logging.info('cmd[%s] succeeded', cmd)
                 pass
@@ -86,6 +110,26 @@ class MT4(object):
                 logging.error(err_msg)
                 raise RuntimeError(err_msg)
 
+    def run_async(self, ea_name=None, conf=None, portable_mode=False, timeout=None):
+        """
+        Notes:
+          asyncio version of run. e.g.: await mt4.run_async(conf=conf, timeout=3600)
+          terminal process tree is killed on timeout or when the task is cancelled.
+        Args:
+          conf(string): abs path of conf file.
+          timeout(float): seconds to wait for terminal exit. wait forever if None
+        Returns:
+          coroutine which raises metatrader.exception.TerminalTimeout on timeout
+          and RuntimeError if terminal exits with error code.
+        """
+        from metatrader.launcher import run_terminal
+
+        if not conf:
+            raise ValueError('conf is required to run mt4 asynchronously')
+
+        cmd = self.get_cmd(conf, portable_mode=portable_mode)
+        return run_terminal(cmd, timeout=timeout, success_codes=SUCCESS_RETURN_CODES, name='mt4')
+
 
 def has_mt4_subdirs(appdata_path):
     """
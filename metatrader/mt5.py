@@ -9,17 +9,29 @@ import subprocess
 
 try:
     import winreg
-except:
-    import _winreg as winreg
+except ImportError:
+    try:
+        import _winreg as winreg
+    except ImportError:
+        # not on windows. e.g. a stand-in terminal on linux
+        winreg = None
 import codecs
+import threading
 
 _mt5s = {}
 _portable_mode = False
+# memo of is_uac_enabled. None until registry is read
+_uac_enabled = None
+# origin.txt content -> appdata dir. None until appdata dirs are scanned
+_origin_index = None
+_origin_index_lock = threading.Lock()
 
 DEFAULT_MT5_NAME = 'default'
 # mt5 program file path is written in origin.txt
 ORIGIN_TXT = 'origin.txt'
 MT5_EXE = 'terminal64.exe'
+# terminal64.exe exits with 3 after testing when ShutdownTerminal is enabled
+SUCCESS_RETURN_CODES = (0, 3)
 
 
 class MT5(object):
@@ -34,10 +46,33 @@ class MT5(object):
 
     def __init__(self, prog_path):
         self.prog_path_raw = prog_path
+        # portable mode -> resolved appdata path
+        self._appdata_paths = {}
         self.get_appdata_path
 
+    def invalidate(self):
+        """
+        Notes:
+          forget resolved appdata path. it is resolved again on next get_mt5.
+        """
+        self._appdata_paths = {}
+
     @property
     def get_appdata_path(self):
+        """
+        Notes:
+          resolve appdata path once per portable mode. call invalidate to resolve again.
+        """
+        portable_mode = _portable_mode
+        if portable_mode in self._appdata_paths:
+            self.prog_path = self.prog_path_raw
+            self.appdata_path = self._appdata_paths[portable_mode]
+            return
+
+        self._resolve_appdata_path()
+        self._appdata_paths[portable_mode] = self.appdata_path
+
+    def _resolve_appdata_path(self):
         global _portable_mode
         if os.path.exists(self.prog_path_raw):
             self.prog_path = self.prog_path_raw
@@ -60,6 +95,39 @@ class MT5(object):
             logging.error(err_msg)
             raise IOError(err_msg)
 
+    def get_cmd(self, conf, portable_mode=False):
+        """
+        Notes:
+          build command line of terminal64.exe
+        Args:
+          conf(string): abs path of conf file.
+        Returns:
+          cmd(string or list): command line string on windows, argument list on posix
+        """
+        prog_raw = '%s' % os.path.join(self.prog_path, MT5_EXE)
+
+        if not os.path.exists(self.prog_path) and not os.path.isfile(prog_raw):
+            err_msg = 'MT5 path, %s does not exist!!!' % (prog_raw)
+            logging.error(err_msg)
+            raise IOError(err_msg)
+
+        if portable_mode == True:
+            prog = '"%s" /portable' % prog_raw
+        else:
+            prog = '"%s"' % prog_raw
+
+        if not os.path.isfile(conf):
+            err_msg = 'conf path, \"%s\" does not exist!!!' % (conf)
+            logging.error(err_msg)
+            raise IOError(err_msg)
+
+        if os.name == 'nt':
+            cmd = '%s /config:"%s"' % (prog, conf)
+        else:
+            # no shell on posix, so quoting is done by passing a list
+            cmd = [prog_raw] + (['/portable'] if portable_mode == True else []) + ['/config:%s' % conf]
+        return cmd
+
     def run(self, ea_name, conf=None, portable_mode=False):
         """
         Notes:
@@ -69,32 +137,20 @@ class MT5(object):
             details see mt5 help doc Client Terminal/Tools/Configuration at Startup
         """
         import subprocess
+        from metatrader import instrument
 
         if conf:
-            prog_raw = '%s' % os.path.join(self.prog_path, MT5_EXE)
-
-            if not os.path.exists(self.prog_path) and not os.path.isfile(prog_raw):
-                err_msg = 'MT5 path, %s does not exist!!!' % (prog_raw)
-                logging.error(err_msg)
-                raise IOError(err_msg)
-
-            if portable_mode == True:
-                prog = '"%s" /portable' % prog_raw
-            else:
-                prog = '"%s"' % prog_raw
-
-            if not os.path.isfile(conf):
-                err_msg = 'conf path, \"%s\" does not exist!!!' % (conf)
-                logging.error(err_msg)
-                raise IOError(err_msg)
-
-            conf = '/config:"%s"' % conf
-            cmd = '%s %s' % (prog, conf)
+            cmd = self.get_cmd(conf, portable_mode=portable_mode)
 
             #print ('Calling subprocess with cmd: %s' % (cmd))
-            p = subprocess.Popen(cmd)
-            p.wait()
-            if ((p.returncode == 0) or (p.returncode == 3)):
+            with instrument.phase(instrument.PHASE_TERMINAL, terminal='mt5') as event:
+                p = subprocess.Popen(cmd)
+                _, usage = instrument.wait_process(p)
+                event.update(usage)
+                event['returncode'] = p.returncode
+                if p.returncode not in SUCCESS_RETURN_CODES:
+                    event['error'] = 'exit code %d' % p.returncode
+            if p.returncode in SUCCESS_RETURN_CODES:
                 # Logging info will cause command prompt to wait for enter key which is not required in this case
                 #logging.info('cmd[%s] succeeded', cmd)
                 pass
@@ -103,6 +159,26 @@ class MT5(object):
                 logging.error(err_msg)
                 raise RuntimeError(err_msg)
 
+    def run_async(self, ea_name=None, conf=None, portable_mode=False, timeout=None):
+        """
+        Notes:
+          asyncio version of run. e.g.: await mt5.run_async(conf=conf, timeout=3600)
+          terminal process tree is killed on timeout or when the task is cancelled.
+        Args:
+          conf(string): abs path of conf file.
+          timeout(float): seconds to wait for terminal exit. wait forever if None
+        Returns:
+          coroutine which raises metatrader.exception.TerminalTimeout on timeout
+          and RuntimeError if terminal exits with error code.
+        """
+        from metatrader.launcher import run_terminal
+
+        if not conf:
+            raise ValueError('conf is required to run mt5 asynchronously')
+
+        cmd = self.get_cmd(conf, portable_mode=portable_mode)
+        return run_terminal(cmd, timeout=timeout, success_codes=SUCCESS_RETURN_CODES, name='mt5')
+
 
 def has_mt5_subdirs(appdata_path):
     """
@@ -136,30 +212,42 @@ def is_uac_enabled():
       check uac is enabled or not from reg value.
     Returns:
      True if uac is enabled, False if uac is disabled.
+      always False if registry is not available(non windows).
+      registry is read only once, see invalidate_appdata_path.
     """
-    import winreg
+    global _uac_enabled
+
+    if _uac_enabled is not None:
+        return _uac_enabled
+
+    if winreg is None:
+        _uac_enabled = False
+        return _uac_enabled
 
     reg_key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, 'SOFTWARE\Microsoft\Windows\CurrentVersion\Policies\System', 0, winreg.KEY_READ)
     value, regtype = winreg.QueryValueEx(reg_key, 'EnableLUA')
 
     if value == 1:
         # reg value 1 means UAC is enabled
-        return True
+        _uac_enabled = True
     else:
-        return False
+        _uac_enabled = False
+    return _uac_enabled
 
 
-def get_appdata_path(program_file_dir):
+def build_origin_index():
     """
+    Notes:
+      scan %APPDATA%\\MetaQuotes\\Terminal once and index every appdata dir by its origin.txt.
     Returns:
-      AppData path corresponding to provided program file path
-      e.g.: C:\\Users\\UserName\\AppData\\Roaming\\MetaQuotes\\Terminal\\7269C010EA668AEAE793BEE37C26ED57
+      index(dict(string:string)): program file path -> appdata path
     """
+    index = {}
     app_data = os.environ.get('APPDATA')
+    if app_data is None:
+        return index
     mt5_appdata_path = os.path.join(app_data, 'MetaQuotes', 'Terminal')
 
-    app_dir = None
-
     walk_depth = 1
     for root, dirs, files in os.walk(mt5_appdata_path):
         # search ORIGIN_TXT until walk_depth
@@ -168,16 +256,32 @@ def get_appdata_path(program_file_dir):
         if ORIGIN_TXT in files:
             origin_file = os.path.join(root, ORIGIN_TXT)
 
-            import codecs
             with codecs.open(origin_file, 'r', 'utf-16') as fp:
                 line = fp.read()
-                if line == program_file_dir:
-                    app_dir = root
-                    break
+                # first dir wins like the former linear search
+                index.setdefault(line, root)
 
         if depth >= walk_depth:
             dirs[:] = []
 
+    return index
+
+
+def get_appdata_path(program_file_dir):
+    """
+    Notes:
+      appdata dirs are indexed on first call, see build_origin_index.
+    Returns:
+      AppData path corresponding to provided program file path
+      e.g.: C:\\Users\\UserName\\AppData\\Roaming\\MetaQuotes\\Terminal\\7269C010EA668AEAE793BEE37C26ED57
+    """
+    global _origin_index
+
+    with _origin_index_lock:
+        if _origin_index is None:
+            _origin_index = build_origin_index()
+        app_dir = _origin_index.get(program_file_dir)
+
     if app_dir == None:
         err_msg = '%s does not have appdata dir!.' % program_file_dir
         logging.error(err_msg)
@@ -224,3 +328,23 @@ def get_mt5(alias = DEFAULT_MT5_NAME, portable_mode = False):
         return _mt5s[alias]
     else:
         raise RuntimeError('mt5[%s] is not initialized.' % alias)
+
+
+def invalidate_appdata_path(alias = None):
+    """
+    Notes:
+      forget resolved appdata paths, origin.txt index and uac setting.
+      call this after installing a terminal or moving its data dir.
+    Args:
+      alias(string): mt5 object alias name to invalidate. all aliases if None
+    """
+    global _origin_index
+    global _uac_enabled
+
+    with _origin_index_lock:
+        _origin_index = None
+    _uac_enabled = None
+
+    for name in _mt5s:
+        if alias is None or name == alias:
+            _mt5s[name].invalidate()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  event based html parser for mt reports.
+  a report is parsed exactly once into plain tables of cell texts,
+  which is much faster and smaller than building a BeautifulSoup tree.
+"""
+from __future__ import absolute_import
+
+try:
+    from html.parser import HTMLParser
+except ImportError:
+    from HTMLParser import HTMLParser
+
+# read size of report file
+CHUNK_SIZE = 256 * 1024
+
+
+class Cell(object):
+    """
+    Notes:
+      td tag in report
+    Attributes:
+      text(string): all text in td like BeautifulSoup Tag.text
+      attrs(dict): attributes of td
+    """
+    __slots__ = ('text', 'attrs')
+
+    def __init__(self, text, attrs):
+        self.text = text
+        self.attrs = attrs
+
+
+class ReportParser(HTMLParser):
+    """
+    Notes:
+      collects every table of report as list of rows, row is list of Cell.
+      text of div tags with style attribute are collected as titles of report.
+      rows of stream_table are not kept in tables, they are handed out by iter_rows
+      so that memory stays flat regardless of report size.
+      row_handler is called with table index and row for every row, and the row is not kept
+      in tables if it returns True. e.g. metatrader.deals.DealTableBuilder
+    Attributes:
+      tables(list(list(list(Cell)))): tables in document order
+      titles(list(string)): text of div tags with style attribute
+      stream_table(int): index of table which is streamed by iter_rows. None streams nothing
+      row_handler(callable): called as row_handler(table_index, row). None keeps every row
+      closed_tables(int): num of tables closed so far
+    """
+
+    def __init__(self, stream_table=None, row_handler=None):
+        HTMLParser.__init__(self)
+        self.tables = []
+        self.titles = []
+        self.stream_table = stream_table
+        self.row_handler = row_handler
+        self.closed_tables = 0
+        # rows of stream_table which are not handed out yet
+        self._pending_rows = []
+        # index of open tables in self.tables, innermost is last
+        self._table_stack = []
+        self._row = None
+        self._cell_text = None
+        self._cell_attrs = None
+        # text buffers of open div tags. None for div without style
+        self._div_stack = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'td':
+            self._close_cell()
+            self._cell_text = []
+            self._cell_attrs = dict(attrs)
+        elif tag == 'tr':
+            self._close_row()
+            self._row = []
+        elif tag == 'table':
+            self._close_row()
+            self.tables.append([])
+            self._table_stack.append(len(self.tables) - 1)
+        elif tag == 'div':
+            has_style = any(name == 'style' for name, _ in attrs)
+            self._div_stack.append([] if has_style else None)
+
+    def handle_endtag(self, tag):
+        if tag == 'td':
+            self._close_cell()
+        elif tag == 'tr':
+            self._close_row()
+        elif tag == 'table':
+            self._close_row()
+            if self._table_stack:
+                self._table_stack.pop()
+                self.closed_tables += 1
+        elif tag == 'div':
+            if self._div_stack:
+                texts = self._div_stack.pop()
+                if texts is not None:
+                    self.titles.append(''.join(texts))
+
+    def handle_data(self, data):
+        if self._cell_text is not None:
+            self._cell_text.append(data)
+        for texts in self._div_stack:
+            if texts is not None:
+                texts.append(data)
+
+    def _close_cell(self):
+        if self._cell_text is not None:
+            if self._row is None:
+                self._row = []
+            self._row.append(Cell(''.join(self._cell_text), self._cell_attrs))
+            self._cell_text = None
+            self._cell_attrs = None
+
+    def _close_row(self):
+        self._close_cell()
+        if self._row is not None:
+            if self._table_stack:
+                table_index = self._table_stack[-1]
+                if self.row_handler is not None and self.row_handler(table_index, self._row):
+                    pass
+                elif table_index == self.stream_table:
+                    self._pending_rows.append(self._row)
+                else:
+                    self.tables[table_index].append(self._row)
+            self._row = None
+
+    def close(self):
+        HTMLParser.close(self)
+        self._close_row()
+
+    def iter_rows(self, report_file, chunk_size=CHUNK_SIZE):
+        """
+        Notes:
+          parse report file incrementally and yield rows of stream_table as soon as they are closed.
+          tables and titles before the streamed table are complete when its first row is yielded.
+        Args:
+          report_file(string): abs path of report
+        """
+        with open(report_file, 'r') as fp:
+            while True:
+                chunk = fp.read(chunk_size)
+                if not chunk:
+                    break
+                self.feed(chunk)
+                for row in self._drain_rows():
+                    yield row
+        self.close()
+        for row in self._drain_rows():
+            yield row
+
+    def _drain_rows(self):
+        rows = self._pending_rows
+        self._pending_rows = []
+        return rows
+
+
+def parse_report(report_file, chunk_size=CHUNK_SIZE, row_handler=None, max_tables=None):
+    """
+    Notes:
+      parse report file in one pass.
+      with max_tables, reading stops once that num of tables are closed,
+      e.g. max_tables=1 reads only as far as the summary table of a backtest report.
+    Args:
+      report_file(string): abs path of report
+      row_handler(callable): see ReportParser
+      max_tables(int): num of tables to parse. None parses the whole report
+    Returns:
+      parser(ReportParser): parsed report
+    """
+    parser = ReportParser(row_handler=row_handler)
+    with open(report_file, 'r') as fp:
+        while max_tables is None or parser.closed_tables < max_tables:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+    parser.close()
+    return parser
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  exhaustive optimization split across terminals.
+  param space of backtest is cut into disjoint partitions along its largest axes,
+  every partition is optimized by its own terminal at the same time,
+  and passes of all partition reports are merged into one result set without duplicates.
+  so slow complete optimization speeds up nearly linearly with the number of terminals.
+
+  e.g.:
+    optimization = PartitionedOptimization(backtest, aliases=['mt5-1', 'mt5-2', 'mt5-3', 'mt5-4'])
+    results = optimization.run()
+    best = max(results, key=lambda r: r.profit)
+"""
+from __future__ import absolute_import, division
+import copy
+import logging
+
+from metatrader.farm import BacktestFarm
+from metatrader.mt5 import DEFAULT_MT5_NAME
+from metatrader.search import count_passes, get_param_axes
+from metatrader.store import get_param_hash
+
+
+def _split_values(values, count):
+    # contiguous chunks whose sizes differ by one at most
+    size, rest = divmod(len(values), count)
+    chunks = []
+    start = 0
+    for i in range(count):
+        stop = start + size + (1 if i < rest else 0)
+        chunks.append(values[start:stop])
+        start = stop
+    return chunks
+
+
+def split_param(param, partitions):
+    """
+    Notes:
+      the largest axis is split first. if it has fewer values than partitions,
+      the next largest axis is split as well, and so on.
+      bool params are never split because terminal reads only both of them.
+    Args:
+      param(dict): ea param of BackTest
+      partitions(int): num of partitions wanted
+    Returns:
+      params(list(dict)): ea param of each partition. fewer than partitions if the space is small
+    """
+    axes = [(name, values) for name, values in get_param_axes(param) if param[name].get('type') != 'bool']
+    axes.sort(key=lambda axis: -len(axis[1]))
+
+    splits = []
+    num_parts = 1
+    for name, values in axes:
+        if num_parts >= partitions:
+            break
+        count = min(len(values), -(-partitions // num_parts))
+        if count > 1:
+            splits.append((name, _split_values(values, count)))
+            num_parts *= count
+
+    params = [copy.deepcopy(param)]
+    for name, chunks in splits:
+        split = []
+        for part in params:
+            for chunk in chunks:
+                spec = dict(part[name])
+                spec['value'] = chunk[0]
+                spec['max'] = chunk[-1]
+                new_part = dict(part)
+                new_part[name] = spec
+                split.append(new_part)
+        params = split
+    return params
+
+
+def merge_results(backtest, reports):
+    """
+    Args:
+      backtest(metatrader.backtest.BackTest): optimized backtest
+      reports(list(OptimizationReport)): reports of partitions
+    Returns:
+      results(list(ShortReport)): passes of every report, the first one of the same param values is kept
+    """
+    seen = set()
+    merged = []
+    for report in reports:
+        for result in report.results:
+            key = get_param_hash(backtest, result.param)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(result)
+    return merged
+
+
+class PartitionedOptimization(object):
+    """
+    Notes:
+      pass_number of merged results is the one in the report of its partition.
+    Attributes:
+      backtest(metatrader.backtest.BackTest): backtest whose param has max/interval to optimize
+      partitions(int): num of partitions. num of aliases by default
+      passes(int): num of passes of the whole space
+      results(list(ShortReport)): merged passes of the last run
+      failed(list(metatrader.farm.FarmResult)): partitions failed in the last run
+      farm(metatrader.farm.BacktestFarm): farm running partitions
+    """
+
+    def __init__(self, backtest, aliases=(DEFAULT_MT5_NAME,), partitions=None, cache=None, store=None):
+        self.backtest = backtest
+        self.partitions = partitions or len(aliases)
+        self.passes = count_passes(backtest.param)
+        self.results = []
+        self.failed = []
+        self.farm = BacktestFarm(aliases, cache=cache, store=store)
+
+    def get_backtests(self):
+        """
+        Returns:
+          backtests(list(metatrader.backtest.BackTest)): optimization of each partition
+        """
+        backtests = []
+        for param in split_param(self.backtest.param, self.partitions):
+            backtest = copy.copy(self.backtest)
+            backtest.param = param
+            backtests.append(backtest)
+        return backtests
+
+    def run(self):
+        """
+        Notes:
+          optimize every partition concurrently and merge their passes.
+          a failed partition is logged and its passes are missing in results.
+        Returns:
+          results(list(ShortReport)): merged passes
+        """
+        backtests = self.get_backtests()
+        order = dict((id(backtest), i) for i, backtest in enumerate(backtests))
+        reports = [None] * len(backtests)
+        self.failed = []
+
+        for result in self.farm.optimize(backtests):
+            if not result.succeeded or result.report is None:
+                logging.error('optimization of partition %d failed: %s', order[id(result.backtest)], result.error)
+                self.failed.append(result)
+                continue
+            reports[order[id(result.backtest)]] = result.report
+
+        self.results = merge_results(self.backtest, [report for report in reports if report is not None])
+        if len(self.results) < self.passes and not self.failed:
+            logging.warning('%d of %d passes are in reports of partitions', len(self.results), self.passes)
+        return self.results
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  pool of portable terminals cloned from one install.
+  every terminal running in parallel needs its own data dir, but a full copy of an install
+  with tick history is tens of GB. a clone links immutable files(executable, history, ticks, experts,
+  tick and history caches of tester) to the install and has private copies only of the files a terminal
+  writes on every run. so a pool of 16 terminals is ready in seconds and costs almost no disk.
+
+  e.g.:
+    with TerminalPool('C:\\MetaTrader 5', 'D:\\pool', 16) as pool:
+        for result in BacktestFarm(pool.aliases).run(backtests):
+            ...
+"""
+from __future__ import absolute_import
+import fnmatch
+import logging
+import os
+import shutil
+import stat
+
+from metatrader import mt5
+
+LINK_HARDLINK = 'hardlink'
+LINK_REFLINK = 'reflink'
+LINK_COPY = 'copy'
+
+# dirs and files written by terminal or tester on every run, relative to data dir. every clone has its own copy.
+# a component may be a wildcard pattern
+MUTABLE_DIRS = (os.path.join('Tester', '*.ini'),
+                os.path.join('Tester', 'logs'),
+                os.path.join('Tester', 'Agent-*'),
+                'Profiles',
+                'config',
+                'logs',
+                os.path.join('MQL5', 'Profiles'),
+                os.path.join('MQL5', 'Logs'),
+                os.path.join('MQL5', 'Files'))
+
+# dirs whose linked files are made read only, e.g. tick and history caches of tester.
+# a hardlink shares its mode with the install, so a terminal can't rewrite a cache shared by the pool.
+# modes of the install are restored by teardown
+READONLY_DIRS = ('Tester',)
+
+# ioctl of linux to share extents of a file, copy on write
+FICLONE = 0x40049409
+
+
+def reflink_file(src, dst):
+    """
+    Notes:
+      copy on write clone of src. supported by e.g. btrfs and xfs on linux.
+      raises OSError if not supported by the file system.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError('reflink is not supported on this platform')
+
+    with open(src, 'rb') as src_fp:
+        with open(dst, 'wb') as dst_fp:
+            try:
+                fcntl.ioctl(dst_fp.fileno(), FICLONE, src_fp.fileno())
+            except (IOError, OSError):
+                dst_fp.close()
+                os.remove(dst)
+                raise
+    shutil.copystat(src, dst)
+
+
+def link_file(src, dst, link=LINK_HARDLINK):
+    """
+    Notes:
+      link dst to src. falls back to a copy if the link is not possible,
+      e.g. src and dst are on different volumes.
+    Args:
+      link(string): one of LINK_HARDLINK, LINK_REFLINK and LINK_COPY
+    Returns:
+      linked(bool): True if linked, False if copied
+    """
+    try:
+        if link == LINK_HARDLINK:
+            os.link(src, dst)
+            return True
+        elif link == LINK_REFLINK:
+            reflink_file(src, dst)
+            return True
+    except (AttributeError, OSError) as e:
+        logging.debug('%s of %s failed, copied instead: %s', link, src, e)
+
+    shutil.copy2(src, dst)
+    return False
+
+
+def _remove_readonly(func, path, exc_info):
+    # windows doesn't remove read only files
+    os.chmod(path, os.stat(path).st_mode | stat.S_IWUSR)
+    func(path)
+
+
+class TerminalPool(object):
+    """
+    Notes:
+      clones are made in root as <prefix>-<n> and registered by metatrader.mt5.initialize
+      with the same name as alias in portable mode.
+      hardlinked files share content with the install, so don't let the install or a clone
+      update history while the pool is used. reflinks don't have this limitation.
+      hardlinked files in readonly_dirs are read only in the install as well until teardown.
+    Attributes:
+      prog_path(string): install dir of terminal accepted by metatrader.mt5.initialize
+      appdata_path(string): data dir of non portable install. merged into clones if not None
+      root(string): dir to create clones in
+      size(int): num of clones
+      prefix(string): prefix of clone dir and alias
+      link(string): how immutable files are cloned. one of LINK_HARDLINK, LINK_REFLINK and LINK_COPY
+      mutable_dirs(tuple(string)): dirs and files copied privately into each clone, relative to data dir.
+        a component may be a wildcard pattern, e.g. Tester/Agent-*
+      readonly_dirs(tuple(string)): dirs whose linked files are made read only, relative to data dir
+      aliases(list(string)): mt5 aliases of created clones
+      linked(int): num of linked files of the last create
+      copied(int): num of copied files of the last create
+    """
+
+    def __init__(self, prog_path, root, size, prefix='clone', link=LINK_HARDLINK,
+                 mutable_dirs=MUTABLE_DIRS, readonly_dirs=READONLY_DIRS, appdata_path=None):
+        if size < 1:
+            raise ValueError('size of terminal pool must be positive, but %s' % size)
+        self.prog_path = prog_path
+        self.appdata_path = appdata_path
+        self.root = root
+        self.size = size
+        self.prefix = prefix
+        self.link = link
+        self.mutable_dirs = tuple(os.path.normcase(os.path.normpath(d)) for d in mutable_dirs)
+        self.readonly_dirs = tuple(os.path.normcase(os.path.normpath(d)) for d in readonly_dirs)
+        self.aliases = []
+        self.linked = 0
+        self.copied = 0
+        # original mode of each install file made read only through a hardlink
+        self._install_modes = {}
+
+    def __enter__(self):
+        self.create()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.teardown()
+
+    def get_clone_path(self, alias):
+        return os.path.join(self.root, alias)
+
+    @staticmethod
+    def _is_under(rel_path, patterns):
+        # rel_path is a pattern or inside of it, compared component by component
+        parts = os.path.normcase(rel_path).split(os.sep)
+        for pattern in patterns:
+            pattern_parts = pattern.split(os.sep)
+            if len(parts) >= len(pattern_parts) and all(fnmatch.fnmatchcase(part, pattern_part)
+                                                        for part, pattern_part in zip(parts, pattern_parts)):
+                return True
+        return False
+
+    def _is_mutable(self, rel_path):
+        return self._is_under(rel_path, self.mutable_dirs)
+
+    def _clone(self, source, clone_path):
+        pool_root = os.path.abspath(self.root)
+        for root, dirs, files in os.walk(source):
+            # pool may be made inside the install
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != pool_root]
+            rel_root = os.path.relpath(root, source)
+            if rel_root == os.curdir:
+                rel_root = ''
+            dst_root = os.path.join(clone_path, rel_root)
+            if not os.path.isdir(dst_root):
+                os.makedirs(dst_root)
+
+            mutable = self._is_mutable(rel_root)
+            for name in files:
+                src = os.path.join(root, name)
+                dst = os.path.join(dst_root, name)
+                if os.path.exists(dst):
+                    # file of data dir overrides the one of install dir
+                    os.remove(dst)
+                if mutable or self._is_mutable(os.path.join(rel_root, name)):
+                    shutil.copy2(src, dst)
+                    self.copied += 1
+                elif link_file(src, dst, link=self.link):
+                    self.linked += 1
+                    if self._is_under(os.path.join(rel_root, name), self.readonly_dirs):
+                        mode = os.stat(dst).st_mode
+                        if os.path.samefile(src, dst):
+                            self._install_modes.setdefault(src, stat.S_IMODE(mode))
+                        os.chmod(dst, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+                else:
+                    self.copied += 1
+
+    def create(self):
+        """
+        Notes:
+          create clones and register them as mt5 aliases. existing clones are rebuilt.
+        Returns:
+          aliases(list(string)): mt5 aliases of clones
+        """
+        if not os.path.isdir(self.prog_path):
+            err_msg = 'prog_path %s not exists' % self.prog_path
+            logging.error(err_msg)
+            raise IOError(err_msg)
+
+        self.linked = 0
+        self.copied = 0
+        self.aliases = []
+        for i in range(self.size):
+            alias = '%s-%d' % (self.prefix, i + 1)
+            clone_path = self.get_clone_path(alias)
+            if os.path.exists(clone_path):
+                shutil.rmtree(clone_path, onerror=_remove_readonly)
+
+            self._clone(self.prog_path, clone_path)
+            if self.appdata_path is not None and self.appdata_path != self.prog_path:
+                self._clone(self.appdata_path, clone_path)
+
+            # registered alias may point to the old clone
+            mt5._mt5s.pop(alias, None)
+            mt5.initialize(clone_path, portable_mode=True, alias=alias)
+            self.aliases.append(alias)
+
+        logging.info('terminal pool of %d clones is created in %s, %d files linked and %d copied',
+                     self.size, self.root, self.linked, self.copied)
+        return self.aliases
+
+    def teardown(self):
+        """
+        Notes:
+          unregister aliases and remove clones. modes of install files made read only are restored,
+          the install is not touched otherwise.
+        """
+        for path, mode in self._install_modes.items():
+            if os.path.exists(path):
+                os.chmod(path, mode)
+        self._install_modes = {}
+        for alias in self.aliases:
+            mt5._mt5s.pop(alias, None)
+            clone_path = self.get_clone_path(alias)
+            if os.path.exists(clone_path):
+                shutil.rmtree(clone_path, onerror=_remove_readonly)
+        self.aliases = []
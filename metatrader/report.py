@@ -39,179 +39,347 @@ class BaseReport(object):
         self.from_date = backtest.from_date
         self.to_date = backtest.to_date
         self.model = backtest.model
-        self.spread = backtest.spread
+        # mt5 BackTest has no spread, it is taken from the symbol spec
+        self.spread = getattr(backtest, 'spread', None)
+
+
+def get_data_and_rate(line):
+    '''
+    Notes:
+      split value with rate into two values.
+      e.g. 123.45 (1.23%) => (123.45, 1.23)
+    '''
+    formatted_str = re.sub(r'(\(|\))', '', line)
+    values = formatted_str.split(r' ')
+    rate = 0.0
+    data = 0.0
+
+    if len(values) != 2:
+        raise InvalidReportFormat('value of Maximal drawdown contains more than 2 values')
+
+    for value in values:
+        if re.match(r'.*\%$', value):
+            rate = re.sub(r'%', '', value)
+            rate = float(rate)
+        else:
+            data = float(value)
+    return data, rate
+
+
+def split_to_tokens(line):
+    '''
+    Notes:
+      split consecutive xxx into two tokens.
+      e.g. 1 (123.45) => (1, 123.45)
+           123.45 (1) => (123.45, 1)
+    '''
+    formatted_str = re.sub(r'(\(|\))', '', line)
+    values = formatted_str.split(r' ')
+
+    if len(values) != 2:
+        raise InvalidReportFormat('value of Maximal drawdown contains more than 2 values')
+
+    return values
+
+
+# decoders of summary values. texts are all td texts of summary table and index is the label
+def _decode_float(fields, texts, index):
+    return {fields[0]: float(texts[index + 1])}
+
+
+def _decode_int(fields, texts, index):
+    return {fields[0]: int(texts[index + 1])}
+
+
+def _decode_modeling_quality(fields, texts, index):
+    percentage = re.sub('%', '', texts[index + 1])
+    return {fields[0]: float(percentage) if percentage != 'n/a' else 0.00}
+
+
+def _decode_profit_factor(fields, texts, index):
+    return {fields[0]: float(texts[index + 1]) if texts[index + 1] else 0.00}
+
+
+def _decode_data_and_rate(fields, texts, index):
+    data, rate = get_data_and_rate(texts[index + 1])
+    return {fields[0]: data, fields[1]: rate}
+
+
+def _decode_count_and_rate(fields, texts, index):
+    data, rate = get_data_and_rate(texts[index + 1])
+    return {fields[0]: int(data), fields[1]: rate}
+
+
+def _decode_sub_labels(*sub_labels):
+    """
+    Notes:
+      decoder of a label followed by two sub labels and values, e.g. Largest | profit trade | 1.0 | loss trade | -1.0
+    Args:
+      sub_labels(tuple(int, string, function)): offset of sub label from the label, sub label and
+        function which takes the value and returns dict of field and value
+    """
+    def decode(fields, texts, index):
+        ret = {}
+        for offset, sub_label, convert in sub_labels:
+            if texts[index + offset] == sub_label:
+                ret.update(convert(texts[index + offset + 1]))
+        return ret
+    return decode
+
+
+def _tokens(count_field, value_field, count_first=True):
+    def convert(text):
+        token = split_to_tokens(text)
+        if not count_first:
+            token = token[::-1]
+        return {count_field: int(token[0]), value_field: float(token[1])}
+    return convert
+
+
+# label in summary table, fields set by the label and decoder.
+# a label may appear more than once, e.g. Average of trades and of consecutive trades
+SUMMARY_FIELDS = (
+    ('Initial deposit', ('initial_deposit',), _decode_float),
+    ('Modelling quality', ('modeling_quality_percentage',), _decode_modeling_quality),
+    ('Total net profit', ('profit',), _decode_float),
+    ('Gross profit', ('gross_profit',), _decode_float),
+    ('Gross loss', ('gross_loss',), _decode_float),
+    ('Profit factor', ('profit_factor',), _decode_profit_factor),
+    ('Expected payoff', ('expected_payoff',), _decode_float),
+    ('Absolute drawdown', ('abs_drawdown',), _decode_float),
+    ('Maximal drawdown', ('max_drawdown', 'max_drawdown_rate'), _decode_data_and_rate),
+    ('Relative drawdown', ('relative_drawdown', 'relative_drawdown_rate'), _decode_data_and_rate),
+    ('Total trades', ('total_trades',), _decode_int),
+    ('Short positions (won %)', ('short_positions', 'short_positions_rate'), _decode_data_and_rate),
+    ('Long positions (won %)', ('long_positions', 'long_positions_rate'), _decode_data_and_rate),
+    ('Profit trades (% of total)', ('profit_trades', 'profit_trades_rate'), _decode_count_and_rate),
+    ('Loss trades (% of total)', ('loss_trades', 'loss_trades_rate'), _decode_count_and_rate),
+    ('Largest', ('largest_profit_trade', 'largest_loss_trade'),
+     _decode_sub_labels((1, 'profit trade', lambda v: {'largest_profit_trade': float(v)}),
+                        (3, 'loss trade', lambda v: {'largest_loss_trade': float(v)}))),
+    ('Average', ('average_profit_trade', 'ave_consecutive_wins', 'average_loss_trade', 'ave_consecutive_losses'),
+     _decode_sub_labels((1, 'profit trade', lambda v: {'average_profit_trade': float(v)}),
+                        (1, 'consecutive wins', lambda v: {'ave_consecutive_wins': int(v)}),
+                        (3, 'loss trade', lambda v: {'average_loss_trade': float(v)}),
+                        (3, 'consecutive losses', lambda v: {'ave_consecutive_losses': int(v)}))),
+    ('Maximum', ('max_consecutive_wins_count', 'max_consecutive_wins_profit',
+                 'max_consecutive_losses_count', 'max_consecutive_losses_loss'),
+     _decode_sub_labels((1, 'consecutive wins (profit in money)',
+                         _tokens('max_consecutive_wins_count', 'max_consecutive_wins_profit')),
+                        (3, 'consecutive losses (loss in money)',
+                         _tokens('max_consecutive_losses_count', 'max_consecutive_losses_loss')))),
+    ('Maximal', ('max_consecutive_profit', 'max_consecutive_profit_count',
+                 'max_consecutive_loss', 'max_consecutive_loss_count'),
+     _decode_sub_labels((1, 'consecutive profit (count of wins)',
+                         _tokens('max_consecutive_profit_count', 'max_consecutive_profit', count_first=False)),
+                        (3, 'consecutive loss (count of losses)',
+                         _tokens('max_consecutive_loss_count', 'max_consecutive_loss', count_first=False)))),
+)
+
+# precompiled lookups of SUMMARY_FIELDS
+LABEL_DECODERS = dict((label, (fields, decoder)) for label, fields, decoder in SUMMARY_FIELDS)
+FIELD_LABELS = dict((field, label) for label, fields, _ in SUMMARY_FIELDS for field in fields)
+
+# read size of the fast path which reads only the summary table
+SUMMARY_CHUNK_SIZE = 16 * 1024
+SUMMARY_END = re.compile(r'</table\s*>', re.IGNORECASE)
+
+
+def read_summary_html(report_file, chunk_size=SUMMARY_CHUNK_SIZE):
+    """
+    Notes:
+      read report only up to the end of its first table, which is the summary of a backtest report.
+    Returns:
+      html(string): head of report up to and including the first </table>. the whole report if no table closes
+    """
+    html = ''
+    with open(report_file, 'r') as fp:
+        while True:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                return html
+            # closing tag may be split between chunks
+            start = max(0, len(html) - len('</table >'))
+            html += chunk
+            end = SUMMARY_END.search(html, start)
+            if end:
+                return html[:end.end()]
+
+
+class _SummaryField(object):
+    """
+    Notes:
+      summary value of BacktestReport decoded on the first read.
+      the decoded value is stored in the instance, which hides this descriptor afterwards.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance._decode_field(self.name)
 
 
 class BacktestReport(BaseReport):
     """
     Note:
       backtest report class.
+      summary and deals table are read in one pass of the report.
+      with lazy_deals, only the summary table is parsed and the rest of the report is kept as text,
+      which is decoded on the first access of deals.
+      with lazy, nothing is read until a value is accessed. then only the summary table is read
+      and indexed by label, and each value is decoded when it is read.
+      the report file must be kept until the values are read, e.g. reports archived on disk:
+        reports = [BacktestReport(backtest, report_file=f, lazy=True) for f in files]
+        profitable = [r for r in reports if r.profit > 0 and r.max_drawdown_rate < 20]
     Attributes:
       initial_deposit(int): initial deposit of backtest of optimization
+      deals(metatrader.deals.DealTable): deals of backtest as numpy arrays
     """
     # result
-    profit = None
-    profit_factor = None
-    expected_payoff = None
-    max_drawdown = None
-    max_drawdown_rate = None
-    relative_drawdown = None
-    relative_drawdown_rate = None
-    abs_drawdown = None
+    profit = _SummaryField('profit')
+    profit_factor = _SummaryField('profit_factor')
+    expected_payoff = _SummaryField('expected_payoff')
+    max_drawdown = _SummaryField('max_drawdown')
+    max_drawdown_rate = _SummaryField('max_drawdown_rate')
+    relative_drawdown = _SummaryField('relative_drawdown')
+    relative_drawdown_rate = _SummaryField('relative_drawdown_rate')
+    abs_drawdown = _SummaryField('abs_drawdown')
     abs_drawdown_rate = None
-    gross_profit = None
-    gross_loss = None
-    total_trades = None
-    largest_profit_trade = None
-    largest_loss_trade = None
-    average_profit_trade = None
-    average_loss_trade = None
-    modeling_quality_percentage = None
-    max_consecutive_profit_count = None
-    max_consecutive_profit = None
-    max_consecutive_loss_count = None
-    max_consecutive_loss = None
-    max_consecutive_wins_count = None
-    max_consecutive_wins_profit = None
-    max_consecutive_losses_count = None
-    max_consecutive_losses_loss = None
-    profit_trades = None
-    profit_trades_rate = None
-    loss_trades = None
-    loss_trades_rate = None
-    ave_consecutive_wins = None
-    ave_consecutive_losses = None
-    short_positions = None
-    short_positions_rate = None
-    long_positions = None
-    long_positions_rate = None
-
-    def __init__(self, backtest, alias=DEFAULT_MT5_NAME):
-        from bs4 import BeautifulSoup
-        import re
+    gross_profit = _SummaryField('gross_profit')
+    gross_loss = _SummaryField('gross_loss')
+    total_trades = _SummaryField('total_trades')
+    largest_profit_trade = _SummaryField('largest_profit_trade')
+    largest_loss_trade = _SummaryField('largest_loss_trade')
+    average_profit_trade = _SummaryField('average_profit_trade')
+    average_loss_trade = _SummaryField('average_loss_trade')
+    modeling_quality_percentage = _SummaryField('modeling_quality_percentage')
+    max_consecutive_profit_count = _SummaryField('max_consecutive_profit_count')
+    max_consecutive_profit = _SummaryField('max_consecutive_profit')
+    max_consecutive_loss_count = _SummaryField('max_consecutive_loss_count')
+    max_consecutive_loss = _SummaryField('max_consecutive_loss')
+    max_consecutive_wins_count = _SummaryField('max_consecutive_wins_count')
+    max_consecutive_wins_profit = _SummaryField('max_consecutive_wins_profit')
+    max_consecutive_losses_count = _SummaryField('max_consecutive_losses_count')
+    max_consecutive_losses_loss = _SummaryField('max_consecutive_losses_loss')
+    profit_trades = _SummaryField('profit_trades')
+    profit_trades_rate = _SummaryField('profit_trades_rate')
+    loss_trades = _SummaryField('loss_trades')
+    loss_trades_rate = _SummaryField('loss_trades_rate')
+    ave_consecutive_wins = _SummaryField('ave_consecutive_wins')
+    ave_consecutive_losses = _SummaryField('ave_consecutive_losses')
+    short_positions = _SummaryField('short_positions')
+    short_positions_rate = _SummaryField('short_positions_rate')
+    long_positions = _SummaryField('long_positions')
+    long_positions_rate = _SummaryField('long_positions_rate')
+    initial_deposit = _SummaryField('initial_deposit')
+
+    def __init__(self, backtest, alias=DEFAULT_MT5_NAME, report_file=None, lazy_deals=False, lazy=False):
+        """
+        Args:
+          backtest(metatrader.backtest.BackTest): backtest
+          alias(string): mt5 alias which ran the backtest
+          report_file(string): abs path of report. report in data dir of alias is used if None
+          lazy_deals(bool): decode deals table on the first access of deals
+          lazy(bool): read summary on the first access of a value, and deals on the first access of deals
+        """
+        from metatrader.deals import DealTableBuilder
+        from metatrader.parser import ReportParser, parse_report
         super(BacktestReport, self).__init__(backtest)
 
-        report_file = get_report_abs_path(backtest.ea_name, alias=alias)
-        with open(report_file, 'r') as fp:
-            raw_html = fp.read()
-
-        b_soup = BeautifulSoup(raw_html, "html.parser")
-        summary_in_table = b_soup.find_all('table')[0]
-        tds = summary_in_table.find_all('td')
-
-        for index, td in enumerate(tds):
-            if td.text == 'Initial deposit':
-                self.initial_deposit = float(tds[index + 1].text)
-            if td.text == 'Modelling quality':
-                modeling_quality_percentage_str = re.sub('%', '', tds[index + 1].text)
-                self.modeling_quality_percentage = float(modeling_quality_percentage_str) if modeling_quality_percentage_str != 'n/a' else 0.00
-            elif td.text == 'Total net profit':
-                self.profit = float(tds[index + 1].text)
-            elif td.text == 'Gross profit':
-                self.gross_profit = float(tds[index + 1].text)
-            elif td.text == 'Gross loss':
-                self.gross_loss = float(tds[index + 1].text)
-            elif td.text == 'Profit factor':
-                self.profit_factor = float(tds[index+1].text) if tds[index+1].text else 0.00
-            elif td.text == 'Expected payoff':
-                self.expected_payoff = float(tds[index + 1].text)
-            elif td.text == 'Absolute drawdown':
-                self.abs_drawdown = float(tds[index + 1].text)
-            elif td.text == 'Maximal drawdown':
-                data, rate = self.get_data_and_rate(tds[index + 1].text)
-                self.max_drawdown_rate = rate
-                self.max_drawdown = data
-            elif td.text == 'Relative drawdown':
-                data, rate = self.get_data_and_rate(tds[index + 1].text)
-                self.relative_drawdown_rate = rate
-                self.relative_drawdown = data
-            elif td.text == 'Total trades':
-                self.total_trades = int(tds[index + 1].text)
-            elif td.text == 'Short positions (won %)':
-                data, rate = self.get_data_and_rate(tds[index + 1].text)
-                self.short_positions_rate = rate
-                self.short_positions = data
-            elif td.text == 'Long positions (won %)':
-                data, rate = self.get_data_and_rate(tds[index + 1].text)
-                self.long_positions_rate = rate
-                self.long_positions = data
-            elif td.text == 'Profit trades (% of total)':
-                data, rate = self.get_data_and_rate(tds[index + 1].text)
-                self.profit_trades_rate = rate
-                self.profit_trades = int(data)
-            elif td.text == 'Loss trades (% of total)':
-                data, rate = self.get_data_and_rate(tds[index + 1].text)
-                self.loss_trades_rate = rate
-                self.loss_trades = int(data)
-            elif td.text == 'Largest':
-                if tds[index + 1].text == 'profit trade':
-                    self.largest_profit_trade = float(tds[index + 2].text)
-                if tds[index + 3].text == 'loss trade':
-                    self.largest_loss_trade = float(tds[index + 4].text)
-            elif td.text == 'Average':
-                if tds[index + 1].text == 'profit trade':
-                    self.average_profit_trade = float(tds[index + 2].text)
-                elif tds[index + 1].text == 'consecutive wins':
-                    self.ave_consecutive_wins = int(tds[index + 2].text)
-                if tds[index + 3].text == 'loss trade':
-                    self.average_loss_trade = float(tds[index + 4].text)
-                elif tds[index + 3].text == 'consecutive losses':
-                    self.ave_consecutive_losses = int(tds[index + 4].text)
-            elif td.text == 'Maximum':
-                if tds[index + 1].text == 'consecutive wins (profit in money)':
-                    token = self.split_to_tokens(tds[index + 2].text)
-                    self.max_consecutive_wins_count = int(token[0])
-                    self.max_consecutive_wins_profit = float(token[1])
-                if tds[index + 3].text == 'consecutive losses (loss in money)':
-                    token = self.split_to_tokens(tds[index + 4].text)
-                    self.max_consecutive_losses_count = int(token[0])
-                    self.max_consecutive_losses_loss = float(token[1])
-            elif td.text == 'Maximal':
-                if tds[index + 1].text == 'consecutive profit (count of wins)':
-                    token = self.split_to_tokens(tds[index + 2].text)
-                    self.max_consecutive_profit = float(token[0])
-                    self.max_consecutive_profit_count = int(token[1])
-                if tds[index + 3].text == 'consecutive loss (count of losses)':
-                    token = self.split_to_tokens(tds[index + 4].text)
-                    self.max_consecutive_loss = float(token[0])
-                    self.max_consecutive_loss_count = int(token[1])
+        if report_file is None:
+            report_file = get_report_abs_path(backtest.run_name, alias=alias)
+
+        self._report_file = report_file
+        self._labels = None
+        self._texts = None
+        self._deals = None
+        self._deals_html = None
+        if lazy:
+            return
+
+        if lazy_deals:
+            with open(report_file, 'r') as fp:
+                raw_html = fp.read()
+            # summary is the first table, everything after it is left undecoded
+            end = SUMMARY_END.search(raw_html)
+            split_at = end.end() if end else len(raw_html)
+            self._deals_html = raw_html[split_at:]
+            document = ReportParser()
+            document.feed(raw_html[:split_at])
+            document.close()
+        else:
+            builder = DealTableBuilder()
+            document = parse_report(report_file, row_handler=builder)
+            self._deals = builder.build()
+
+        self._index_summary(document)
+        for label in self._labels:
+            self._decode_label(label)
+        for field in FIELD_LABELS:
+            self.__dict__.setdefault(field, None)
+        # every value is decoded, so the index is not needed anymore
+        self._labels = None
+        self._texts = None
+        self._report_file = None
+
+    def _index_summary(self, document=None):
+        """
+        Notes:
+          keep td texts of summary table and indices of labels in it.
+          the report is read only up to the end of the summary table if document is None.
+        """
+        from metatrader.parser import ReportParser
+
+        if document is None:
+            document = ReportParser()
+            document.feed(read_summary_html(self._report_file))
+            document.close()
+        self._texts = [td.text for row in document.tables[0] for td in row]
+        self._labels = {}
+        for index, text in enumerate(self._texts):
+            if text in LABEL_DECODERS:
+                self._labels.setdefault(text, []).append(index)
+
+    def _decode_label(self, label):
+        fields, decoder = LABEL_DECODERS[label]
+        for index in self._labels.get(label, []):
+            self.__dict__.update(decoder(fields, self._texts, index))
+        for field in fields:
+            self.__dict__.setdefault(field, None)
+
+    def _decode_field(self, name):
+        if self.__dict__.get('_labels') is None:
+            if self.__dict__.get('_report_file') is None:
+                # decoded eagerly, or unpickled report of former version
+                return None
+            self._index_summary()
+        self._decode_label(FIELD_LABELS[name])
+        return self.__dict__[name]
+
+    @property
+    def deals(self):
+        if self._deals is None:
+            from metatrader.deals import DealTableBuilder, read_deals
+            if self._deals_html is not None:
+                self._deals = read_deals(self._deals_html)
+                self._deals_html = None
+            elif self._report_file is not None:
+                from metatrader.parser import parse_report
+                builder = DealTableBuilder()
+                parse_report(self._report_file, row_handler=builder)
+                self._deals = builder.build()
+            else:
+                self._deals = read_deals('')
+        return self._deals
 
     def get_data_and_rate(self, line):
-        import re
-        from metatrader.exception import InvalidReportFormat
-        formatted_str = re.sub('(\(|\))', '', line)
-        values = formatted_str.split(r' ')
-        rate = 0.0
-        data = 0.0
-
-        if len(values) != 2:
-            raise InvalidReportFormat('value of Maximal drawdown contains more than 2 values')
-
-        for value in values:
-            if re.match('.*\%$', value):
-                rate = re.sub(r'%', '', value)
-                rate = float(rate)
-            else:
-                data = float(value)
-        return data, rate
+        return get_data_and_rate(line)
 
     def split_to_tokens(self, line):
-        '''
-        Notes:
-          split consecutive xxx into two tokens.
-          e.g. 1 (123.45) => (1, 123.45)
-               123.45 (1) => (123.45, 1)
-        '''
-        import re
-        from metatrader.exception import InvalidReportFormat
-
-        formatted_str = re.sub('(\(|\))', '', line)
-        values = formatted_str.split(r' ')
-
-        if len(values) != 2:
-            raise InvalidReportFormat('value of Maximal drawdown contains more than 2 values')
-
-        return values
+        return split_to_tokens(line)
 
 
 class ShortReport(BaseReport):
@@ -228,7 +396,17 @@ class ShortReport(BaseReport):
       max_drawdown(float): max drawdown of deposit
       max_drawdown_rate(float): max drawdown rate of deposit
       initial_deposit(int): initial deposit of backtest of optimization
+      pass_number(int): pass number in optimization. only in xml report
+      result(float): value of optimization criterion. only in xml report
+      recovery_factor(float): recovery factor. only in xml report
+      sharpe_ratio(float): sharpe ratio. only in xml report
+      custom(float): value of OnTester. only in xml report
+      forward_result(float): result of forward test. only in xml report of forward optimization
+      back_result(float): result of back test. only in xml report of forward optimization
     """
+    # fields only in xml optimization report
+    optional_fields = ('pass_number', 'result', 'recovery_factor', 'sharpe_ratio', 'custom',
+                       'forward_result', 'back_result')
 
     def __init__(self, back_test, **kwargs):
         super(ShortReport, self).__init__(back_test)
@@ -242,46 +420,41 @@ class ShortReport(BaseReport):
         self.max_drawdown = result.pop('max_drawdown')
         self.max_drawdown_rate = result.pop('max_drawdown_rate')
         self.initial_deposit = result.pop('initial_deposit')
+        for field in self.optional_fields:
+            setattr(self, field, result.pop(field, None))
 
 
-class OptimizationReport():
+class OptimizationReport(object):
     """
     Note:
       this class has short reports
     """
     reports = []
 
-    def _is_valid_format(self, raw_html):
-        from bs4 import BeautifulSoup
-
+    @classmethod
+    def _is_valid_format(cls, document):
         is_valid = False
 
-        b_soup = BeautifulSoup(raw_html, "html.parser")
-        report_titles = b_soup.find_all(has_divtag_with_style)
-
-        for title in report_titles:
-            if title.text == 'Optimization Report':
-                if self._get_initial_deposit(raw_html) != 0:
+        for title in document.titles:
+            if title == 'Optimization Report':
+                if cls._get_initial_deposit(document) != 0:
                     is_valid = True
         return is_valid
 
-    def _get_initial_deposit(self, raw_html):
-        from bs4 import BeautifulSoup
-
+    @staticmethod
+    def _get_initial_deposit(document):
         initial_deposit = 0
-        b_soup = BeautifulSoup(raw_html, "html.parser")
-        conditions = b_soup.find_all('table')[0]
+        if not document.tables:
+            return initial_deposit
 
-        trs = conditions.find_all('tr')
-
-        for tr in trs:
-            tds = tr.find_all('td')
-            if tds[0].text == 'Initial deposit':
+        for tds in document.tables[0]:
+            if len(tds) > 1 and tds[0].text == 'Initial deposit':
                 initial_deposit = float(tds[1].text)
 
         return initial_deposit
 
-    def _get_param_from_text(self, text):
+    @staticmethod
+    def _get_param_from_text(text):
         '''
         Note:
           create param dict from text in td title attribute in optimization report.
@@ -305,82 +478,227 @@ class OptimizationReport():
 
         return param
 
-    def _get_results(self, backtest, raw_html):
-        from bs4 import BeautifulSoup
-        results = []
-        initial_deposit = self._get_initial_deposit(raw_html)
-
-        b_soup = BeautifulSoup(raw_html, "html.parser")
-        results_in_table = b_soup.find_all('table')[1]
-        trs = results_in_table.find_all('tr')
-
-        # delete first tr, because it is category name
-        trs.pop(0)
-
-        for tr in trs:
-            tds = tr.find_all('td')
-            param = None
-            profit = None
-            total_trades = None
-            profit_factor = None
-            expected_payoff = None
-            max_drawdown = None
-            max_drawdown_rate = None
-
-            for i, td in enumerate(tds):
-                if i == 0:
-                    param_raw_text = td.attrs.pop('title')
-                    param = self._get_param_from_text(param_raw_text)
-                elif i == 1:
-                    profit = float(td.text)
-                elif i == 2:
-                    total_trades = int(td.text)
-                elif i == 3:
-                    profit_factor = float(td.text)
-                elif i == 4:
-                    expected_payoff = float(td.text)
-                elif i == 5:
-                    max_drawdown = float(td.text)
-                elif i == 6:
-                    max_drawdown_rate = float(td.text)
-
-            short_report = ShortReport(backtest,
-                                       param=param,
-                                       profit=profit,
-                                       total_trades=total_trades,
-                                       profit_factor=profit_factor,
-                                       expected_payoff=expected_payoff,
-                                       max_drawdown=max_drawdown,
-                                       max_drawdown_rate=max_drawdown_rate,
-                                       initial_deposit=initial_deposit)
-            results.append(short_report)
-        return results
-
-    def __init__(self, backtest, alias=DEFAULT_MT5_NAME):
+    @classmethod
+    def _get_short_report(cls, backtest, tds, initial_deposit):
+        param = None
+        profit = None
+        total_trades = None
+        profit_factor = None
+        expected_payoff = None
+        max_drawdown = None
+        max_drawdown_rate = None
+
+        for i, td in enumerate(tds):
+            if i == 0:
+                param_raw_text = td.attrs['title']
+                param = cls._get_param_from_text(param_raw_text)
+            elif i == 1:
+                profit = float(td.text)
+            elif i == 2:
+                total_trades = int(td.text)
+            elif i == 3:
+                profit_factor = float(td.text)
+            elif i == 4:
+                expected_payoff = float(td.text)
+            elif i == 5:
+                max_drawdown = float(td.text)
+            elif i == 6:
+                max_drawdown_rate = float(td.text)
+
+        return ShortReport(backtest,
+                           param=param,
+                           profit=profit,
+                           total_trades=total_trades,
+                           profit_factor=profit_factor,
+                           expected_payoff=expected_payoff,
+                           max_drawdown=max_drawdown,
+                           max_drawdown_rate=max_drawdown_rate,
+                           initial_deposit=initial_deposit)
+
+    @classmethod
+    def iter_results(cls, backtest, alias=DEFAULT_MT5_NAME, report_file=None):
+        """
+        Notes:
+          yield ShortReport of each pass while the report is read incrementally.
+          memory stays flat regardless of report size, so passes can be filtered,
+          aggregated or written to disk without building the results list.
+        Args:
+          backtest(metatrader.backtest.BackTest): optimized backtest
+          alias(string): mt5 alias which ran the optimization
+          report_file(string): abs path of report. report in data dir of alias is used if None
+        """
         from metatrader.exception import InvalidReportFormat
+        from metatrader.parser import ReportParser
 
-        report_file = get_report_abs_path(backtest.ea_name, alias=alias)
-
-        with open(report_file, 'r') as fp:
-            raw_html = fp.read()
-
-        if self._is_valid_format(raw_html):
-            try:
-                self.results = self._get_results(backtest, raw_html)
-                self.profitable_sets = 0
-                for set in self.results:
-                    if set.profit > 0:
-                        self.profitable_sets += 1
-            except KeyError:
-                err_msg = 'optimization report seems invalid format'
-                logging.error(err_msg)
-                raise
-        else:
-            raise InvalidReportFormat(report_file, r'"Optimization Report" not found in html')
+        if report_file is None:
+            report_file = get_report_abs_path(backtest.run_name, alias=alias)
+
+        # results are in the second table, conditions in the first one
+        document = ReportParser(stream_table=1)
+        initial_deposit = None
 
+        for tds in document.iter_rows(report_file):
+            if initial_deposit is None:
+                # first tr is category name. everything before the results is parsed here
+                if not cls._is_valid_format(document):
+                    raise InvalidReportFormat(report_file, r'"Optimization Report" not found in html')
+                initial_deposit = cls._get_initial_deposit(document)
+                continue
 
-def get_report_abs_path(ea_name, alias=DEFAULT_MT5_NAME):
+            yield cls._get_short_report(backtest, tds, initial_deposit)
+
+        if initial_deposit is None:
+            if not cls._is_valid_format(document):
+                raise InvalidReportFormat(report_file, r'"Optimization Report" not found in html')
+            raise InvalidReportFormat(report_file, r'optimization results table')
+
+    def __init__(self, backtest, alias=DEFAULT_MT5_NAME, report_file=None):
+        """
+        Args:
+          backtest(metatrader.backtest.BackTest): optimized backtest
+          alias(string): mt5 alias which ran the optimization
+          report_file(string): abs path of report. report in data dir of alias is used if None
+        """
+        try:
+            self.results = list(self.iter_results(backtest, alias=alias, report_file=report_file))
+        except (KeyError, IndexError):
+            err_msg = 'optimization report seems invalid format'
+            logging.error(err_msg)
+            raise
+
+        self.profitable_sets = 0
+        for set in self.results:
+            if set.profit > 0:
+                self.profitable_sets += 1
+
+
+class XmlOptimizationReport(OptimizationReport):
+    """
+    Note:
+      optimization report in xml(SpreadsheetML) format, which mt5 writes for optimization.
+      rows are parsed by iterparse and dropped right after use, so memory is bounded
+      even for 100k+ passes.
+    """
+    # column title in xml report -> ShortReport field
+    columns = {'Pass': ('pass_number', int),
+               'Result': ('result', float),
+               'Profit': ('profit', float),
+               'Expected Payoff': ('expected_payoff', float),
+               'Profit Factor': ('profit_factor', float),
+               'Recovery Factor': ('recovery_factor', float),
+               'Sharpe Ratio': ('sharpe_ratio', float),
+               'Custom': ('custom', float),
+               'Equity DD %': ('max_drawdown_rate', float),
+               'Trades': ('total_trades', int),
+               'Forward Result': ('forward_result', float),
+               'Back Result': ('back_result', float)}
+
+    @classmethod
+    def iter_results(cls, backtest, alias=DEFAULT_MT5_NAME, report_file=None):
+        """
+        Notes:
+          yield ShortReport of each pass while the report is read incrementally.
+          columns which are not results are ea params.
+        Args:
+          backtest(metatrader.backtest.BackTest): optimized backtest
+          alias(string): mt5 alias which ran the optimization
+          report_file(string): abs path of report. report in data dir of alias is used if None
+        """
+        import xml.etree.ElementTree as ET
+        from metatrader.exception import InvalidReportFormat
+
+        if report_file is None:
+            report_file = get_report_abs_path(backtest.run_name, alias=alias, ext='xml')
+
+        initial_deposit = None
+        header = None
+        parent = None
+
+        for event, elem in ET.iterparse(report_file, events=('start', 'end')):
+            tag = elem.tag.rsplit('}', 1)[-1]
+
+            if event == 'start':
+                if tag == 'Table':
+                    parent = elem
+                continue
+
+            if tag == 'Deposit':
+                # e.g.: 10000 USD
+                initial_deposit = float(elem.text.split()[0])
+            elif tag == 'Row':
+                cells = cls._get_cells(elem)
+                if parent is not None:
+                    # drop parsed row to keep memory flat
+                    parent.remove(elem)
+
+                if header is None:
+                    header = cells
+                    if 'Pass' not in header or 'Profit' not in header:
+                        raise InvalidReportFormat(report_file, r'"Pass" and "Profit" columns')
+                    if initial_deposit is None:
+                        initial_deposit = float(getattr(backtest, 'deposit', 0) or 0)
+                    continue
+
+                yield cls._get_xml_short_report(backtest, header, cells, initial_deposit)
+
+        if header is None:
+            raise InvalidReportFormat(report_file, r'optimization results table')
+
+    @staticmethod
+    def _get_cells(row):
+        cells = []
+        for cell in row:
+            if cell.tag.rsplit('}', 1)[-1] != 'Cell':
+                continue
+            # sparse cells have 1-based ss:Index
+            for name, value in cell.attrib.items():
+                if name.rsplit('}', 1)[-1] == 'Index':
+                    cells.extend([''] * (int(value) - 1 - len(cells)))
+            data = [child.text for child in cell if child.tag.rsplit('}', 1)[-1] == 'Data']
+            cells.append((data[0] or '') if data else '')
+        return cells
+
+    @classmethod
+    def _get_xml_short_report(cls, backtest, header, cells, initial_deposit):
+        kwargs = {'profit': None,
+                  'total_trades': None,
+                  'profit_factor': None,
+                  'expected_payoff': None,
+                  'max_drawdown': None,
+                  'max_drawdown_rate': None}
+        param = {}
+
+        for title, value in zip(header, cells):
+            if title in cls.columns:
+                field, convert = cls.columns[title]
+                kwargs[field] = convert(float(value)) if value != '' else None
+            else:
+                param[title] = value
+
+        return ShortReport(backtest, param=param, initial_deposit=initial_deposit, **kwargs)
+
+
+def read_optimization_report(backtest, alias=DEFAULT_MT5_NAME):
+    """
+    Notes:
+      mt5 writes optimization report in xml unless report name has .htm extension.
+      xml report is read if exists, otherwise htm report.
+    Returns:
+      report(OptimizationReport or XmlOptimizationReport): optimization report of last run of backtest
+    """
+    import os
+    if os.path.isfile(get_report_abs_path(backtest.run_name, alias=alias, ext='xml')):
+        return XmlOptimizationReport(backtest, alias=alias)
+    return OptimizationReport(backtest, alias=alias)
+
+
+def get_report_abs_path(ea_name, alias=DEFAULT_MT5_NAME, ext='htm'):
+    """
+    Args:
+      ea_name(string): report name. run_name of backtest
+      ext(string): extension of report. htm or xml
+    """
     import os
     mt5 = get_mt5(alias=alias)
-    report = os.path.join(mt5.appdata_path, '%s.htm' % ea_name)
+    report = os.path.join(mt5.appdata_path, '%s.%s' % (ea_name, ext))
     return report
\ No newline at end of file
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  cost model aware scheduling of backtest batches.
+  duration of a backtest is roughly proportional to its days, and the cost of a day depends on
+  ea, symbol, period and model. the cost per day is learned from measured durations of former runs,
+  and jobs are dispatched longest expected first, which keeps terminals busy until the end of a batch
+  instead of leaving a long job alone at the tail.
+
+  e.g.:
+    cost_model = CostModel('costs.json')
+    farm = BacktestFarm(aliases, cost_model=cost_model)
+    print(farm.predict_makespan(backtests))
+    for result in farm.run(backtests):
+        ...
+    cost_model.save()
+"""
+from __future__ import absolute_import, division
+import heapq
+import json
+import os
+import threading
+
+from metatrader.backtest import OPTIMIZATION_FAST_GENETIC
+from metatrader.search import count_passes
+
+# cost of a day when nothing is known, seconds
+DEFAULT_SECONDS_PER_DAY = 1.0
+
+
+def get_days(backtest):
+    # ToDate is inclusive
+    return max(1, (backtest.to_date - backtest.from_date).days + 1)
+
+
+def get_cost_key(backtest):
+    """
+    Returns:
+      key(tuple(string)): ea name, symbol, period and model of backtest
+    """
+    return (str(backtest.ea_name), str(backtest.symbol), str(backtest.period), str(backtest.model))
+
+
+def get_units(backtest):
+    """
+    Returns:
+      units(int): days x passes of backtest, which its duration is proportional to
+    """
+    passes = count_passes(backtest.param) if getattr(backtest, 'optimization', False) else 1
+    return get_days(backtest) * passes
+
+
+class CostModel(object):
+    """
+    Notes:
+      seconds per day of each (ea, symbol, period, model), a day of an optimization counts per pass.
+      unknown key is estimated by the mean of known keys with the same model, then of all keys.
+      runs shorter than min_seconds, e.g. served by report cache, are not learned.
+      genetic optimizations run an unknown fraction of passes, so they are not learned,
+      and their prediction is the upper bound of running every pass.
+    Attributes:
+      path(string): json file to load and save estimates. None keeps them in memory
+      min_seconds(float): shortest duration to learn from
+      costs(dict(tuple:list(float, float))): total seconds and total units of each key
+    """
+
+    def __init__(self, path=None, min_seconds=1.0, default_seconds_per_day=DEFAULT_SECONDS_PER_DAY):
+        self.path = path
+        self.min_seconds = min_seconds
+        self.default_seconds_per_day = default_seconds_per_day
+        self.costs = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.isfile(path):
+            self.load()
+
+    def load(self):
+        with open(self.path) as fp:
+            raw = json.load(fp)
+        with self._lock:
+            self.costs = dict((tuple(item['key']), [item['seconds'], item['units']]) for item in raw)
+
+    def save(self):
+        with self._lock:
+            raw = [{'key': list(key), 'seconds': seconds, 'units': units}
+                   for key, (seconds, units) in sorted(self.costs.items())]
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w') as fp:
+            json.dump(raw, fp, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def observe(self, backtest, seconds):
+        """
+        Args:
+          backtest(metatrader.backtest.BackTest): finished job
+          seconds(float): measured duration of the job
+        """
+        if seconds < self.min_seconds:
+            return
+        if getattr(backtest, 'optimization', False) and \
+                getattr(backtest, 'optimization_mode', None) == OPTIMIZATION_FAST_GENETIC:
+            return
+        key = get_cost_key(backtest)
+        with self._lock:
+            cost = self.costs.setdefault(key, [0.0, 0])
+            cost[0] += seconds
+            cost[1] += get_units(backtest)
+
+    def seconds_per_day(self, backtest):
+        """
+        Returns:
+          seconds(float): estimated seconds per day(and pass) of backtest
+        """
+        key = get_cost_key(backtest)
+        with self._lock:
+            if key in self.costs:
+                seconds, units = self.costs[key]
+                return seconds / units
+            for keys in ([k for k in self.costs if k[3] == key[3]], list(self.costs)):
+                if keys:
+                    return sum(self.costs[k][0] / self.costs[k][1] for k in keys) / len(keys)
+        return self.default_seconds_per_day
+
+    def predict(self, backtest):
+        """
+        Returns:
+          seconds(float): expected duration of backtest
+        """
+        return self.seconds_per_day(backtest) * get_units(backtest)
+
+
+def order_jobs(backtests, cost_model):
+    """
+    Returns:
+      backtests(list(metatrader.backtest.BackTest)): backtests in order of expected duration, longest first
+    """
+    return sorted(backtests, key=cost_model.predict, reverse=True)
+
+
+def predict_makespan(backtests, workers, cost_model):
+    """
+    Notes:
+      simulate longest expected first dispatch: each job goes to the terminal idle first.
+    Args:
+      workers(int): num of terminals
+    Returns:
+      makespan(float), loads(list(float)): expected seconds until the batch ends and busy seconds of each terminal
+    """
+    loads = [0.0] * max(1, workers)
+    heap = [(0.0, i) for i in range(len(loads))]
+    for backtest in order_jobs(backtests, cost_model):
+        load, worker = heapq.heappop(heap)
+        load += cost_model.predict(backtest)
+        loads[worker] = load
+        heapq.heappush(heap, (load, worker))
+    return max(loads), loads
+
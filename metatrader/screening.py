@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  multi-fidelity screening of ea params by successive halving.
+  every candidate param set is first evaluated by a cheap backtest, open prices only over a short
+  recent span, and only the best 1/eta of them are promoted to the next rung, which runs a more
+  accurate model over a longer span. the last rung is the backtest itself, its own model over
+  from_date..to_date, so only a few survivors pay for the expensive run.
+
+  e.g.:
+    screening = SuccessiveHalving(backtest, aliases=['mt5-1', 'mt5-2'], metric='profit_factor', eta=3)
+    for evaluation in screening.run():
+        print(evaluation.candidate, evaluation.score)
+    print(screening.best.candidate, screening.units / float(screening.full_units))
+"""
+from __future__ import absolute_import, division
+import copy
+import itertools
+import logging
+import math
+from datetime import timedelta
+
+from metatrader.backtest import MODEL_EVERY_TICK, MODEL_OHLC_M1, MODEL_OPEN_PRICES, MODEL_REAL_TICKS
+from metatrader.farm import BacktestFarm
+from metatrader.mt5 import DEFAULT_MT5_NAME
+from metatrader.scheduler import get_days
+from metatrader.search import Evaluation, count_passes, fix_param, get_param_axes
+
+# tick models, cheapest first. math calculations has no ticks and is never screened by another model
+FIDELITY_ORDER = (MODEL_OPEN_PRICES, MODEL_OHLC_M1, MODEL_EVERY_TICK, MODEL_REAL_TICKS)
+
+# model of each rung before the last, cheapest first
+DEFAULT_CHEAP_MODELS = (MODEL_OPEN_PRICES, MODEL_OHLC_M1)
+
+# 1/eta of candidates survive each rung, and span of each rung is eta times longer than the former
+DEFAULT_ETA = 3
+
+# shortest span of a rung in days, shorter backtests have too few trades to rank
+DEFAULT_MIN_DAYS = 7
+
+
+class Rung(object):
+    """
+    Notes:
+      fidelity of one round of screening. to_date of backtest is kept, so spans of rungs end
+      at the same day and a longer span includes the shorter ones.
+    Attributes:
+      model(int): backtest model of the rung
+      from_date(datetime.datetime): backtest from date of the rung
+    """
+
+    def __init__(self, model, from_date):
+        self.model = model
+        self.from_date = from_date
+
+    def __repr__(self):
+        return 'Rung(model=%s, from_date=%s)' % (self.model, self.from_date.strftime('%Y.%m.%d'))
+
+
+def get_models(backtest, cheap_models=DEFAULT_CHEAP_MODELS):
+    """
+    Notes:
+      a cheap model not cheaper than model of backtest is replaced by model of backtest,
+      so no rung costs more per day than the backtest itself.
+      e.g.: [2, 1, 4] for real ticks, [2, 2, 2] for open prices only
+    Args:
+      backtest(metatrader.backtest.BackTest): backtest at full fidelity
+      cheap_models(tuple(int)): model of each rung before the last, cheapest first
+    Returns:
+      models(tuple(int)): model of each rung. the last one is model of backtest
+    """
+    model = backtest.model
+    rank = FIDELITY_ORDER.index(model) if model in FIDELITY_ORDER else -1
+    models = [cheap if cheap in FIDELITY_ORDER[:max(rank, 0)] else model for cheap in cheap_models]
+    return tuple(models) + (model,)
+
+
+def get_rungs(backtest, models=None, eta=DEFAULT_ETA, min_days=DEFAULT_MIN_DAYS):
+    """
+    Notes:
+      span of rung i of n is days / eta ** (n - 1 - i), so the last rung is from_date..to_date of backtest.
+    Args:
+      backtest(metatrader.backtest.BackTest): backtest at full fidelity
+      models(tuple(int)): model of each rung, cheapest first. get_models(backtest) if None
+      eta(int): ratio of spans of adjacent rungs
+      min_days(int): shortest span in days
+    Returns:
+      rungs(list(Rung)): rungs of increasing fidelity
+    """
+    if models is None:
+        models = get_models(backtest)
+    days = get_days(backtest)
+    rungs = []
+    for i, model in enumerate(models):
+        span = int(math.ceil(days / float(eta) ** (len(models) - 1 - i)))
+        span = min(days, max(min_days, span))
+        if span == days:
+            from_date = backtest.from_date
+        else:
+            from_date = backtest.to_date - timedelta(days=span - 1)
+        rungs.append(Rung(model, from_date))
+    return rungs
+
+
+class SuccessiveHalving(object):
+    """
+    Notes:
+      each rung is run as one batch on the farm, and survivors are decided when the whole batch is finished.
+      failed backtests are dropped. units count days of backtests like metatrader.scheduler.get_units,
+      and do not weight cheaper models, so the actual saving of compute is larger than units / full_units.
+    Attributes:
+      backtest(metatrader.backtest.BackTest): template backtest. param with max/interval is screened,
+        and its model, from_date and to_date are the highest fidelity
+      axes(list(tuple(string, list))): screened params and their values
+      rungs(list(Rung)): rungs of increasing fidelity. get_rungs(backtest, eta=eta) by default
+      eta(int): 1/eta of candidates of a rung are promoted to the next one
+      metric(string or callable): report attribute name or function of report to score a candidate
+      maximize(bool): larger metric is better if True
+      min_survivors(int): least num of candidates promoted to the next rung
+      history(list(list(Evaluation))): succeeded evaluations of each rung of the last run, best first
+      best(Evaluation): best evaluation of the last rung
+      backtests(int): num of backtests run
+      units(int): days of backtests run
+      full_units(int): days of backtests to run every candidate at the highest fidelity
+    """
+
+    def __init__(self, backtest, aliases=(DEFAULT_MT5_NAME,), rungs=None, eta=DEFAULT_ETA, metric='profit',
+                 maximize=True, min_survivors=1, cache=None, store=None, cost_model=None):
+        self.backtest = backtest
+        self.axes = get_param_axes(backtest.param)
+        if not self.axes:
+            raise ValueError('no ea param to screen. set max and interval of ea param')
+        if eta <= 1:
+            raise ValueError('eta must be larger than 1, but %s' % eta)
+
+        self.rungs = list(rungs) if rungs is not None else get_rungs(backtest, eta=eta)
+        if not self.rungs:
+            raise ValueError('at least one rung is required')
+
+        self.farm = BacktestFarm(aliases, cache=cache, store=store, cost_model=cost_model)
+        self.eta = eta
+        self.metric = metric
+        self.maximize = maximize
+        self.min_survivors = max(1, min_survivors)
+        self.history = []
+        self.best = None
+        self.backtests = 0
+        self.units = 0
+        self.full_units = count_passes(backtest.param) * get_days(backtest)
+
+    def _score(self, report):
+        if callable(self.metric):
+            return self.metric(report)
+        return getattr(report, self.metric)
+
+    def get_candidates(self):
+        """
+        Returns:
+          candidates(list(dict(string:value))): every candidate in order of the grid
+        """
+        names = [name for name, _ in self.axes]
+        return [dict(zip(names, values)) for values in itertools.product(*[values for _, values in self.axes])]
+
+    def get_backtest(self, candidate, rung):
+        """
+        Returns:
+          backtest(metatrader.backtest.BackTest): single backtest of candidate at fidelity of rung
+        """
+        backtest = copy.copy(self.backtest)
+        backtest.param = fix_param(self.backtest.param, candidate)
+        backtest.model = rung.model
+        backtest.from_date = rung.from_date
+        return backtest
+
+    def evaluate(self, candidates, rung):
+        """
+        Args:
+          candidates(list(dict(string:value))): candidates to evaluate
+          rung(Rung): fidelity of backtests
+        Returns:
+          evaluations(list(Evaluation)): evaluation of each candidate, in order of candidates
+        """
+        backtests = [self.get_backtest(candidate, rung) for candidate in candidates]
+        order = dict((id(backtest), i) for i, backtest in enumerate(backtests))
+        evaluations = [None] * len(backtests)
+
+        for result in self.farm.run(backtests):
+            i = order[id(result.backtest)]
+            score = None
+            if result.succeeded and result.report is not None:
+                score = self._score(result.report)
+            evaluations[i] = Evaluation(candidates[i], result.backtest.param, score, result.report, result.error,
+                                        result.alias, result.elapsed)
+
+        self.backtests += len(backtests)
+        self.units += sum(get_days(backtest) for backtest in backtests)
+        return evaluations
+
+    def rank(self, evaluations):
+        """
+        Returns:
+          evaluations(list(Evaluation)): succeeded evaluations, best first. ties keep their order
+        """
+        sign = -1 if self.maximize else 1
+        scored = [evaluation for evaluation in evaluations if evaluation is not None and evaluation.score is not None]
+        return sorted(scored, key=lambda evaluation: sign * evaluation.score)
+
+    def run(self):
+        """
+        Notes:
+          screen every candidate rung by rung.
+        Returns:
+          evaluations(list(Evaluation)): succeeded evaluations of the last rung, best first.
+            empty if every candidate of a rung failed
+        """
+        self.history = []
+        self.best = None
+        self.backtests = 0
+        self.units = 0
+
+        candidates = self.get_candidates()
+        ranked = []
+        for i, rung in enumerate(self.rungs):
+            ranked = self.rank(self.evaluate(candidates, rung))
+            self.history.append(ranked)
+            logging.info('rung %d of %d(%r): %d of %d candidates succeeded', i + 1, len(self.rungs), rung,
+                         len(ranked), len(candidates))
+            if not ranked:
+                logging.error('every candidate failed at rung %d, screening stopped', i + 1)
+                return []
+            survivors = max(self.min_survivors, int(math.ceil(len(ranked) / float(self.eta))))
+            candidates = [evaluation.candidate for evaluation in ranked[:survivors]]
+
+        self.best = ranked[0]
+        return ranked
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  python driven parameter search.
+  ea params with max and interval are expanded into candidate sets like terminal optimization does,
+  and each candidate is evaluated as an independent backtest on a pool of terminals.
+  so the search scales with the number of terminals and can be steered by grid, random or
+  bayesian(TPE) strategies, and stopped by a budget or convergence criterion.
+
+  e.g.:
+    search = ParameterSearch(backtest, aliases=['mt5-1', 'mt5-2'], strategy='tpe',
+                             metric='profit_factor', budget=200, patience=50)
+    for evaluation in search.run():
+        print(evaluation.candidate, evaluation.score)
+    print(search.best.candidate)
+"""
+from __future__ import absolute_import, division
+import copy
+import itertools
+import logging
+import math
+import random
+import threading
+
+from metatrader.farm import BacktestFarm
+from metatrader.mt5 import DEFAULT_MT5_NAME
+
+
+def get_param_values(spec):
+    """
+    Args:
+      spec(dict): one ea param. e.g.: {'type': 'int', 'value': 12, 'max': 48, 'interval': 4}
+    Returns:
+      values(list): every value from value to max by interval like terminal optimization
+    """
+    if spec.get('type') == 'bool':
+        return [False, True]
+
+    start = spec['value']
+    interval = spec['interval']
+    stop = spec['max']
+    if interval <= 0:
+        raise ValueError('interval of ea param must be positive, but %s' % interval)
+
+    # small epsilon absorbs float error of e.g. (0.2 - 0.02) / 0.02
+    count = int(math.floor((stop - start) / float(interval) + 1e-9)) + 1
+    if spec.get('type') == 'int':
+        return [int(start + i * interval) for i in range(count)]
+    return [round(start + i * interval, 10) for i in range(count)]
+
+
+def get_param_axes(param):
+    """
+    Args:
+      param(dict): ea param of BackTest
+    Returns:
+      axes(list(tuple(string, list))): name and values of each optimized param, sorted by name
+    """
+    axes = []
+    for name in sorted(param):
+        spec = param[name]
+        if 'max' in spec and 'interval' in spec:
+            axes.append((name, get_param_values(spec)))
+    return axes
+
+
+def count_passes(param):
+    """
+    Returns:
+      passes(int): num of candidate sets of param. 1 if nothing is optimized
+    """
+    passes = 1
+    for _, values in get_param_axes(param):
+        passes *= len(values)
+    return passes
+
+
+def fix_param(param, candidate):
+    """
+    Args:
+      param(dict): ea param of BackTest
+      candidate(dict(string:value)): value of each optimized param
+    Returns:
+      param(dict): new ea param with candidate values and without max/interval
+    """
+    fixed = {}
+    for name, spec in param.items():
+        spec = dict(spec)
+        if name in candidate:
+            spec['value'] = candidate[name]
+        spec.pop('max', None)
+        spec.pop('interval', None)
+        fixed[name] = spec
+    return fixed
+
+
+class GridSearch(object):
+    """
+    Notes:
+      every candidate in order of the grid, same as slow complete optimization of terminal.
+      every strategy has suggest and observe, and larger score is better.
+    """
+
+    def __init__(self, axes, seed=None):
+        self.axes = axes
+        self._grid = itertools.product(*[values for _, values in axes])
+
+    def suggest(self):
+        """
+        Returns:
+          candidate(dict(string:value)): next candidate. None if every candidate is suggested
+        """
+        for values in self._grid:
+            return dict(zip([name for name, _ in self.axes], values))
+        return None
+
+    def observe(self, candidate, score):
+        pass
+
+
+class RandomSearch(object):
+    """
+    Notes:
+      candidates sampled uniformly without replacement.
+    """
+
+    def __init__(self, axes, seed=None):
+        self.axes = axes
+        self._random = random.Random(seed)
+        self._suggested = set()
+        self._total = 1
+        for _, values in axes:
+            self._total *= len(values)
+
+    def _to_candidate(self, index):
+        return dict((name, values[i]) for (name, values), i in zip(self.axes, index))
+
+    def _to_index(self, candidate):
+        return tuple(values.index(candidate[name]) for name, values in self.axes)
+
+    def _random_index(self):
+        if len(self._suggested) >= self._total:
+            return None
+
+        if len(self._suggested) * 2 < self._total:
+            while True:
+                index = tuple(self._random.randrange(len(values)) for _, values in self.axes)
+                if index not in self._suggested:
+                    return index
+
+        # most of the space is suggested, pick from the rest
+        rest = [index for index in itertools.product(*[range(len(values)) for _, values in self.axes])
+                if index not in self._suggested]
+        return self._random.choice(rest)
+
+    def suggest(self):
+        index = self._random_index()
+        if index is None:
+            return None
+        self._suggested.add(index)
+        return self._to_candidate(index)
+
+    def observe(self, candidate, score):
+        pass
+
+
+class TPESearch(RandomSearch):
+    """
+    Notes:
+      bayesian search by tree-structured parzen estimator.
+      after n_startup random candidates, observations are split into the best gamma fraction
+      and the rest. each axis gets a smoothed density over its values for both groups,
+      and the sampled candidate with the largest good/bad density ratio is suggested.
+    """
+
+    def __init__(self, axes, seed=None, n_startup=10, gamma=0.25, n_samples=24):
+        super(TPESearch, self).__init__(axes, seed=seed)
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.n_samples = n_samples
+        self._history = []
+
+    def observe(self, candidate, score):
+        self._history.append((self._to_index(candidate), score))
+
+    def _density(self, indices, axis):
+        # prior keeps every value possible, neighbors share weight because values are ordered
+        size = len(self.axes[axis][1])
+        bandwidth = max(1, size // 10)
+        density = [1.0 / size] * size
+        for index in indices:
+            center = index[axis]
+            for k in range(max(0, center - bandwidth), min(size, center + bandwidth + 1)):
+                density[k] += 1.0 - abs(k - center) / float(bandwidth + 1)
+        total = sum(density)
+        return [d / total for d in density]
+
+    def suggest(self):
+        if len(self._history) < self.n_startup:
+            return super(TPESearch, self).suggest()
+
+        ordered = sorted(self._history, key=lambda h: h[1], reverse=True)
+        n_good = max(1, int(math.ceil(self.gamma * len(ordered))))
+        good = [index for index, _ in ordered[:n_good]]
+        bad = [index for index, _ in ordered[n_good:]]
+
+        densities = [(self._density(good, axis), self._density(bad, axis)) for axis in range(len(self.axes))]
+
+        best_index = None
+        best_ratio = None
+        for _ in range(self.n_samples):
+            index = tuple(self._weighted_choice(l) for l, _ in densities)
+            if index in self._suggested:
+                continue
+            ratio = 1.0
+            for (l, g), i in zip(densities, index):
+                ratio *= l[i] / g[i]
+            if best_ratio is None or ratio > best_ratio:
+                best_index = index
+                best_ratio = ratio
+
+        if best_index is None:
+            best_index = self._random_index()
+            if best_index is None:
+                return None
+
+        self._suggested.add(best_index)
+        return self._to_candidate(best_index)
+
+    def _weighted_choice(self, weights):
+        r = self._random.random() * sum(weights)
+        for i, weight in enumerate(weights):
+            r -= weight
+            if r <= 0:
+                return i
+        return len(weights) - 1
+
+
+STRATEGIES = {'grid': GridSearch,
+              'random': RandomSearch,
+              'tpe': TPESearch,
+              'bayesian': TPESearch}
+
+
+class Evaluation(object):
+    """
+    Notes:
+      one evaluated candidate of ParameterSearch
+    Attributes:
+      candidate(dict(string:value)): value of each optimized param
+      param(dict): ea param used for the backtest
+      score(float): metric of report. None if backtest failed
+      report(metatrader.report.BacktestReport): report of backtest.
+        metatrader.store.StoredPass if the candidate was restored from store
+      error(Exception): exception raised by backtest. None if succeeded
+      alias(string): mt5 alias which ran the backtest. None if restored from store
+      elapsed(float): wall clock seconds of the backtest
+    """
+
+    def __init__(self, candidate, param, score, report, error, alias, elapsed):
+        self.candidate = candidate
+        self.param = param
+        self.score = score
+        self.report = report
+        self.error = error
+        self.alias = alias
+        self.elapsed = elapsed
+
+
+class ParameterSearch(object):
+    """
+    Notes:
+      evaluate candidate param sets of backtest as single backtests over a pool of terminals.
+      a new candidate is suggested each time a terminal gets idle, so adaptive strategies
+      learn from every finished backtest.
+    Attributes:
+      backtest(metatrader.backtest.BackTest): template backtest. param with max/interval is searched
+      axes(list(tuple(string, list))): searched params and their values
+      strategy(object): GridSearch, RandomSearch, TPESearch or any object with suggest/observe
+      metric(string or callable): report attribute name or function of report to score a candidate
+      maximize(bool): larger metric is better if True
+      budget(int): max num of backtests. unlimited if None
+      patience(int): stop after this num of finished backtests without improvement of best score
+      min_delta(float): improvement less than this is not counted as improvement
+      store(metatrader.store.PassStore): finished backtests are stored, and stored candidates
+        are restored without running backtest. so an interrupted search resumes where it stopped
+      evaluations(list(Evaluation)): finished evaluations
+      restored(int): num of evaluations restored from store
+      best(Evaluation): best evaluation so far
+    """
+
+    def __init__(self, backtest, aliases=(DEFAULT_MT5_NAME,), strategy='grid', metric='profit', maximize=True,
+                 budget=None, patience=None, min_delta=0.0, cache=None, seed=None, store=None):
+        self.backtest = backtest
+        self.axes = get_param_axes(backtest.param)
+        if not self.axes:
+            raise ValueError('no ea param to search. set max and interval of ea param')
+
+        if hasattr(strategy, 'suggest'):
+            self.strategy = strategy
+        elif strategy in STRATEGIES:
+            self.strategy = STRATEGIES[strategy](self.axes, seed=seed)
+        else:
+            raise ValueError('unknown search strategy %s' % strategy)
+
+        self.farm = BacktestFarm(aliases, cache=cache, store=store)
+        self.store = store
+        self.metric = metric
+        self.maximize = maximize
+        self.budget = budget
+        self.patience = patience
+        self.min_delta = min_delta
+        self.evaluations = []
+        self.restored = 0
+        self.best = None
+
+        self._lock = threading.Lock()
+        self._candidates = {}
+        self._submitted = 0
+        self._since_best = 0
+        self._stopped = False
+
+    @property
+    def jobs_per_hour(self):
+        return self.farm.jobs_per_hour
+
+    def _score(self, report):
+        if callable(self.metric):
+            return self.metric(report)
+        return getattr(report, self.metric)
+
+    def _jobs(self):
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                if self.budget is not None and self._submitted >= self.budget:
+                    return
+                candidate = self.strategy.suggest()
+                if candidate is None:
+                    return
+                self._submitted += 1
+
+            backtest = copy.copy(self.backtest)
+            backtest.param = fix_param(self.backtest.param, candidate)
+            if self._restore(candidate, backtest):
+                continue
+            self._candidates[id(backtest)] = (candidate, backtest)
+            yield backtest
+
+    def _restore(self, candidate, backtest):
+        if self.store is None:
+            return False
+        stored = self.store.get(backtest)
+        if stored is None:
+            return False
+
+        try:
+            score = self._score(stored)
+        except AttributeError:
+            # metric needs a field which is not stored, run it again
+            return False
+
+        self._observe(Evaluation(candidate, backtest.param, score, stored, None, None, 0.0))
+        self.restored += 1
+        return True
+
+    def _observe(self, evaluation):
+        with self._lock:
+            self.evaluations.append(evaluation)
+            if evaluation.score is None:
+                return
+
+            # strategies always maximize
+            self.strategy.observe(evaluation.candidate,
+                                  evaluation.score if self.maximize else -evaluation.score)
+
+            sign = 1 if self.maximize else -1
+            if self.best is None or sign * (evaluation.score - self.best.score) > self.min_delta:
+                self.best = evaluation
+                self._since_best = 0
+            else:
+                self._since_best += 1
+                if self.patience is not None and self._since_best >= self.patience:
+                    logging.info('parameter search converged after %d backtests', len(self.evaluations))
+                    self._stopped = True
+
+    def run(self):
+        """
+        Notes:
+          run search and yield Evaluation in order of completion.
+        """
+        self._stopped = False
+        for result in self.farm.run(self._jobs()):
+            candidate, backtest = self._candidates.pop(id(result.backtest))
+            score = None
+            if result.succeeded and result.report is not None:
+                score = self._score(result.report)
+            evaluation = Evaluation(candidate, backtest.param, score, result.report, result.error,
+                                    result.alias, result.elapsed)
+            self._observe(evaluation)
+            yield evaluation
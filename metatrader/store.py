@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  persistent store of evaluated passes in sqlite.
+  every finished pass, a single backtest or a pass of an optimization report, is written
+  as soon as it is known, keyed by the test conditions and a canonical hash of ea params.
+  so an interrupted parameter search resumes by skipping stored passes,
+  and results are queried with sql on indexed columns instead of parsing reports again.
+
+  e.g.:
+    store = PassStore('passes.sqlite')
+    search = ParameterSearch(backtest, aliases=['mt5-1', 'mt5-2'], store=store)
+    list(search.run())
+    best = store.query(backtest, where='max_drawdown_rate < ?', args=(10,), order_by='profit_factor', limit=1)
+"""
+from __future__ import absolute_import
+import json
+import sqlite3
+import threading
+import time
+
+from metatrader.cache import make_key
+
+# result fields of report stored as columns
+RESULT_FIELDS = (('profit', 'REAL'),
+                 ('total_trades', 'INTEGER'),
+                 ('profit_factor', 'REAL'),
+                 ('expected_payoff', 'REAL'),
+                 ('max_drawdown', 'REAL'),
+                 ('max_drawdown_rate', 'REAL'),
+                 ('recovery_factor', 'REAL'),
+                 ('sharpe_ratio', 'REAL'),
+                 ('custom', 'REAL'))
+
+COLUMNS = ('run_key', 'param_hash', 'param') + tuple(name for name, _ in RESULT_FIELDS) + ('created',)
+
+
+def _canonical_value(value):
+    # reports have params as text, python sweeps as typed values.
+    # both are normalized so that e.g. 12, 12.0 and '12' get the same hash
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    text = str(value).strip()
+    if text.lower() in ('true', 'false'):
+        return text.lower()
+    try:
+        return '%.10g' % float(text)
+    except ValueError:
+        return text
+
+
+def get_param_values(backtest, param=None):
+    """
+    Args:
+      backtest(metatrader.backtest.BackTest): backtest which gives the value of every ea param
+      param(dict): values which override ea params of backtest, e.g. a candidate or param of ShortReport.
+        ea param spec like {'type': 'int', 'value': 12} is also accepted
+    Returns:
+      values(dict(string:string)): canonical value of each ea param
+    """
+    param = param or {}
+    values = {}
+    for name, spec in backtest.param.items():
+        values[name] = spec.get('value')
+
+    for name, value in param.items():
+        # params unknown to backtest are left out, unless backtest has no param at all
+        if backtest.param and name not in backtest.param:
+            continue
+        if isinstance(value, dict):
+            value = value.get('value')
+        values[name] = value
+
+    return dict((name, _canonical_value(value)) for name, value in values.items())
+
+
+def get_param_hash(backtest, param=None):
+    """
+    Returns:
+      hash(string): canonical hash of ea param values
+    """
+    return make_key(json.dumps(get_param_values(backtest, param), sort_keys=True))
+
+
+def get_run_key(backtest):
+    """
+    Notes:
+      ea params are not part of run key, so every pass of one optimization has the same run key.
+      recompile of ea is not detected, use another store after changing the ea.
+    Returns:
+      key(string): hash of test conditions of backtest
+    """
+    return make_key(backtest.ea_full_path,
+                    str(backtest.symbol),
+                    str(backtest.period),
+                    str(backtest.model),
+                    backtest.from_date.strftime('%Y.%m.%d'),
+                    backtest.to_date.strftime('%Y.%m.%d'),
+                    str(backtest.deposit),
+                    str(backtest.deposit_currency),
+                    str(backtest.leverage),
+                    str(getattr(backtest, 'spread', None)))
+
+
+class StoredPass(object):
+    """
+    Notes:
+      one pass read from PassStore. has the same result attributes as ShortReport,
+      so a metric of report can be evaluated on it.
+    Attributes:
+      run_key(string): hash of test conditions
+      param_hash(string): canonical hash of ea params
+      param(dict(string:string)): canonical value of each ea param
+      created(float): unix time when the pass was stored
+    """
+
+    def __init__(self, row):
+        for name in COLUMNS:
+            setattr(self, name, row[name])
+        self.param = json.loads(self.param)
+
+
+class PassStore(object):
+    """
+    Notes:
+      passes are kept in one sqlite table with the primary key (run_key, param_hash).
+      a pass stored again replaces the old one.
+      one store can be shared by threads, e.g. by BacktestFarm workers.
+    Attributes:
+      path(string): abs path of sqlite database. ':memory:' for an in-memory store
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        with self._lock, self._conn:
+            if path != ':memory:':
+                # readers don't block the writer, and a crash loses at most the running transaction
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS passes ('
+                               'run_key TEXT NOT NULL, '
+                               'param_hash TEXT NOT NULL, '
+                               'param TEXT NOT NULL, '
+                               '%s, '
+                               'created REAL, '
+                               'PRIMARY KEY (run_key, param_hash))'
+                               % ', '.join('%s %s' % field for field in RESULT_FIELDS))
+            for name, _ in RESULT_FIELDS:
+                self._conn.execute('CREATE INDEX IF NOT EXISTS passes_%s ON passes (run_key, %s)' % (name, name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get_record(self, run_key, backtest, param, result):
+        values = get_param_values(backtest, param)
+        record = [run_key,
+                  make_key(json.dumps(values, sort_keys=True)),
+                  json.dumps(values, sort_keys=True)]
+        record.extend(getattr(result, name, None) for name, _ in RESULT_FIELDS)
+        record.append(time.time())
+        return record
+
+    def _insert(self, records):
+        sql = 'INSERT OR REPLACE INTO passes (%s) VALUES (%s)' % (', '.join(COLUMNS), ', '.join('?' * len(COLUMNS)))
+        with self._lock, self._conn:
+            self._conn.executemany(sql, records)
+
+    def put(self, backtest, result, param=None):
+        """
+        Args:
+          backtest(metatrader.backtest.BackTest): backtest of the pass
+          result(BacktestReport or ShortReport): result of the pass
+          param(dict): ea param values of the pass. param of backtest is used if None
+        """
+        self._insert([self._get_record(get_run_key(backtest), backtest, param, result)])
+
+    def put_results(self, backtest, results, batch_size=1000):
+        """
+        Notes:
+          store every pass of an optimization. passes are committed in batches.
+          if results is a stream, e.g. OptimizationReport.iter_results, the report is stored with flat memory
+          and batches committed before reading fails are kept. a list of results is stored at once.
+        Args:
+          backtest(metatrader.backtest.BackTest): optimized backtest
+          results(iterable(metatrader.report.ShortReport)): passes
+        Returns:
+          count(int): num of stored passes
+        """
+        run_key = get_run_key(backtest)
+        count = 0
+        batch = []
+        for result in results:
+            batch.append(self._get_record(run_key, backtest, result.param, result))
+            if len(batch) >= batch_size:
+                self._insert(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self._insert(batch)
+            count += len(batch)
+        return count
+
+    def get(self, backtest, param=None):
+        """
+        Returns:
+          stored(StoredPass): stored pass of backtest with param. None if not stored
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM passes WHERE run_key = ? AND param_hash = ?',
+                                     (get_run_key(backtest), get_param_hash(backtest, param))).fetchone()
+        if row is None:
+            return None
+        return StoredPass(row)
+
+    def count(self, backtest=None):
+        """
+        Returns:
+          count(int): num of stored passes of test conditions of backtest. every pass if None
+        """
+        sql = 'SELECT COUNT(*) FROM passes'
+        args = ()
+        if backtest is not None:
+            sql += ' WHERE run_key = ?'
+            args = (get_run_key(backtest),)
+        with self._lock:
+            return self._conn.execute(sql, args).fetchone()[0]
+
+    def query(self, backtest=None, where=None, args=(), order_by=None, descending=True, limit=None):
+        """
+        Args:
+          backtest(metatrader.backtest.BackTest): only passes of test conditions of backtest. every pass if None
+          where(string): sql condition on result columns with ? placeholders. e.g.: 'max_drawdown_rate < ?'
+          args(tuple): values of placeholders in where
+          order_by(string): column name to sort by
+          descending(bool): sort in descending order if True
+          limit(int): max num of passes
+        Returns:
+          passes(list(StoredPass)): matched passes
+        """
+        conditions = []
+        values = []
+        if backtest is not None:
+            conditions.append('run_key = ?')
+            values.append(get_run_key(backtest))
+        if where:
+            conditions.append('(%s)' % where)
+            values.extend(args)
+
+        sql = 'SELECT * FROM passes'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if order_by is not None:
+            if order_by not in COLUMNS:
+                raise ValueError('%s is not a column of pass store' % order_by)
+            # NULL is always last
+            sql += ' ORDER BY %s IS NULL, %s %s' % (order_by, order_by, 'DESC' if descending else 'ASC')
+        if limit is not None:
+            sql += ' LIMIT %d' % int(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, values).fetchall()
+        return [StoredPass(row) for row in rows]
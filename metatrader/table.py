@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  columnar table of optimization passes backed by numpy arrays.
+  one pass costs a few numbers instead of a ShortReport object,
+  and ranking/filtering runs vectorized over whole columns.
+"""
+from __future__ import absolute_import, division
+import numpy as np
+
+from metatrader.mt5 import DEFAULT_MT5_NAME
+
+# result columns of optimization report and their dtype.
+# a column with missing values is float64 with NaN, e.g. total_trades of xml report without Trades column
+RESULT_COLUMNS = (('profit', np.float64),
+                  ('total_trades', np.int64),
+                  ('profit_factor', np.float64),
+                  ('expected_payoff', np.float64),
+                  ('max_drawdown', np.float64),
+                  ('max_drawdown_rate', np.float64))
+
+
+def _to_result_array(values, dtype):
+    # None is NaN, which int has no room for
+    if np.issubdtype(dtype, np.integer) and any(v is None for v in values):
+        dtype = np.float64
+    return np.array(values, dtype=dtype)
+
+
+def _to_value(value):
+    # NaN of a missing value is None again
+    value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _to_typed_array(values):
+    """
+    Notes:
+      convert ea param values(string in report) into the narrowest array type.
+      int, float, bool(true/false) and string are tried in this order.
+    """
+    for dtype in (np.int64, np.float64):
+        try:
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError):
+            pass
+
+    lowered = [str(v).lower() for v in values]
+    if all(v in ('true', 'false') for v in lowered):
+        return np.array([v == 'true' for v in lowered], dtype=bool)
+
+    return np.array(values, dtype=np.str_)
+
+
+class OptimizationResultTable(object):
+    """
+    Notes:
+      optimization passes stored as typed numpy columns.
+      report values are in result columns and ea params are in param columns.
+      every method returning a table returns a new table, the original is not changed.
+
+      e.g.:
+        table = OptimizationResultTable.from_report(backtest)
+        good = table.filter(table.max_drawdown_rate < 10).top(20, 'profit_factor')
+        best = good.row(0)
+    Attributes:
+      backtest(metatrader.backtest.BackTest): optimized backtest
+      initial_deposit(float): initial deposit of optimization
+      columns(dict(string:numpy.ndarray)): result columns. also readable as attribute e.g. table.profit
+      params(dict(string:numpy.ndarray)): ea param columns
+    """
+
+    def __init__(self, backtest, columns, params, initial_deposit=None):
+        self.backtest = backtest
+        self.columns = columns
+        self.params = params
+        self.initial_deposit = initial_deposit
+
+    @classmethod
+    def from_results(cls, backtest, results):
+        """
+        Args:
+          backtest(metatrader.backtest.BackTest): optimized backtest
+          results(iterable(metatrader.report.ShortReport)): passes. consumed only once
+        """
+        raw_columns = dict((name, []) for name, _ in RESULT_COLUMNS)
+        raw_params = {}
+        initial_deposit = None
+        num_rows = 0
+
+        for result in results:
+            initial_deposit = result.initial_deposit
+            for name, _ in RESULT_COLUMNS:
+                raw_columns[name].append(getattr(result, name))
+            for name, value in result.param.items():
+                if name not in raw_params:
+                    raw_params[name] = [None] * num_rows
+                raw_params[name].append(value)
+            num_rows += 1
+            for name in raw_params:
+                if len(raw_params[name]) < num_rows:
+                    raw_params[name].append(None)
+
+        columns = dict((name, _to_result_array(raw_columns[name], dtype)) for name, dtype in RESULT_COLUMNS)
+        params = dict((name, _to_typed_array(values)) for name, values in raw_params.items())
+        return cls(backtest, columns, params, initial_deposit=initial_deposit)
+
+    @classmethod
+    def from_report(cls, backtest, alias=DEFAULT_MT5_NAME, report_file=None):
+        """
+        Notes:
+          build table while streaming the optimization report, no ShortReport list is built.
+          xml report is read if report_file ends with .xml or xml report of alias exists.
+        Args:
+          backtest(metatrader.backtest.BackTest): optimized backtest
+          alias(string): mt5 alias which ran the optimization
+          report_file(string): abs path of report. report in data dir of alias is used if None
+        """
+        import os
+        from metatrader.report import OptimizationReport, XmlOptimizationReport, get_report_abs_path
+
+        if report_file is None:
+            xml_report = get_report_abs_path(backtest.run_name, alias=alias, ext='xml')
+            if os.path.isfile(xml_report):
+                report_file = xml_report
+
+        reader = OptimizationReport
+        if report_file is not None and report_file.lower().endswith('.xml'):
+            reader = XmlOptimizationReport
+        return cls.from_results(backtest, reader.iter_results(backtest, alias=alias, report_file=report_file))
+
+    def __len__(self):
+        return len(self.columns['profit'])
+
+    def __getattr__(self, name):
+        # result columns are readable as attribute
+        columns = self.__dict__.get('columns', {})
+        if name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def column(self, name):
+        """
+        Returns:
+          column(numpy.ndarray): result column or ea param column of name
+        """
+        if name in self.columns:
+            return self.columns[name]
+        if name in self.params:
+            return self.params[name]
+        raise KeyError('%s is not a column of optimization results' % name)
+
+    def take(self, indices):
+        """
+        Args:
+          indices(numpy.ndarray): row indices or bool mask
+        Returns:
+          table(OptimizationResultTable): table of selected rows
+        """
+        columns = dict((name, values[indices]) for name, values in self.columns.items())
+        params = dict((name, values[indices]) for name, values in self.params.items())
+        return self.__class__(self.backtest, columns, params, initial_deposit=self.initial_deposit)
+
+    def filter(self, mask):
+        """
+        Args:
+          mask(numpy.ndarray): bool array. e.g.: table.profit > 0
+        """
+        return self.take(np.asarray(mask, dtype=bool))
+
+    def sort(self, by, descending=False):
+        """
+        Args:
+          by(string): column name
+          descending(bool): sort in descending order if True
+        """
+        order = np.argsort(self.column(by), kind='mergesort')
+        if descending:
+            order = order[::-1]
+        return self.take(order)
+
+    def top(self, k, by='profit', descending=True):
+        """
+        Notes:
+          k best rows sorted by column. only k rows are sorted.
+        Args:
+          k(int): num of rows
+          by(string): column name
+          descending(bool): largest values are best if True
+        """
+        values = self.column(by)
+        k = min(k, len(values))
+        if k <= 0:
+            return self.take(np.array([], dtype=np.int64))
+
+        keys = -values if descending else values
+        if k < len(values):
+            candidates = np.argpartition(keys, k - 1)[:k]
+        else:
+            candidates = np.arange(len(values))
+        return self.take(candidates[np.argsort(keys[candidates], kind='mergesort')])
+
+    def groupby(self, by, column='profit', func='mean'):
+        """
+        Notes:
+          aggregate column by distinct values of another column.
+        Args:
+          by(string): column name to group by. e.g.: ea param name
+          column(string): column name to aggregate
+          func(string): one of count, sum, mean, min, max
+        Returns:
+          keys(numpy.ndarray), values(numpy.ndarray): distinct values of by and aggregated values
+        """
+        keys, inverse = np.unique(self.column(by), return_inverse=True)
+        values = self.column(column).astype(np.float64)
+
+        if func == 'count':
+            return keys, np.bincount(inverse, minlength=len(keys))
+        elif func == 'sum':
+            return keys, np.bincount(inverse, weights=values, minlength=len(keys))
+        elif func == 'mean':
+            return keys, np.bincount(inverse, weights=values, minlength=len(keys)) / np.bincount(inverse, minlength=len(keys))
+        elif func in ('min', 'max'):
+            ufunc = np.minimum if func == 'min' else np.maximum
+            aggregated = np.full(len(keys), np.inf if func == 'min' else -np.inf)
+            ufunc.at(aggregated, inverse, values)
+            return keys, aggregated
+        raise ValueError('unsupported aggregation %s' % func)
+
+    def row(self, i):
+        """
+        Notes:
+          ShortReport of one pass is created only when requested.
+        Returns:
+          report(metatrader.report.ShortReport): i-th pass
+        """
+        from metatrader.report import ShortReport
+
+        kwargs = dict((name, _to_value(values[i])) for name, values in self.columns.items())
+        param = dict((name, values[i].item()) for name, values in self.params.items())
+        return ShortReport(self.backtest, param=param, initial_deposit=self.initial_deposit, **kwargs)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
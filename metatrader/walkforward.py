@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Notes:
+  walk-forward analysis.
+  from_date..to_date of backtest is sliced into in-sample/out-of-sample windows.
+  in-sample optimizations of every window run concurrently over a pool of terminals,
+  then the best pass of each window is validated on its out-of-sample span,
+  and the out-of-sample results are compared with the in-sample ones.
+
+  e.g.:
+    walk_forward = WalkForward(backtest, in_sample=timedelta(days=360), out_of_sample=timedelta(days=90),
+                               aliases=['mt5-1', 'mt5-2', 'mt5-3'], metric='profit_factor')
+    for window in walk_forward.run():
+        print(window.out_of_sample_from, window.best.param, window.efficiency)
+    print(walk_forward.efficiency)
+"""
+from __future__ import absolute_import, division
+import copy
+import logging
+from datetime import timedelta
+
+from metatrader.farm import BacktestFarm
+from metatrader.mt5 import DEFAULT_MT5_NAME
+
+
+def get_windows(from_date, to_date, in_sample, out_of_sample, anchored=False):
+    """
+    Notes:
+      windows step forward by out_of_sample, so out-of-sample spans are back to back.
+      the last window is dropped if its out-of-sample span goes beyond to_date.
+    Args:
+      from_date(datetime.datetime): start of the whole span
+      to_date(datetime.datetime): end of the whole span
+      in_sample(datetime.timedelta): length of in-sample span. length of the first one if anchored
+      out_of_sample(datetime.timedelta): length of out-of-sample span
+      anchored(bool): every in-sample span starts at from_date if True, otherwise they roll
+    Returns:
+      windows(list(tuple(datetime, datetime, datetime))): in-sample start, out-of-sample start and
+        out-of-sample end of each window. spans are half-open, the end is not included
+    """
+    if in_sample <= timedelta(0) or out_of_sample <= timedelta(0):
+        raise ValueError('length of in-sample and out-of-sample must be positive')
+
+    windows = []
+    out_of_sample_from = from_date + in_sample
+    while out_of_sample_from + out_of_sample <= to_date:
+        in_sample_from = from_date if anchored else out_of_sample_from - in_sample
+        windows.append((in_sample_from, out_of_sample_from, out_of_sample_from + out_of_sample))
+        out_of_sample_from += out_of_sample
+    return windows
+
+
+def _typed_value(spec, value):
+    # param values of optimization report are text
+    if spec.get('type') == 'bool':
+        return str(value).lower() in ('true', '1')
+    elif spec.get('type') == 'int':
+        return int(float(value))
+    elif spec.get('type') == 'double':
+        return float(value)
+    return value
+
+
+def _annual_rate(profit, from_date, to_date):
+    days = (to_date - from_date).total_seconds() / 86400.0
+    return profit * 365.0 / days
+
+
+class Window(object):
+    """
+    Notes:
+      one in-sample/out-of-sample window of WalkForward
+    Attributes:
+      index(int): index of window in order of date
+      in_sample_from(datetime.datetime): start of in-sample span
+      out_of_sample_from(datetime.datetime): end of in-sample span and start of out-of-sample span
+      out_of_sample_to(datetime.datetime): end of out-of-sample span
+      optimization(OptimizationReport): report of in-sample optimization
+      best(metatrader.report.ShortReport): best pass of in-sample optimization
+      validation(metatrader.report.BacktestReport): report of out-of-sample backtest with param of best
+      error(Exception): exception raised by optimization or validation. None if succeeded
+    """
+
+    def __init__(self, index, in_sample_from, out_of_sample_from, out_of_sample_to):
+        self.index = index
+        self.in_sample_from = in_sample_from
+        self.out_of_sample_from = out_of_sample_from
+        self.out_of_sample_to = out_of_sample_to
+        self.optimization = None
+        self.best = None
+        self.validation = None
+        self.error = None
+
+    @property
+    def succeeded(self):
+        return self.error is None and self.validation is not None
+
+    @property
+    def efficiency(self):
+        """
+        Returns:
+          efficiency(float): walk-forward efficiency, annualized out-of-sample profit divided by
+            annualized in-sample profit of best pass. None if not computable
+        """
+        if not self.succeeded or self.best.profit is None or self.best.profit <= 0:
+            return None
+        in_sample = _annual_rate(self.best.profit, self.in_sample_from, self.out_of_sample_from)
+        out_of_sample = _annual_rate(self.validation.profit, self.out_of_sample_from, self.out_of_sample_to)
+        return out_of_sample / in_sample
+
+
+class WalkForward(object):
+    """
+    Notes:
+      walk-forward analysis of backtest over a pool of terminals.
+      param of backtest with max/interval is optimized in each in-sample span.
+      to_date given to the terminal is the day before the end of span, because ToDate is inclusive.
+    Attributes:
+      backtest(metatrader.backtest.BackTest): template backtest. from_date and to_date are the whole span
+      windows(list(Window)): windows of the last run
+      metric(string or callable): ShortReport attribute name or function of ShortReport to pick best pass
+      maximize(bool): larger metric is better if True
+      farm(metatrader.farm.BacktestFarm): farm running optimizations and validations
+    """
+
+    def __init__(self, backtest, in_sample, out_of_sample, anchored=False, aliases=(DEFAULT_MT5_NAME,),
+                 metric='profit', maximize=True, cache=None, store=None):
+        self.backtest = backtest
+        self.in_sample = in_sample
+        self.out_of_sample = out_of_sample
+        self.anchored = anchored
+        self.metric = metric
+        self.maximize = maximize
+        self.farm = BacktestFarm(aliases, cache=cache, store=store)
+
+        self.windows = [Window(i, *span) for i, span in
+                        enumerate(get_windows(backtest.from_date, backtest.to_date, in_sample, out_of_sample,
+                                              anchored=anchored))]
+        if not self.windows:
+            raise ValueError('span of backtest is shorter than one in-sample and out-of-sample window')
+
+    def _score(self, result):
+        if callable(self.metric):
+            return self.metric(result)
+        return getattr(result, self.metric)
+
+    def _pick_best(self, results):
+        best = None
+        best_score = None
+        for result in results:
+            score = self._score(result)
+            if score is None:
+                continue
+            if not self.maximize:
+                score = -score
+            if best_score is None or score > best_score:
+                best = result
+                best_score = score
+        return best
+
+    def _get_backtest(self, from_date, to_date, param):
+        backtest = copy.copy(self.backtest)
+        backtest.from_date = from_date
+        backtest.to_date = to_date - timedelta(days=1)
+        backtest.param = param
+        return backtest
+
+    def _fix_param(self, best):
+        param = {}
+        for name, spec in self.backtest.param.items():
+            spec = dict(spec)
+            spec.pop('max', None)
+            spec.pop('interval', None)
+            if name in best.param:
+                spec['value'] = _typed_value(spec, best.param[name])
+            param[name] = spec
+        return param
+
+    def run(self):
+        """
+        Notes:
+          optimize every in-sample span, then validate every out-of-sample span, both concurrently.
+        Returns:
+          windows(list(Window)): windows in order of date
+        """
+        for window in self.windows:
+            window.optimization = window.best = window.validation = window.error = None
+
+        jobs = {}
+        for window in self.windows:
+            backtest = self._get_backtest(window.in_sample_from, window.out_of_sample_from, self.backtest.param)
+            jobs[id(backtest)] = (window, backtest)
+
+        for result in self.farm.optimize([backtest for _, backtest in jobs.values()]):
+            window, _ = jobs[id(result.backtest)]
+            if not result.succeeded:
+                window.error = result.error
+                continue
+            window.optimization = result.report
+            window.best = self._pick_best(result.report.results) if result.report is not None else None
+            if window.best is None:
+                window.error = RuntimeError('no pass of in-sample optimization of window %d' % window.index)
+
+        jobs = {}
+        for window in self.windows:
+            if window.best is None:
+                continue
+            backtest = self._get_backtest(window.out_of_sample_from, window.out_of_sample_to,
+                                          self._fix_param(window.best))
+            jobs[id(backtest)] = (window, backtest)
+
+        for result in self.farm.run([backtest for _, backtest in jobs.values()]):
+            window, _ = jobs[id(result.backtest)]
+            if not result.succeeded:
+                window.error = result.error
+                continue
+            window.validation = result.report
+
+        for window in self.windows:
+            if window.error is not None:
+                logging.error('walk-forward window %d failed: %s', window.index, window.error)
+        return self.windows
+
+    @property
+    def efficiency(self):
+        """
+        Returns:
+          efficiency(float): mean walk-forward efficiency of windows. None if no window has it
+        """
+        ratios = [w.efficiency for w in self.windows if w.efficiency is not None]
+        if not ratios:
+            return None
+        return sum(ratios) / len(ratios)
+
+    @property
+    def out_of_sample_profit(self):
+        """
+        Returns:
+          profit(float): total profit of out-of-sample spans, which is the profit of walk-forward trading
+        """
+        return sum(w.validation.profit for w in self.windows if w.succeeded)
+
+    @property
+    def profitable_rate(self):
+        """
+        Returns:
+          rate(float): fraction of succeeded windows whose out-of-sample profit is positive
+        """
+        succeeded = [w for w in self.windows if w.succeeded]
+        if not succeeded:
+            return 0.0
+        return len([w for w in succeeded if w.validation.profit > 0]) / len(succeeded)
@@ -33,7 +33,7 @@ setup(name='metatrader',
       license='MIT',
       packages=['metatrader',
                 ],
-      install_requires=['future', 'beautifulsoup4'],
+      install_requires=['future', 'beautifulsoup4', 'numpy'],
       tests_require=[
         'nose',
       ],
@@ -0,0 +1,291 @@
+'''
+synthetic report generator for unit tests and benchmarks.
+reports have the same layout as the ones written by the terminal.
+every report is also available as an iterator of lines, so reports of
+1,000,000 passes or deals are written to a file without building them in memory.
+
+usage:
+  python -m tests.assets.report_generator backtest 100000 report.htm
+  python -m tests.assets.report_generator optimization 1000000 report.htm
+  python -m tests.assets.report_generator xml_optimization 1000000 report.xml
+'''
+import random
+import sys
+from datetime import datetime, timedelta
+
+
+def write_report(path, lines):
+    '''
+    Args:
+      path(string): abs path of report to write
+      lines(iterable(string)): lines of report, e.g. iter_backtest_report(100000)
+    Returns:
+      size(int): bytes written
+    '''
+    size = 0
+    with open(path, 'w') as fp:
+        for line in lines:
+            fp.write(line)
+            fp.write('\n')
+            size += len(line) + 1
+    return size
+
+
+def iter_optimization_report(passes, ea_name='Moving Average', initial_deposit=10000.0, seed=0):
+    '''
+    Notes:
+      mt4 optimization report. params of each pass are in title attribute of the first cell.
+    Args:
+      passes(int): num of optimization passes
+    '''
+    rnd = random.Random(seed)
+    yield '<html><head><title>Strategy Tester: %s</title></head><body>' % ea_name
+    yield '<div style="font: 20pt Times New Roman"><b>Optimization Report</b></div>'
+    yield '<div style="font: 16pt Times New Roman"><b>%s</b></div><br>' % ea_name
+    yield '<table width=820 cellspacing=1 cellpadding=3 border=0>'
+    yield '<tr align=left><td colspan=2>Symbol</td><td colspan=4>USDJPY (US Dollar vs Japanese Yen)</td></tr>'
+    yield '<tr align=left><td colspan=2>Period</td><td colspan=4>5 Minutes (M5) 2014.09.01 00:00 - 2014.12.31 23:55</td></tr>'
+    yield '<tr align=left><td colspan=2>Model</td><td colspan=4>Every tick</td></tr>'
+    yield '<tr align=left><td colspan=2>Initial deposit</td><td colspan=4>%.2f</td></tr>' % initial_deposit
+    yield '<tr align=left><td colspan=2>Spread</td><td colspan=4>10</td></tr>'
+    yield '</table><br>'
+    yield '<table width=820 cellspacing=1 cellpadding=2 border=0>'
+    yield ('<tr bgcolor="#C0C0C0" align=right><td>Pass</td><td>Profit</td><td>Total trades</td>'
+           '<td>Profit factor</td><td>Expected Payoff</td><td>Drawdown $</td><td>Drawdown %</td>'
+           '<td nowrap>MovingPeriod</td><td nowrap>MovingShift</td><td nowrap>MaximumRisk</td></tr>')
+
+    for i in range(passes):
+        period = 2 + i % 50
+        shift = i // 50 % 20
+        risk = 0.01 * (1 + i // 1000 % 10)
+        trades = rnd.randint(1, 2000)
+        profit = round(rnd.uniform(-5000, 5000), 2)
+        profit_factor = round(rnd.uniform(0, 3), 2)
+        drawdown = round(rnd.uniform(0, 5000), 2)
+        yield ('<tr align=right><td title="MovingPeriod=%d; MovingShift=%d; MaximumRisk=%.2f; ">%d</td>'
+               '<td class=mspt>%.2f</td><td>%d</td><td>%.2f</td><td class=mspt>%.2f</td>'
+               '<td class=mspt>%.2f</td><td>%.2f</td><td>%d</td><td>%d</td><td>%.2f</td></tr>'
+               % (period, shift, risk, i + 1, profit, trades, profit_factor, round(profit / trades, 2),
+                  drawdown, round(drawdown / initial_deposit * 100, 2), period, shift, risk))
+
+    yield '</table></body></html>'
+
+
+def optimization_report(passes, ea_name='Moving Average', initial_deposit=10000.0, seed=0):
+    '''
+    Args:
+      passes(int): num of optimization passes
+    Returns:
+      html(string): optimization report
+    '''
+    return '\n'.join(iter_optimization_report(passes, ea_name=ea_name, initial_deposit=initial_deposit, seed=seed))
+
+
+def iter_xml_optimization_report(passes, initial_deposit=10000, seed=0):
+    '''
+    Notes:
+      mt5 optimization report in SpreadsheetML
+    Args:
+      passes(int): num of optimization passes
+    '''
+    rnd = random.Random(seed)
+    titles = ['Pass', 'Result', 'Profit', 'Expected Payoff', 'Profit Factor', 'Recovery Factor',
+              'Sharpe Ratio', 'Custom', 'Equity DD %', 'Trades', 'MovingPeriod', 'MaximumRisk']
+    yield '<?xml version="1.0"?>'
+    yield '<?mso-application progid="Excel.Sheet"?>'
+    yield ('<Workbook xmlns="urn:schemas-microsoft-com:office:spreadsheet" '
+           'xmlns:ss="urn:schemas-microsoft-com:office:spreadsheet">')
+    yield '<DocumentProperties xmlns="urn:schemas-microsoft-com:office:office">'
+    yield '<Title>Moving Average EURUSD,H1 2018.01.01-2018.12.31</Title>'
+    yield '<Deposit>%d USD</Deposit>' % initial_deposit
+    yield '<Leverage>1:100</Leverage>'
+    yield '</DocumentProperties>'
+    yield '<Worksheet ss:Name="Tester Optimizator Results">'
+    yield '<Table>'
+    yield '<Row>' + ''.join('<Cell><Data ss:Type="String">%s</Data></Cell>' % t for t in titles) + '</Row>'
+
+    def number(value):
+        return '<Cell><Data ss:Type="Number">%s</Data></Cell>' % value
+
+    for i in range(passes):
+        profit = round(rnd.uniform(-5000, 5000), 2)
+        trades = rnd.randint(1, 2000)
+        values = [i, initial_deposit + profit, profit, round(profit / trades, 2), round(rnd.uniform(0, 3), 2),
+                  round(rnd.uniform(-1, 5), 2), round(rnd.uniform(-1, 3), 2), 0, round(rnd.uniform(0, 50), 2),
+                  trades, 2 + i % 50, round(0.01 * (1 + i // 50 % 10), 2)]
+        yield '<Row>' + ''.join(number(v) for v in values) + '</Row>'
+
+    yield '</Table>'
+    yield '</Worksheet>'
+    yield '</Workbook>'
+
+
+def xml_optimization_report(passes, initial_deposit=10000, seed=0):
+    '''
+    Args:
+      passes(int): num of optimization passes
+    Returns:
+      xml(string): optimization report in SpreadsheetML like mt5 writes
+    '''
+    return '\n'.join(iter_xml_optimization_report(passes, initial_deposit=initial_deposit, seed=seed))
+
+
+def iter_deals(deals, initial_deposit=10000.0, seed=0):
+    '''
+    Notes:
+      random walk of trades. the first deal is the deposit, then in/out deals alternate.
+      same seed gives same deals, so deals can be iterated twice without keeping them.
+    Args:
+      deals(int): num of deals including the deposit
+    Yields:
+      deal(tuple): time, deal, type, direction, volume, price, order, commission, swap, profit, balance
+    '''
+    rnd = random.Random(seed)
+    time = datetime(2018, 1, 1)
+    balance = initial_deposit
+    price = 110.0
+    in_type = None
+    volume = 0.0
+    if deals > 0:
+        yield (time, 1, 'balance', '', 0.0, 0.0, 0, 0.0, 0.0, initial_deposit, balance)
+
+    for i in range(1, deals):
+        time += timedelta(minutes=rnd.randint(1, 240))
+        price = round(max(1.0, price + rnd.gauss(0, 0.05)), 3)
+        if i % 2 == 1:
+            volume = rnd.choice((0.1, 0.2, 0.5, 1.0))
+            in_type = rnd.choice(('buy', 'sell'))
+            balance = round(balance - 0.5 * volume, 2)
+            yield (time, i + 1, in_type, 'in', volume, price, i + 1, -0.5 * volume, 0.0, 0.0, balance)
+        else:
+            swap = round(rnd.uniform(-1, 0.2), 2)
+            profit = round(rnd.gauss(2, 30), 2)
+            balance = round(balance + profit + swap - 0.5 * volume, 2)
+            out_type = 'sell' if in_type == 'buy' else 'buy'
+            yield (time, i + 1, out_type, 'out', volume, price, i + 1, -0.5 * volume, swap, profit, balance)
+
+
+def _summary(deals, initial_deposit):
+    # trade results of out deals. longs are closed by sell
+    profits = []
+    longs = shorts = won_longs = won_shorts = 0
+    peak = min_balance = initial_deposit
+    max_drawdown = max_drawdown_rate = 0.0
+    for _, _, deal_type, direction, _, _, _, _, _, profit, balance in deals:
+        if direction == 'out':
+            profits.append(profit)
+            if deal_type == 'sell':
+                longs += 1
+                won_longs += profit > 0
+            else:
+                shorts += 1
+                won_shorts += profit > 0
+        peak = max(peak, balance)
+        min_balance = min(min_balance, balance)
+        if peak - balance > max_drawdown:
+            max_drawdown = peak - balance
+            max_drawdown_rate = max_drawdown * 100.0 / peak
+
+    def runs(won):
+        best_count, best_sum, count, total, counts = 0, 0.0, 0, 0.0, []
+        for p in profits:
+            if (p > 0) == won:
+                count += 1
+                total += p
+                if count > best_count:
+                    best_count, best_sum = count, total
+            else:
+                if count:
+                    counts.append(count)
+                count, total = 0, 0.0
+        if count:
+            counts.append(count)
+        return best_count, best_sum, (sum(counts) // len(counts) if counts else 0)
+
+    def rate(part, whole):
+        return part * 100.0 / whole if whole else 0.0
+
+    wins = [p for p in profits if p > 0]
+    losses = [p for p in profits if p <= 0]
+    total = len(profits)
+    win_count, win_sum, average_wins = runs(True)
+    loss_count, loss_sum, average_losses = runs(False)
+    gross_profit = sum(wins)
+    gross_loss = sum(losses)
+    return [('Initial deposit', '%.2f' % initial_deposit),
+            ('Modelling quality', '99.90%'),
+            ('Total net profit', '%.2f' % (gross_profit + gross_loss)),
+            ('Gross profit', '%.2f' % gross_profit),
+            ('Gross loss', '%.2f' % gross_loss),
+            ('Profit factor', '%.2f' % (gross_profit / -gross_loss) if gross_loss else ''),
+            ('Expected payoff', '%.2f' % ((gross_profit + gross_loss) / total if total else 0.0)),
+            ('Absolute drawdown', '%.2f' % (initial_deposit - min_balance)),
+            ('Maximal drawdown', '%.2f (%.2f%%)' % (max_drawdown, max_drawdown_rate)),
+            ('Relative drawdown', '%.2f%% (%.2f)' % (max_drawdown_rate, max_drawdown)),
+            ('Total trades', '%d' % total),
+            ('Short positions (won %)', '%d (%.2f%%)' % (shorts, rate(won_shorts, shorts))),
+            ('Long positions (won %)', '%d (%.2f%%)' % (longs, rate(won_longs, longs))),
+            ('Profit trades (% of total)', '%d (%.2f%%)' % (len(wins), rate(len(wins), total))),
+            ('Loss trades (% of total)', '%d (%.2f%%)' % (len(losses), rate(len(losses), total))),
+            ('Largest', 'profit trade', '%.2f' % max(wins or [0.0]), 'loss trade', '%.2f' % min(losses or [0.0])),
+            ('Average', 'profit trade', '%.2f' % (gross_profit / len(wins) if wins else 0.0),
+             'loss trade', '%.2f' % (gross_loss / len(losses) if losses else 0.0)),
+            ('Maximum', 'consecutive wins (profit in money)', '%d (%.2f)' % (win_count, win_sum),
+             'consecutive losses (loss in money)', '%d (%.2f)' % (loss_count, loss_sum)),
+            ('Maximal', 'consecutive profit (count of wins)', '%.2f (%d)' % (win_sum, win_count),
+             'consecutive loss (count of losses)', '%.2f (%d)' % (loss_sum, loss_count)),
+            ('Average', 'consecutive wins', '%d' % average_wins, 'consecutive losses', '%d' % average_losses)]
+
+
+def iter_backtest_report(deals, ea_name='Moving Average', initial_deposit=10000.0, seed=0):
+    '''
+    Notes:
+      backtest report. the first table is the summary read by BacktestReport,
+      the second one is the deals table with the columns of mt5.
+    Args:
+      deals(int): num of deals including the deposit
+    '''
+    yield '<html><head><title>Strategy Tester: %s</title></head><body>' % ea_name
+    yield '<div style="font: 20pt Times New Roman"><b>Strategy Tester Report</b></div>'
+    yield '<div style="font: 16pt Times New Roman"><b>%s</b></div><br>' % ea_name
+    yield '<table width=820 cellspacing=1 cellpadding=3 border=0>'
+    yield '<tr align=left><td colspan=2>Symbol</td><td colspan=4>USDJPY (US Dollar vs Japanese Yen)</td></tr>'
+    yield '<tr align=left><td colspan=2>Period</td><td colspan=4>5 Minutes (M5) 2018.01.01 00:00 - 2018.12.31 23:55</td></tr>'
+    for row in _summary(iter_deals(deals, initial_deposit=initial_deposit, seed=seed), initial_deposit):
+        yield '<tr align=right>' + ''.join('<td>%s</td>' % cell for cell in row) + '</tr>'
+    yield '</table><br>'
+
+    yield '<div style="font: 10pt Tahoma"><b>Deals</b></div>'
+    yield '<table width=820 cellspacing=1 cellpadding=3 border=0>'
+    yield ('<tr bgcolor="#E5F0FC" align=right><td>Time</td><td>Deal</td><td>Symbol</td><td>Type</td>'
+           '<td>Direction</td><td>Volume</td><td>Price</td><td>Order</td><td>Commission</td><td>Swap</td>'
+           '<td>Profit</td><td>Balance</td><td>Comment</td></tr>')
+    for time, deal, deal_type, direction, volume, price, order, commission, swap, profit, balance in \
+            iter_deals(deals, initial_deposit=initial_deposit, seed=seed):
+        symbol = '' if deal_type == 'balance' else 'USDJPY'
+        yield ('<tr align=right><td>%s</td><td>%d</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td>'
+               '<td>%s</td><td>%.2f</td><td>%.2f</td><td>%.2f</td><td>%.2f</td><td></td></tr>'
+               % (time.strftime('%Y.%m.%d %H:%M:%S'), deal, symbol, deal_type, direction,
+                  '%.2f' % volume if volume else '', '%.3f' % price if price else '', order or '',
+                  commission, swap, profit, balance))
+    yield '</table></body></html>'
+
+
+def backtest_report(deals, ea_name='Moving Average', initial_deposit=10000.0, seed=0):
+    '''
+    Args:
+      deals(int): num of deals including the deposit
+    Returns:
+      html(string): backtest report
+    '''
+    return '\n'.join(iter_backtest_report(deals, ea_name=ea_name, initial_deposit=initial_deposit, seed=seed))
+
+
+GENERATORS = {'backtest': iter_backtest_report,
+              'optimization': iter_optimization_report,
+              'xml_optimization': iter_xml_optimization_report}
+
+
+if __name__ == '__main__':
+    kind, size, path = sys.argv[1:4]
+    print('%d bytes written' % write_report(path, GENERATORS[kind](int(size))))
@@ -0,0 +1,114 @@
+'''
+load test of BacktestFarm on fake terminals.
+each concurrency level runs a pool of fake terminals cloned from one install,
+every job sleeps for the same modelled duration in the terminal, so the time
+beyond it is the orchestration overhead: writing .ini/.set, process start, report parsing and cleanup.
+
+usage:
+  python -m tests.benchmark.bench_farm_load
+  python -m tests.benchmark.bench_farm_load --concurrency 1 8 64 --jobs-per-terminal 8 --duration 0.2
+  python -m tests.benchmark.bench_farm_load --save /tmp/farm_load.json
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from metatrader import fake_terminal, instrument
+from metatrader.backtest import BackTest
+from metatrader.farm import BacktestFarm
+from metatrader.pool import TerminalPool
+
+
+def create_backtests(count):
+    for i in range(count):
+        param = {'Period': {'type': 'int', 'value': i}}
+        yield BackTest('Moving Average', param, 1234, 'USDJPY', 'M5',
+                       datetime(2018, 1, 1), datetime(2018, 2, 1), 10000, 'USD', 100)
+
+
+def run(concurrency, jobs_per_terminal, duration):
+    '''
+    Returns:
+      result(dict): wall time, throughput and overhead per job of the concurrency
+    '''
+    root = tempfile.mkdtemp()
+    summary = instrument.Summary()
+    instrument.add_sink(summary)
+    try:
+        install = fake_terminal.install(os.path.join(root, 'install'), base_seconds=duration)
+        jobs = concurrency * jobs_per_terminal
+
+        with TerminalPool(install, os.path.join(root, 'pool'), concurrency, prefix='load') as pool:
+            farm = BacktestFarm(pool.aliases)
+            started = time.time()
+            results = list(farm.run(create_backtests(jobs)))
+            wall = time.time() - started
+
+        failed = len([r for r in results if not r.succeeded])
+        phases = summary.summary()
+        # every terminal is busy for jobs_per_terminal * duration at best
+        ideal = jobs_per_terminal * duration
+        return {'concurrency': concurrency,
+                'jobs': jobs,
+                'failed': failed,
+                'duration': duration,
+                'wall_seconds': wall,
+                'jobs_per_hour': farm.jobs_per_hour,
+                'overhead_per_job': (wall - ideal) * concurrency / jobs if jobs else None,
+                'job_seconds_mean': sum(r.elapsed for r in results) / len(results) if results else None,
+                'phases': dict((name, {'mean': s['mean'], 'p95': s['p95']}) for name, s in phases.items())}
+    finally:
+        instrument.remove_sink(summary)
+        shutil.rmtree(root)
+
+
+def format_seconds(value, width=10):
+    # a phase never emitted, e.g. report of failed jobs, has no mean
+    if value is None:
+        return '%*s' % (width, 'n/a')
+    return '%*.4f' % (width, value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='load test of BacktestFarm on fake terminals')
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 8, 64])
+    parser.add_argument('--jobs-per-terminal', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=0.2, help='modelled seconds of each backtest')
+    parser.add_argument('--save', help='store results as json to this path')
+    args = parser.parse_args(argv)
+
+    print('%6s %6s %6s %10s %12s %12s %10s %10s %10s'
+          % ('terms', 'jobs', 'failed', 'wall[s]', 'jobs/hour', 'overhead[s]', 'prepare', 'terminal', 'report'))
+    results = []
+    for concurrency in args.concurrency:
+        result = run(concurrency, args.jobs_per_terminal, args.duration)
+        results.append(result)
+        phases = result['phases']
+        print('%6d %6d %6d %10.2f %12.0f %s %s %s %s'
+              % (concurrency, result['jobs'], result['failed'], result['wall_seconds'], result['jobs_per_hour'],
+                 format_seconds(result['overhead_per_job'], 12),
+                 format_seconds(phases.get('prepare', {}).get('mean')),
+                 format_seconds(phases.get('terminal', {}).get('mean')),
+                 format_seconds(phases.get('report', {}).get('mean'))))
+        if result['failed']:
+            print('%d of %d jobs failed' % (result['failed'], result['jobs']))
+        sys.stdout.flush()
+
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump({'created': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'cpus': os.cpu_count(),
+                       'results': results}, fp, indent=1, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+'''
+benchmark of performance metrics of equity curves.
+plain python loops over each curve are compared with metatrader.metrics on each curve(1D)
+and on all curves at once(2D). every case computes sharpe, sortino, calmar, ulcer index,
+max drawdown, time under water and rolling drawdown.
+
+usage:
+  python -m tests.benchmark.bench_metrics
+  python -m tests.benchmark.bench_metrics --curves 10 1000 --points 1000 --window 100
+'''
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from metatrader import metrics
+
+DEFAULT_CURVES = [10, 1000]
+DEFAULT_POINTS = [100, 1000]
+DEFAULT_WINDOW = 50
+
+
+def python_metrics(equity, years, window):
+    returns = [(b - a) / a for a, b in zip(equity[:-1], equity[1:])]
+    mean = sum(returns) / len(returns)
+    std = math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+    downside = math.sqrt(sum(min(r, 0.0) ** 2 for r in returns) / len(returns))
+
+    peak = equity[0]
+    rates = []
+    under_water = longest = 0
+    for value in equity:
+        peak = max(peak, value)
+        rates.append((peak - value) * 100.0 / peak)
+        under_water = under_water + 1 if value < peak else 0
+        longest = max(longest, under_water)
+    max_drawdown = max(rates)
+    annual = ((equity[-1] / equity[0]) ** (1.0 / years) - 1) * 100.0
+
+    rolling = []
+    for end in range(window - 1, len(equity)):
+        peak = equity[end - window + 1]
+        worst = 0.0
+        for value in equity[end - window + 1:end + 1]:
+            peak = max(peak, value)
+            worst = max(worst, (peak - value) * 100.0 / peak)
+        rolling.append(worst)
+
+    return {'sharpe_ratio': mean / std,
+            'sortino_ratio': mean / downside,
+            'calmar_ratio': annual / max_drawdown if max_drawdown else float('nan'),
+            'max_drawdown': max_drawdown,
+            'ulcer_index': math.sqrt(sum(r ** 2 for r in rates) / len(rates)),
+            'time_under_water': longest,
+            'rolling_drawdown': rolling}
+
+
+def run_python(equity, years, window):
+    return [python_metrics(list(curve), year, window) for curve, year in zip(equity, years)]
+
+
+def run_single(equity, years, window):
+    ret = []
+    for curve, year in zip(equity, years):
+        result = metrics.compute(curve, years=year)
+        result['rolling_drawdown'] = metrics.rolling_drawdown(curve, window)
+        ret.append(result)
+    return ret
+
+
+def run_batched(equity, years, window):
+    result = metrics.compute(equity, years=years)
+    result['rolling_drawdown'] = metrics.rolling_drawdown(equity, window)
+    return result
+
+
+CASES = [('python', run_python), ('numpy 1D', run_single), ('numpy 2D', run_batched)]
+
+
+def measure_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(curves, points, window=DEFAULT_WINDOW, repeat=3, seed=0):
+    '''
+    Returns:
+      results(list(dict)): case, curves, points and seconds of each case
+    '''
+    rnd = np.random.RandomState(seed)
+    results = []
+    for num_curves in curves:
+        for num_points in points:
+            equity = 10000 + np.cumsum(rnd.normal(2, 30, (num_curves, num_points)), axis=1)
+            years = rnd.uniform(0.5, 5, num_curves)
+            baseline = None
+            for name, func in CASES:
+                seconds = measure_time(lambda: func(equity, years, window), repeat)
+                baseline = baseline or seconds
+                results.append({'case': name, 'curves': num_curves, 'points': num_points, 'seconds': seconds})
+                print('%-10s %8d %8d %10.4f %9.1fx' % (name, num_curves, num_points, seconds, baseline / seconds))
+                sys.stdout.flush()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark of performance metrics')
+    parser.add_argument('--curves', type=int, nargs='*', default=DEFAULT_CURVES, help='num of equity curves')
+    parser.add_argument('--points', type=int, nargs='*', default=DEFAULT_POINTS, help='num of points of a curve')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help='window of rolling drawdown')
+    parser.add_argument('--repeat', type=int, default=3, help='time is the best of repeats')
+    args = parser.parse_args(argv)
+
+    print('%-10s %8s %8s %10s %10s' % ('case', 'curves', 'points', 'time[s]', 'speedup'))
+    run(args.curves, args.points, window=args.window, repeat=args.repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
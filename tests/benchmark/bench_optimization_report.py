@@ -0,0 +1,82 @@
+'''
+benchmark of OptimizationReport parsing against the former BeautifulSoup implementation,
+which built a BeautifulSoup tree four times per report.
+
+usage:
+  python -m tests.benchmark.bench_optimization_report [passes ...]
+'''
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from metatrader.backtest import BackTest
+from metatrader.report import OptimizationReport, ShortReport, has_divtag_with_style
+from tests.assets.report_generator import optimization_report
+
+
+def legacy_parse(backtest, report_file):
+    '''
+    the implementation of OptimizationReport before single pass parsing
+    '''
+    from bs4 import BeautifulSoup
+
+    with open(report_file, 'r') as fp:
+        raw_html = fp.read()
+
+    def get_initial_deposit():
+        b_soup = BeautifulSoup(raw_html, "html.parser")
+        for tr in b_soup.find_all('table')[0].find_all('tr'):
+            tds = tr.find_all('td')
+            if tds[0].text == 'Initial deposit':
+                return float(tds[1].text)
+        return 0
+
+    b_soup = BeautifulSoup(raw_html, "html.parser")
+    for title in b_soup.find_all(has_divtag_with_style):
+        if title.text == 'Optimization Report':
+            get_initial_deposit()
+
+    initial_deposit = get_initial_deposit()
+    b_soup = BeautifulSoup(raw_html, "html.parser")
+    results = []
+    for tr in b_soup.find_all('table')[1].find_all('tr')[1:]:
+        tds = tr.find_all('td')
+        param = OptimizationReport._get_param_from_text(tds[0].attrs['title'])
+        results.append(ShortReport(backtest, param=param, profit=float(tds[1].text),
+                                   total_trades=int(tds[2].text), profit_factor=float(tds[3].text),
+                                   expected_payoff=float(tds[4].text), max_drawdown=float(tds[5].text),
+                                   max_drawdown_rate=float(tds[6].text), initial_deposit=initial_deposit))
+    return results
+
+
+def measure(func, *args):
+    started = time.time()
+    ret = func(*args)
+    return ret, time.time() - started
+
+
+def main(sizes):
+    backtest = BackTest('Moving Average', {}, 1234, 'USDJPY', 'M5',
+                        datetime(2014, 9, 1), datetime(2015, 1, 1), 10000, 'USD', 100)
+    work_dir = tempfile.mkdtemp()
+    try:
+        print('%10s %12s %12s %8s' % ('passes', 'legacy[s]', 'current[s]', 'speedup'))
+        for passes in sizes:
+            report_file = os.path.join(work_dir, 'report_%d.htm' % passes)
+            with open(report_file, 'w') as fp:
+                fp.write(optimization_report(passes))
+
+            legacy, legacy_time = measure(legacy_parse, backtest, report_file)
+            current, current_time = measure(lambda: OptimizationReport(backtest, report_file=report_file))
+            assert len(legacy) == len(current.results) == passes
+
+            print('%10d %12.3f %12.3f %7.1fx' % (passes, legacy_time, current_time, legacy_time / current_time))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000])
@@ -0,0 +1,237 @@
+'''
+benchmark of report parsers on synthetic reports.
+parse time(best of repeats) and peak python heap(tracemalloc, a separate run) are measured
+for each parser and report size. results are stored as json and compared with a former run,
+a case slower or larger than tolerance is reported as regression and exit code is 1.
+a case which must be cheaper than another one, e.g. lazy summary fields than lazy deals, is checked in every run.
+timings depend on the host, so a baseline is saved and compared on the same machine and is not committed.
+each case is run once before timing, so lazy imports and first page faults are not measured.
+
+usage:
+  python -m tests.benchmark.bench_parsers
+  python -m tests.benchmark.bench_parsers --passes 10 1000 1000000 --deals 100 1000000
+  python -m tests.benchmark.bench_parsers --save /tmp/parsers_before.json
+  python -m tests.benchmark.bench_parsers --compare /tmp/parsers_before.json
+'''
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from metatrader import mt5
+from metatrader.backtest import BackTest
+from metatrader.report import BacktestReport, OptimizationReport, XmlOptimizationReport
+from tests.assets.report_generator import (write_report, iter_backtest_report, iter_optimization_report,
+                                           iter_xml_optimization_report)
+
+BENCH_ALIAS = 'bench'
+DEFAULT_PASSES = [100, 10000]
+DEFAULT_DEALS = [100, 10000]
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_REPEAT = 5
+
+
+def parse_backtest_report(backtest, report_file):
+    return BacktestReport(backtest, alias=BENCH_ALIAS)
+
+
+def parse_backtest_summary(backtest, report_file):
+    return BacktestReport(backtest, alias=BENCH_ALIAS, lazy_deals=True)
+
+
+def parse_backtest_fields(backtest, report_file):
+    report = BacktestReport(backtest, alias=BENCH_ALIAS, lazy=True)
+    return report.profit, report.max_drawdown_rate
+
+
+def parse_optimization_report(backtest, report_file):
+    return OptimizationReport(backtest, report_file=report_file)
+
+
+def parse_xml_optimization_report(backtest, report_file):
+    return XmlOptimizationReport(backtest, report_file=report_file)
+
+
+def parse_result_table(backtest, report_file):
+    from metatrader.table import OptimizationResultTable
+    return OptimizationResultTable.from_report(backtest, report_file=report_file)
+
+
+# name -> (size kind, report generator, report ext, parser)
+CASES = [('BacktestReport', 'deals', iter_backtest_report, 'htm', parse_backtest_report),
+         ('BacktestReportSummary', 'deals', iter_backtest_report, 'htm', parse_backtest_summary),
+         ('BacktestReportLazy', 'deals', iter_backtest_report, 'htm', parse_backtest_fields),
+         ('OptimizationReport', 'passes', iter_optimization_report, 'htm', parse_optimization_report),
+         ('XmlOptimizationReport', 'passes', iter_xml_optimization_report, 'xml', parse_xml_optimization_report),
+         ('OptimizationResultTable', 'passes', iter_optimization_report, 'htm', parse_result_table)]
+
+
+def measure_time(func, repeat):
+    # warm up
+    func()
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure_memory(func):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def create_data_dir(root):
+    data_dir = os.path.join(root, 'terminal')
+    for sub_dir in ['Profiles', 'Tester', os.path.join('MQL5', 'Experts'), os.path.join('MQL5', 'Libraries')]:
+        os.makedirs(os.path.join(data_dir, sub_dir))
+    return data_dir
+
+
+def run(passes, deals, repeat=DEFAULT_REPEAT, names=None):
+    '''
+    Returns:
+      results(list(dict)): case, size, report_bytes, seconds, bytes_per_second and peak_memory of each case
+    '''
+    root = tempfile.mkdtemp()
+    results = []
+    try:
+        data_dir = create_data_dir(root)
+        mt5._mt5s.pop(BENCH_ALIAS, None)
+        mt5.initialize(data_dir, portable_mode=True, alias=BENCH_ALIAS)
+        backtest = BackTest('Moving Average', {}, 1234, 'USDJPY', 'M5',
+                            datetime(2018, 1, 1), datetime(2019, 1, 1), 10000, 'USD', 100)
+        sizes = {'passes': passes, 'deals': deals}
+
+        for name, kind, generator, ext, parser in CASES:
+            if names and name not in names:
+                continue
+            for size in sizes[kind]:
+                backtest.run_name = '%s_%d' % (name, size)
+                report_file = os.path.join(data_dir, '%s.%s' % (backtest.run_name, ext))
+                report_bytes = write_report(report_file, generator(size))
+
+                seconds = measure_time(lambda: parser(backtest, report_file), repeat)
+                peak_memory = measure_memory(lambda: parser(backtest, report_file))
+                os.remove(report_file)
+
+                result = {'case': name,
+                          'size': size,
+                          'unit': kind,
+                          'report_bytes': report_bytes,
+                          'seconds': seconds,
+                          'bytes_per_second': report_bytes / seconds if seconds > 0 else None,
+                          'peak_memory': peak_memory}
+                results.append(result)
+                print('%-24s %8d %-6s %12d %10.4f %10.1f %12d'
+                      % (name, size, kind, report_bytes, seconds, report_bytes / seconds / 1e6, peak_memory))
+                sys.stdout.flush()
+    finally:
+        mt5._mt5s.pop(BENCH_ALIAS, None)
+        shutil.rmtree(root)
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, repeat=None):
+    '''
+    Returns:
+      regressions(list(string)): cases slower or larger than baseline by more than tolerance
+    '''
+    former = dict(((r['case'], r['size']), r) for r in baseline['results'])
+    regressions = []
+    if baseline.get('repeat') is not None and baseline['repeat'] != repeat:
+        print('baseline is the best of %d repeats, this run is of %d' % (baseline['repeat'], repeat))
+    print('%-24s %8s %10s %10s' % ('case', 'size', 'time', 'memory'))
+    for result in results:
+        base = former.get((result['case'], result['size']))
+        if base is None:
+            print('%-24s %8d %10s %10s' % (result['case'], result['size'], 'no base', 'no base'))
+            continue
+        time_ratio = result['seconds'] / base['seconds']
+        memory_ratio = result['peak_memory'] / float(base['peak_memory'] or 1)
+        print('%-24s %8d %9.2fx %9.2fx' % (result['case'], result['size'], time_ratio, memory_ratio))
+        if time_ratio > 1 + tolerance:
+            regressions.append('%s[%d] is %.2fx slower' % (result['case'], result['size'], time_ratio))
+        if memory_ratio > 1 + tolerance:
+            regressions.append('%s[%d] uses %.2fx memory' % (result['case'], result['size'], memory_ratio))
+    return regressions
+
+
+# (case, cheaper case) pairs. the cheaper case must not be slower, e.g. reading two summary values
+# by lazy must not cost more than decoding the whole summary by lazy_deals
+CHEAPER_CASES = [('BacktestReportSummary', 'BacktestReportLazy')]
+
+
+def check_cheaper(results, tolerance=DEFAULT_TOLERANCE):
+    '''
+    Returns:
+      regressions(list(string)): cheaper cases slower than their counterpart by more than tolerance
+    '''
+    seconds = dict(((r['case'], r['size']), r['seconds']) for r in results)
+    regressions = []
+    for case, cheaper in CHEAPER_CASES:
+        for (name, size), base in sorted(seconds.items()):
+            if name != case or (cheaper, size) not in seconds:
+                continue
+            ratio = seconds[(cheaper, size)] / base
+            print('%-24s %8d %9.2fx of %s' % (cheaper, size, ratio, case))
+            if ratio > 1 + tolerance:
+                regressions.append('%s[%d] is %.2fx of %s' % (cheaper, size, ratio, case))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark of report parsers')
+    parser.add_argument('--passes', type=int, nargs='*', default=DEFAULT_PASSES,
+                        help='num of passes of optimization reports')
+    parser.add_argument('--deals', type=int, nargs='*', default=DEFAULT_DEALS,
+                        help='num of deals of backtest reports')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='parse time is the best of repeats')
+    parser.add_argument('--case', action='append', help='run only this case. may be repeated')
+    parser.add_argument('--save', help='store results as json to this path')
+    parser.add_argument('--compare', help='compare with results stored by --save on the same host')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown or memory growth against --compare, 0.25 is 25%%')
+    args = parser.parse_args(argv)
+
+    print('%-24s %8s %-6s %12s %10s %10s %12s'
+          % ('case', 'size', 'unit', 'bytes', 'time[s]', 'MB/s', 'peak mem[B]'))
+    results = run(args.passes, args.deals, repeat=args.repeat, names=args.case)
+
+    if args.save:
+        save_dir = os.path.dirname(os.path.abspath(args.save))
+        if not os.path.isdir(save_dir):
+            os.makedirs(save_dir)
+        with open(args.save, 'w') as fp:
+            json.dump({'created': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'repeat': args.repeat,
+                       'results': results}, fp, indent=1, sort_keys=True)
+
+    regressions = check_cheaper(results, tolerance=args.tolerance)
+    if args.compare:
+        with open(args.compare) as fp:
+            regressions += compare(results, json.load(fp), tolerance=args.tolerance, repeat=args.repeat)
+    for regression in regressions:
+        print('REGRESSION: %s' % regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+'''
+unit test of metatrader.cache
+'''
+import os
+import shutil
+import tempfile
+
+from metatrader import mt5
+from metatrader.cache import ReportCache, make_key
+from tests.unit.test_farm import create_terminal, create_backtest
+
+
+def write_ea(data_dir, content):
+    with open(os.path.join(data_dir, 'MQL5', 'Experts', 'Moving Average.ex5'), 'wb') as fp:
+        fp.write(content)
+
+
+def test_backtest_is_answered_from_cache():
+    root = tempfile.mkdtemp()
+    try:
+        data_dir = create_terminal(root, 'cache-1')
+        write_ea(data_dir, b'compiled')
+        mt5.initialize(data_dir, portable_mode=True, alias='cache-1')
+        cache = ReportCache(os.path.join(root, 'cache'))
+
+        first = create_backtest(5).run(alias='cache-1', cache=cache)
+        os.remove(os.path.join(data_dir, mt5.MT5_EXE))
+        # terminal is gone, so only cache can answer
+        second = create_backtest(5).run(alias='cache-1', cache=cache)
+
+        assert second.profit == first.profit == 5
+        assert cache.stats['hits'] == 1
+        assert cache.stats['misses'] == 1
+        assert cache.stats['entries'] == 1
+    finally:
+        mt5._mt5s.pop('cache-1', None)
+        shutil.rmtree(root)
+
+
+def test_cache_key_follows_compiled_ea():
+    root = tempfile.mkdtemp()
+    try:
+        data_dir = create_terminal(root, 'cache-2')
+        mt5.initialize(data_dir, portable_mode=True, alias='cache-2')
+        cache = ReportCache(os.path.join(root, 'cache'))
+        backtest = create_backtest(5)
+
+        # without compiled ea the backtest is run but not cached
+        assert backtest._get_cache_key(alias='cache-2') is None
+        assert backtest.run(alias='cache-2', cache=cache).profit == 5
+        assert cache.stats['entries'] == 0
+
+        write_ea(data_dir, b'compiled')
+        first = backtest._get_cache_key(alias='cache-2')
+        write_ea(data_dir, b'recompiled')
+        assert backtest._get_cache_key(alias='cache-2') not in (None, first)
+    finally:
+        mt5._mt5s.pop('cache-2', None)
+        shutil.rmtree(root)
+
+
+def test_least_recently_used_is_evicted():
+    root = tempfile.mkdtemp()
+    try:
+        cache = ReportCache(root, max_bytes=3500)
+        keys = [make_key('report', str(i)) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.put(key, 'x' * 1000)
+            os.utime(os.path.join(root, key + '.pickle'), (i, i))
+        cache.get(keys[0])
+        cache.put(make_key('report', '3'), 'x' * 1000)
+
+        assert cache.evictions == 1
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[1]) is None
+    finally:
+        shutil.rmtree(root)
+
+
+class CountingCache(ReportCache):
+
+    scans = 0
+
+    def evict(self):
+        self.scans += 1
+        super(CountingCache, self).evict()
+
+
+def test_cache_dir_is_scanned_only_to_evict():
+    root = tempfile.mkdtemp()
+    try:
+        cache = CountingCache(root, max_bytes=5500)
+        for i in range(5):
+            cache.put(make_key('report', str(i)), 'x' * 1000)
+        # the first put scans, the others add to the running total
+        assert cache.scans == 1
+        cache.put(make_key('report', '0'), 'x' * 1000)
+        assert cache.scans == 1
+        cache.put(make_key('report', '5'), 'x' * 1000)
+        assert cache.scans == 2
+        assert cache.evictions == 1
+
+        # failure to store is not raised
+        shutil.rmtree(root)
+        cache.put(make_key('report', '6'), 'x' * 1000)
+        assert cache.get(make_key('report', '6')) is None
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
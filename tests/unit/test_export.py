@@ -0,0 +1,121 @@
+'''
+unit test of metatrader.export
+'''
+import csv
+import os
+import shutil
+import tempfile
+from unittest import SkipTest
+
+from metatrader import mt5
+from metatrader.export import export, export_optimization, PARAM_PREFIX
+from metatrader.report import OptimizationReport
+from tests.assets.report_generator import iter_optimization_report, write_report
+from tests.unit.test_farm import create_terminal
+from tests.unit.test_farm import create_backtest as create_single_backtest
+from tests.unit.test_report import create_backtest
+
+
+def test_export_csv():
+    work_dir = tempfile.mkdtemp()
+    try:
+        report_file = os.path.join(work_dir, 'Moving Average.htm')
+        write_report(report_file, iter_optimization_report(120))
+        backtest = create_backtest()
+        results = OptimizationReport(backtest, report_file=report_file).results
+
+        path = os.path.join(work_dir, 'passes.csv')
+        assert export_optimization(backtest, path, report_file=report_file, batch_size=50) == 120
+
+        with open(path) as fp:
+            rows = list(csv.DictReader(fp))
+        assert len(rows) == 120
+        assert rows[0]['ea_name'] == 'Moving Average'
+        assert rows[0]['from_date'] == '2014-09-01T00:00:00'
+        assert rows[0]['pass_number'] == ''
+        for row, result in zip(rows, results):
+            assert float(row['profit']) == result.profit
+            assert int(row['total_trades']) == result.total_trades
+            for name, value in result.param.items():
+                assert row[PARAM_PREFIX + name] == value
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_export_arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SkipTest('pyarrow is not installed')
+    from metatrader.export import read_arrow
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        report_file = os.path.join(work_dir, 'Moving Average.htm')
+        write_report(report_file, iter_optimization_report(120))
+        backtest = create_backtest()
+        results = OptimizationReport(backtest, report_file=report_file).results
+
+        arrow_file = os.path.join(work_dir, 'passes.arrow')
+        assert export(results, arrow_file, batch_size=50) == 120
+        table = read_arrow(arrow_file)
+        assert table.num_rows == 120
+        assert table.column('profit').to_pylist() == [r.profit for r in results]
+
+        parquet_file = os.path.join(work_dir, 'passes.parquet')
+        assert export(iter(results), parquet_file, batch_size=50) == 120
+        assert pyarrow.parquet.read_table(parquet_file).num_rows == 120
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_export_backtest_report():
+    root = tempfile.mkdtemp()
+    try:
+        mt5.initialize(create_terminal(root, 'export'), portable_mode=True, alias='export')
+        reports = [create_single_backtest(period).run(alias='export') for period in (5, 7)]
+
+        path = os.path.join(root, 'runs.csv')
+        assert export(reports, path) == 2
+        with open(path) as fp:
+            rows = list(csv.DictReader(fp))
+        # scalar value of ea param spec
+        assert [row[PARAM_PREFIX + 'Period'] for row in rows] == ['5', '7']
+        assert [float(row['profit']) for row in rows] == [5.0, 7.0]
+    finally:
+        mt5._mt5s.pop('export', None)
+        shutil.rmtree(root)
+
+
+class Result(object):
+
+    def __init__(self, profit, pass_number, param):
+        self.profit = profit
+        self.pass_number = pass_number
+        self.param = param
+
+
+def test_export_arrow_null_first_batch():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        raise SkipTest('pyarrow is not installed')
+    from metatrader.export import read_arrow
+
+    # whole first batch is None, e.g. html passes have no pass_number while xml passes have
+    results = [Result(None, None, {}), Result(None, None, {'Extra': None}), Result(1.5, 3, {'Extra': 7})]
+    work_dir = tempfile.mkdtemp()
+    try:
+        arrow_file = os.path.join(work_dir, 'passes.arrow')
+        assert export(results, arrow_file, batch_size=2) == 3
+        table = read_arrow(arrow_file)
+        assert table.column('profit').to_pylist() == [None, None, 1.5]
+        assert table.column('pass_number').to_pylist() == [None, None, 3]
+        assert table.column(PARAM_PREFIX + 'Extra').to_pylist() == [None, None, '7']
+
+        parquet_file = os.path.join(work_dir, 'passes.parquet')
+        assert export(results, parquet_file, batch_size=2) == 3
+        assert pyarrow.parquet.read_table(parquet_file).column('profit').to_pylist() == [None, None, 1.5]
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,80 @@
+'''
+unit test of metatrader.fake_terminal
+'''
+import asyncio
+import os
+import shutil
+import tempfile
+
+from metatrader import fake_terminal, mt5
+from metatrader.exception import TerminalTimeout
+from metatrader.search import count_passes
+from tests.unit.test_farm import create_backtest
+
+
+def initialize(root, alias, **config):
+    data_dir = fake_terminal.install(os.path.join(root, alias), **config)
+    mt5._mt5s.pop(alias, None)
+    mt5.initialize(data_dir, portable_mode=True, alias=alias)
+    return data_dir
+
+
+def test_deterministic_reports():
+    root = tempfile.mkdtemp()
+    try:
+        initialize(root, 'fake')
+        first = create_backtest(12).run(alias='fake')
+        second = create_backtest(12).run(alias='fake')
+        other = create_backtest(13).run(alias='fake')
+        assert first.profit == second.profit
+        assert first.total_trades == second.total_trades > 0
+        assert first.initial_deposit == 10000
+        assert other.profit != first.profit
+
+        backtest = create_backtest(2)
+        backtest.param['Period'].update({'max': 20, 'interval': 2})
+        report = backtest.optimize(alias='fake')
+        assert len(report.results) == count_passes(backtest.param)
+        assert [r.param['Period'] for r in report.results][:3] == ['2', '4', '6']
+        # a pass of optimization equals the single backtest with its param
+        twelve = [r for r in report.results if r.param['Period'] == '12'][0]
+        assert twelve.profit == first.profit
+    finally:
+        mt5._mt5s.pop('fake', None)
+        shutil.rmtree(root)
+
+
+def test_failure_and_hang():
+    root = tempfile.mkdtemp()
+    try:
+        initialize(root, 'fake-fail', fail_rate=1.0, exit_code=5)
+        try:
+            create_backtest(1).run(alias='fake-fail')
+            assert False, 'failed terminal must raise'
+        except RuntimeError as e:
+            assert '5 error code' in str(e)
+
+        data_dir = initialize(root, 'fake-hang', hang_rate=1.0)
+        backtest = create_backtest(1)
+        backtest._new_run()
+        backtest._prepare(alias='fake-hang')
+        conf = backtest._get_ini_abs_path(alias='fake-hang', portable_mode=True)
+        terminal = mt5.get_mt5('fake-hang', portable_mode=True)
+        try:
+            asyncio.run(terminal.run_async(conf=conf, portable_mode=True, timeout=1))
+            assert False, 'hanging terminal must time out'
+        except TerminalTimeout:
+            pass
+        assert not os.path.exists(os.path.join(data_dir, backtest.run_name + '.htm'))
+    finally:
+        mt5._mt5s.pop('fake-fail', None)
+        mt5._mt5s.pop('fake-hang', None)
+        shutil.rmtree(root)
+
+
+def test_modelled_duration():
+    config = dict(fake_terminal.DEFAULT_CONFIG, base_seconds=1.0, seconds_per_day=0.5)
+    ini = {'FromDate': '2018.01.01', 'ToDate': '2018.01.10', 'Model': '0'}
+    assert fake_terminal.get_duration(config, ini, '') == 6.0
+    ini['Model'] = '2'
+    assert abs(fake_terminal.get_duration(config, ini, '') - 1.25) < 1e-9
@@ -0,0 +1,84 @@
+'''
+unit test of metatrader.farm with a stand-in terminal64.exe
+'''
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from metatrader import fake_terminal, mt5
+from metatrader.backtest import BackTest
+from metatrader.farm import BacktestFarm
+
+
+def create_terminal(root, name):
+    # profit of a report is the Period parameter of the .set file
+    return fake_terminal.install(os.path.join(root, name), profit_param='Period')
+
+
+def create_backtest(period):
+    param = {'Period': {'type': 'int', 'value': period}}
+    return BackTest('Moving Average', param, 1234, 'USDJPY', 'M5',
+                    datetime(2018, 1, 1), datetime(2018, 2, 1), 10000, 'USD', 100)
+
+
+def test_farm_runs_jobs_on_all_aliases():
+    root = tempfile.mkdtemp()
+    try:
+        aliases = ['farm-1', 'farm-2', 'farm-3']
+        for alias in aliases:
+            mt5.initialize(create_terminal(root, alias), portable_mode=True, alias=alias)
+
+        farm = BacktestFarm(aliases)
+        results = list(farm.run([create_backtest(period) for period in range(10)]))
+
+        assert len(results) == 10
+        assert farm.completed == 10
+        assert farm.failed == 0
+        assert farm.jobs_per_hour > 0
+        for result in results:
+            assert result.succeeded
+            assert result.alias in aliases
+            assert result.report.profit == result.backtest.param['Period']['value']
+            assert result.report.initial_deposit == 10000
+    finally:
+        for alias in aliases:
+            mt5._mt5s.pop(alias, None)
+        shutil.rmtree(root)
+
+
+def test_farm_reports_failed_jobs():
+    farm = BacktestFarm(['farm-not-initialized'])
+    results = list(farm.run([create_backtest(1)]))
+
+    assert farm.failed == 1
+    assert not results[0].succeeded
+    assert isinstance(results[0].error, RuntimeError)
+
+
+def test_concurrent_runs_share_data_dir():
+    root = tempfile.mkdtemp()
+    try:
+        data_dir = create_terminal(root, 'shared')
+        mt5.initialize(data_dir, portable_mode=True, alias='shared')
+        work_dir = os.path.join(root, 'tmpfs')
+        os.makedirs(work_dir)
+
+        backtests = [create_backtest(period) for period in range(8)]
+        for backtest in backtests:
+            backtest.work_dir = work_dir
+
+        # four workers on one terminal data dir
+        farm = BacktestFarm(['shared'] * 4)
+        for result in farm.run(backtests):
+            assert result.report.profit == result.backtest.param['Period']['value']
+
+        assert len(set(backtest.run_id for backtest in backtests)) == 8
+        # every .ini, .set and report is cleaned up
+        assert os.listdir(work_dir) == []
+        assert os.listdir(os.path.join(data_dir, 'Tester')) == []
+        assert os.listdir(os.path.join(data_dir, 'MQL5', 'Profiles', 'Tester')) == []
+        assert [name for name in os.listdir(data_dir) if name.endswith('.htm')] == []
+    finally:
+        mt5._mt5s.pop('shared', None)
+        shutil.rmtree(root)
@@ -0,0 +1,101 @@
+'''
+unit test of metatrader.fxt with synthetic .hst files
+'''
+import os
+import shutil
+import stat
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from metatrader.fxt import (HEADER_SIZE, TICK_SIZE, MODEL_CONTROL_POINTS, MODEL_EVERY_TICK, MODEL_OPEN_PRICES,
+                            build_fxt, install_matrix, read_fxt)
+from metatrader.history import HistoryFile, get_history_path
+from tests.unit.test_history import write_history
+
+
+def test_build_fxt():
+    work_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work_dir, 'USDJPY5.hst')
+        records = write_history(path, 400, datetime(2014, 9, 1), 12 * 24 * 10)
+        history = HistoryFile(path)
+        cache_dir = os.path.join(work_dir, 'cache')
+        from_date, to_date = datetime(2014, 9, 2), datetime(2014, 9, 4)
+        bars = records[12 * 24:12 * 24 * 3]
+
+        fxt, generated = build_fxt(history, MODEL_OPEN_PRICES, from_date, to_date, cache_dir, spread=20)
+        assert generated
+        header, ticks = read_fxt(fxt)
+        assert os.path.getsize(fxt) == HEADER_SIZE + TICK_SIZE * len(bars)
+        assert (header['version'], header['symbol'], header['period'], header['model']) == (405, b'USDJPY', 5, 2)
+        assert (header['bars'], header['total_ticks'], header['spread'], header['digits']) == (len(bars), len(bars), 20, 3)
+        assert header['fromdate'] == bars['time'][0]
+        assert np.array_equal(ticks['close'], bars['open'])
+        assert np.array_equal(ticks['otm'], bars['time'])
+
+        fxt, _ = build_fxt(history, MODEL_CONTROL_POINTS, from_date, to_date, cache_dir)
+        _, ticks = read_fxt(fxt)
+        assert len(ticks) == 4 * len(bars)
+        # last tick of each bar is the whole bar
+        last = ticks[3::4]
+        for name in ('open', 'high', 'low', 'close'):
+            assert np.allclose(last[name], bars[name])
+        bullish = bars['close'] >= bars['open']
+        assert np.allclose(ticks['close'][1::4], np.where(bullish, bars['low'], bars['high']))
+        assert (ticks['ctm'][1::4] - ticks['otm'][1::4] == 75).all()
+
+        fxt, _ = build_fxt(history, MODEL_EVERY_TICK, from_date, to_date, cache_dir, max_ticks=8)
+        _, ticks = read_fxt(fxt)
+        assert len(ticks) == np.clip(bars['volume'].astype(int), 4, 8).sum()
+        assert (ticks['high'] >= ticks['close']).all() and (ticks['low'] <= ticks['close']).all()
+        assert (np.diff(ticks['ctm']) >= 0).all()
+
+        again, generated = build_fxt(history, MODEL_EVERY_TICK, from_date, to_date, cache_dir, max_ticks=8)
+        assert again == fxt and not generated
+        history.close()
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_install_matrix():
+    work_dir = tempfile.mkdtemp()
+    try:
+        for symbol in ('USDJPY', 'EURUSD'):
+            for period in ('M5', 'H1'):
+                minutes = {'M5': 5, 'H1': 60}[period]
+                write_history(get_history_path(work_dir, 'Demo', symbol, period), 401, datetime(2014, 9, 1),
+                              24 * 60 // minutes * 5, period=minutes, symbol=symbol)
+        cache_dir = os.path.join(work_dir, 'cache')
+
+        models = [MODEL_EVERY_TICK, MODEL_OPEN_PRICES]
+        args = (work_dir, 'Demo', ['USDJPY', 'EURUSD', 'GBPUSD'], ['M5', 'H1'], models,
+                datetime(2014, 9, 1), datetime(2014, 9, 6), cache_dir)
+        installed = install_matrix(*args)
+        names = sorted(os.path.basename(p) for p in installed)
+        assert names == ['EURUSD5_0.fxt', 'EURUSD5_2.fxt', 'EURUSD60_0.fxt', 'EURUSD60_2.fxt',
+                         'USDJPY5_0.fxt', 'USDJPY5_2.fxt', 'USDJPY60_0.fxt', 'USDJPY60_2.fxt']
+        for path in installed:
+            assert os.path.dirname(path) == os.path.join(work_dir, 'tester', 'history')
+            assert not os.stat(path).st_mode & stat.S_IWUSR
+        cached = sorted(os.listdir(cache_dir))
+        assert len(cached) == 8
+
+        # second install reuses cache and installed files
+        assert sorted(install_matrix(*args)) == sorted(installed)
+        assert sorted(os.listdir(cache_dir)) == cached
+
+        # symbol missing in spec of each symbol gets the default spec
+        installed = install_matrix(*args, spec={'USDJPY': {'leverage': 500}})
+        assert len(installed) == 8
+        assert read_fxt(os.path.join(work_dir, 'tester', 'history', 'USDJPY5_2.fxt'))[0]['leverage'] == 500
+        assert read_fxt(os.path.join(work_dir, 'tester', 'history', 'EURUSD5_2.fxt'))[0]['leverage'] == 100
+        # replaced links leave cached files read only
+        for name in os.listdir(cache_dir):
+            assert stat.S_IMODE(os.stat(os.path.join(cache_dir, name)).st_mode) == 0o444
+    finally:
+        for root, dirs, files in os.walk(work_dir):
+            for name in files:
+                os.chmod(os.path.join(root, name), stat.S_IRUSR | stat.S_IWUSR)
+        shutil.rmtree(work_dir)
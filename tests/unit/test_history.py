@@ -0,0 +1,107 @@
+'''
+unit test of metatrader.history with synthetic .hst files
+'''
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from metatrader.history import (BAR_DTYPES, HEADER_DTYPE, HistoryFile, check_coverage, get_history_path,
+                                iter_histories)
+from tests.unit.test_report import create_backtest
+
+
+def write_history(path, version, start, bars, period=5, skip=None, symbol='USDJPY'):
+    '''
+    Notes:
+      bars every period minutes from start. bars in skip(from, to) are left out as a gap
+    '''
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['version'] = version
+    header['symbol'] = symbol.encode('ascii')
+    header['period'] = period
+    header['digits'] = 3
+
+    times = _to_seconds(start) + np.arange(bars, dtype=np.int64) * period * 60
+    if skip is not None:
+        times = times[(times < _to_seconds(skip[0])) | (times >= _to_seconds(skip[1]))]
+    records = np.zeros(len(times), dtype=BAR_DTYPES[version])
+    records['time'] = times.astype(records['time'].dtype) if version == 400 else times.astype('<M8[s]')
+    records['open'] = 110.0 + np.arange(len(times)) * 0.001
+    records['close'] = records['open'] + np.where(np.arange(len(times)) % 3, 0.005, -0.005)
+    records['high'] = np.maximum(records['open'], records['close']) + 0.002
+    records['low'] = np.minimum(records['open'], records['close']) - 0.002
+    records['volume' if version == 400 else 'tick_volume'] = 2 + np.arange(len(times)) % 10
+
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as fp:
+        fp.write(header.tobytes())
+        fp.write(records.tobytes())
+    return records
+
+
+def _to_seconds(date):
+    return int((date - datetime(1970, 1, 1)).total_seconds())
+
+
+def test_history_file():
+    work_dir = tempfile.mkdtemp()
+    try:
+        for version in (400, 401):
+            path = os.path.join(work_dir, 'USDJPY5_%d.hst' % version)
+            records = write_history(path, version, datetime(2014, 9, 1), 12 * 24 * 30)
+            history = HistoryFile(path)
+            assert (history.version, history.symbol, history.period, history.digits) == (version, 'USDJPY', 5, 3)
+            assert len(history) == len(records)
+            assert np.array_equal(history.bars['close'], records['close'])
+            assert history.first_date == datetime(2014, 9, 1)
+            assert history.times[1] == np.datetime64('2014-09-01T00:05:00')
+
+            bars = history.slice(datetime(2014, 9, 2), datetime(2014, 9, 3))
+            assert len(bars) == 12 * 24
+            assert np.shares_memory(bars, history.bars)
+            assert len(history.slice(datetime(2014, 9, 2, 0, 1), datetime(2014, 9, 2, 0, 6))) == 1
+            assert len(history.slice(datetime(2020, 1, 1))) == 0
+
+            assert history.covers(datetime(2014, 9, 1), datetime(2014, 10, 1))
+            assert not history.covers(datetime(2014, 8, 1), datetime(2014, 10, 1))
+            assert not history.covers(datetime(2014, 9, 1), datetime(2014, 12, 1))
+            history.close()
+
+        path = os.path.join(work_dir, 'gap.hst')
+        write_history(path, 401, datetime(2014, 9, 1), 12 * 24 * 30, skip=(datetime(2014, 9, 10), datetime(2014, 9, 15)))
+        history = HistoryFile(path)
+        assert history.find_gaps() == [(datetime(2014, 9, 9, 23, 55), datetime(2014, 9, 15))]
+        assert history.covers(datetime(2014, 9, 1), datetime(2014, 10, 1))
+        assert not history.covers(datetime(2014, 9, 1), datetime(2014, 10, 1), max_gap=timedelta(days=3))
+        history.close()
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_check_coverage():
+    work_dir = tempfile.mkdtemp()
+    try:
+        write_history(get_history_path(work_dir, 'Demo', 'USDJPY', 'M5'), 400, datetime(2014, 9, 1), 12 * 24 * 122)
+        write_history(get_history_path(work_dir, 'Demo', 'EURUSD', 'M5'), 401, datetime(2014, 10, 1), 12 * 24 * 92)
+        with open(get_history_path(work_dir, 'Demo', 'GBPUSD', 'M5'), 'wb') as fp:
+            fp.write(b'broken')
+
+        backtests = []
+        for symbol in ('USDJPY', 'EURUSD', 'GBPUSD', 'AUDUSD'):
+            backtest = create_backtest()
+            backtest.symbol = symbol
+            backtest.to_date = datetime(2014, 12, 31)
+            backtests.append(backtest)
+
+        uncovered = check_coverage(backtests, work_dir, 'Demo', workers=3)
+        assert sorted(b.symbol for b in uncovered) == ['AUDUSD', 'EURUSD', 'GBPUSD']
+
+        paths = [get_history_path(work_dir, 'Demo', symbol, 5) for symbol in ('USDJPY', 'EURUSD')]
+        results = dict(iter_histories(paths, lambda history: len(history), workers=2))
+        assert results == {paths[0]: 12 * 24 * 122, paths[1]: 12 * 24 * 92}
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,87 @@
+'''
+unit test of metatrader.instrument
+'''
+import json
+import os
+import shutil
+import tempfile
+
+from metatrader import instrument, mt5
+from tests.unit.test_farm import create_terminal, create_backtest
+
+
+def test_phase_events():
+    root = tempfile.mkdtemp()
+    summary = instrument.Summary()
+    prometheus = instrument.PrometheusSink(os.path.join(root, 'metatrader.prom'))
+    json_lines = instrument.JsonLinesSink(os.path.join(root, 'events.jsonl'))
+    for sink in (summary, prometheus, json_lines):
+        instrument.add_sink(sink)
+    try:
+        mt5.initialize(create_terminal(root, 'instrument'), portable_mode=True, alias='instrument')
+        for period in range(3):
+            create_backtest(period).run(alias='instrument')
+
+        with open(os.path.join(root, 'events.jsonl')) as fp:
+            events = [json.loads(line) for line in fp]
+        assert [e['phase'] for e in events[:3]] == ['prepare', 'terminal', 'report']
+        assert len(events) == 9
+        for event in events:
+            assert event['alias'] == 'instrument'
+            assert event['ea_name'] == 'Moving Average'
+            assert event['elapsed'] >= 0
+            assert event['error'] is None
+        assert len(set(e['run_id'] for e in events)) == 3
+
+        terminal = events[1]
+        assert terminal['returncode'] == 0
+        if hasattr(os, 'wait4'):
+            assert terminal['peak_rss'] > 0
+            assert terminal['cpu_time'] > 0
+        report = events[2]
+        assert report['report_bytes'] > 0
+        assert report['parse_rate'] > 0
+
+        stats = summary.summary()
+        assert stats['terminal']['count'] == 3
+        assert stats['report']['report_bytes'] == sum(e['report_bytes'] for e in events if e['phase'] == 'report')
+        assert stats['prepare']['peak_rss'] is None
+        assert 'terminal' in summary.format()
+
+        # metrics file is written by the first event, then once per interval and on close
+        prometheus.close()
+        with open(os.path.join(root, 'metatrader.prom')) as fp:
+            metrics = fp.read()
+        assert 'metatrader_phase_seconds_count{phase="report"} 3.0' in metrics
+        assert '# TYPE metatrader_phase_seconds_sum counter' in metrics
+    finally:
+        instrument.clear_sinks()
+        mt5._mt5s.pop('instrument', None)
+        shutil.rmtree(root)
+
+
+def test_phase_records_error():
+    summary = instrument.Summary()
+    instrument.add_sink(summary)
+    try:
+        try:
+            with instrument.phase('report'):
+                raise ValueError('broken')
+        except ValueError:
+            pass
+        assert summary.summary()['report']['errors'] == 1
+    finally:
+        instrument.clear_sinks()
+
+
+def test_summary_memory_is_bounded():
+    summary = instrument.Summary(reservoir_size=100)
+    for i in range(1000):
+        summary.write({'phase': 'terminal', 'elapsed': i / 1000.0})
+    stats = summary.summary()['terminal']
+    assert len(summary.phases['terminal']['elapsed']) == 100
+    assert stats['count'] == 1000
+    assert (stats['min'], stats['max']) == (0.0, 0.999)
+    assert abs(stats['mean'] - 0.4995) < 1e-9
+    # p95 of a uniform sample of 100
+    assert 0.85 < stats['p95'] < 1.0
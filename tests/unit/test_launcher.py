@@ -0,0 +1,82 @@
+'''
+unit test of metatrader.launcher
+'''
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from metatrader.exception import TerminalTimeout
+from metatrader.launcher import run_terminal
+
+
+def run_cmd(code, **kwargs):
+    return asyncio.run(run_terminal([sys.executable, '-c', code], **kwargs))
+
+
+def test_success_codes():
+    assert run_cmd('import sys; sys.exit(0)') == 0
+    assert run_cmd('import sys; sys.exit(3)') == 3
+
+
+def test_error_code_raises():
+    try:
+        run_cmd('import sys; sys.exit(1)')
+    except RuntimeError as e:
+        assert 'failed with 1 error code' in str(e)
+    else:
+        assert False, 'RuntimeError not raised'
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_timeout_kills_process_tree():
+    # the child spawns a grandchild which would keep running if only the child is killed
+    work_dir = tempfile.mkdtemp()
+    pid_file = os.path.join(work_dir, 'grandchild.pid')
+    grandchild = 'import os, time; open(%r, "w").write(str(os.getpid())); time.sleep(30)' % pid_file
+    code = ('import subprocess, sys, time; '
+            'subprocess.Popen([sys.executable, "-c", %r]); '
+            'time.sleep(30)' % grandchild)
+    try:
+        started = time.time()
+        try:
+            run_cmd(code, timeout=2)
+        except TerminalTimeout as e:
+            assert e.timeout == 2
+        else:
+            assert False, 'TerminalTimeout not raised'
+        assert time.time() - started < 10
+
+        with open(pid_file) as fp:
+            pid = int(fp.read())
+        deadline = time.time() + 5
+        while is_alive(pid) and time.time() < deadline:
+            time.sleep(0.05)
+        assert not is_alive(pid)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_cancel_kills_process():
+    async def cancel():
+        task = asyncio.ensure_future(run_terminal([sys.executable, '-c', 'import time; time.sleep(30)']))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    started = time.time()
+    assert asyncio.run(cancel())
+    assert time.time() - started < 10
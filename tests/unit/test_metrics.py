@@ -0,0 +1,77 @@
+'''
+unit test of metatrader.metrics
+'''
+import math
+
+import numpy as np
+
+from metatrader.deals import DealTable
+from metatrader.metrics import (compute, get_equity_curve, max_drawdown, rolling_drawdown, sharpe_ratio, stack,
+                                time_under_water)
+
+
+def python_metrics(equity):
+    # reference by plain loops
+    returns = [(b - a) / a for a, b in zip(equity[:-1], equity[1:])]
+    mean = sum(returns) / len(returns)
+    std = math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+    downside = math.sqrt(sum(min(r, 0.0) ** 2 for r in returns) / len(returns))
+
+    peak = equity[0]
+    rates = []
+    under_water = longest = 0
+    for value in equity:
+        peak = max(peak, value)
+        rates.append((peak - value) * 100.0 / peak)
+        under_water = under_water + 1 if value < peak else 0
+        longest = max(longest, under_water)
+    return {'sharpe_ratio': mean / std,
+            'sortino_ratio': mean / downside,
+            'max_drawdown': max(rates),
+            'ulcer_index': math.sqrt(sum(r ** 2 for r in rates) / len(rates)),
+            'time_under_water': longest}
+
+
+def test_metrics():
+    rnd = np.random.RandomState(0)
+    curves = [10000 + np.cumsum(rnd.normal(2, 30, size)) for size in (50, 200, 120)]
+    equity = stack(curves)
+    assert equity.shape == (3, 200)
+    assert np.isnan(equity[0, 50:]).all()
+
+    batched = compute(equity, years=np.array([1.0, 2.0, 0.5]))
+    for i, curve in enumerate(curves):
+        expected = python_metrics(list(curve))
+        single = compute(curve, years=[1.0, 2.0, 0.5][i])
+        for name, value in expected.items():
+            assert abs(batched[name][i] - value) < 1e-9 * max(1.0, abs(value)), name
+            assert abs(single[name] - value) < 1e-9 * max(1.0, abs(value)), name
+
+        growth = curve[-1] / curve[0]
+        annual = (growth ** (1.0 / [1.0, 2.0, 0.5][i]) - 1) * 100.0
+        assert abs(batched['annual_return'][i] - annual) < 1e-9
+        assert abs(batched['calmar_ratio'][i] - annual / expected['max_drawdown']) < 1e-9
+
+    rolling = rolling_drawdown(equity, 20)
+    assert rolling.shape == equity.shape
+    assert np.isnan(rolling[:, :19]).all()
+    for i, curve in enumerate(curves):
+        for end in (19, 30, len(curve) - 1):
+            window = list(curve[end - 19:end + 1])
+            assert abs(rolling[i, end] - python_metrics(window)['max_drawdown']) < 1e-9
+
+
+def test_metrics_of_deals():
+    texts = {'time': ['2018.01.01 00:00:00', '2018.01.02 00:00:00', '2018.01.03 00:00:00',
+                      '2018.01.05 00:00:00', '2018.01.06 00:00:00', '2018.01.09 00:00:00'],
+             'direction': ['', 'in', 'out', 'in', 'out', 'out'],
+             'balance': ['10000.00', '9999.50', '10100.00', '10099.50', '9900.00', '10200.00']}
+    deals = DealTable.from_texts(texts)
+    equity = get_equity_curve(deals)
+    assert list(equity) == [10000.0, 10100.0, 9900.0, 10200.0]
+    assert abs(max_drawdown(equity) - 200 * 100.0 / 10100) < 1e-9
+    assert time_under_water(equity) == 1
+
+    closing = deals.direction != 'in'
+    assert time_under_water(equity, time=deals.time[closing]) == 3.0
+    assert np.isnan(sharpe_ratio(np.array([10000.0, 10000.0, 10000.0])))
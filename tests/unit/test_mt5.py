@@ -0,0 +1,52 @@
+'''
+unit test of metatrader.mt5
+'''
+import codecs
+import os
+import shutil
+import tempfile
+
+from metatrader import mt5
+from tests.unit.test_farm import create_terminal
+
+
+def test_appdata_path_is_resolved_once():
+    root = tempfile.mkdtemp()
+    saved_appdata = os.environ.get('APPDATA')
+    try:
+        prog_path = os.path.join(root, 'Program Files', 'MT5')
+        os.makedirs(prog_path)
+        terminal_dir = os.path.join(root, 'AppData', 'MetaQuotes', 'Terminal')
+        data_dir = create_terminal(terminal_dir, '7269C010EA668AEAE793BEE37C26ED57')
+        with codecs.open(os.path.join(data_dir, mt5.ORIGIN_TXT), 'w', 'utf-16') as fp:
+            fp.write(prog_path)
+
+        os.environ['APPDATA'] = os.path.join(root, 'AppData')
+        mt5.invalidate_appdata_path()
+        mt5._uac_enabled = True
+
+        mt5.initialize(prog_path, alias='appdata')
+        assert mt5.get_mt5(alias='appdata').appdata_path == data_dir
+
+        # resolved path and index are kept even if the data dir is gone
+        os.remove(os.path.join(data_dir, mt5.ORIGIN_TXT))
+        assert mt5.get_mt5(alias='appdata').appdata_path == data_dir
+        assert mt5.get_appdata_path(prog_path) == data_dir
+
+        mt5.invalidate_appdata_path(alias='appdata')
+        mt5._uac_enabled = True
+        # origin.txt is gone, so it falls back to the program dir which has no mt5 sub dirs
+        try:
+            mt5.get_mt5(alias='appdata')
+        except IOError:
+            pass
+        else:
+            assert False, 'IOError not raised'
+    finally:
+        mt5._mt5s.pop('appdata', None)
+        mt5.invalidate_appdata_path()
+        if saved_appdata is None:
+            os.environ.pop('APPDATA', None)
+        else:
+            os.environ['APPDATA'] = saved_appdata
+        shutil.rmtree(root)
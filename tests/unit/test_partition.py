@@ -0,0 +1,66 @@
+'''
+unit test of metatrader.partition on fake terminals
+'''
+import shutil
+import tempfile
+
+from metatrader import mt5
+from metatrader.partition import PartitionedOptimization, split_param
+from metatrader.search import count_passes, get_param_axes
+from tests.unit.test_fake_terminal import initialize
+from tests.unit.test_farm import create_backtest
+
+
+def test_split_param():
+    param = {'Period': {'type': 'int', 'value': 2, 'max': 21, 'interval': 1},
+             'Risk': {'type': 'double', 'value': 0.01, 'max': 0.05, 'interval': 0.01},
+             'Reverse': {'type': 'bool', 'value': False, 'max': True, 'interval': 1}}
+
+    parts = split_param(param, 4)
+    assert len(parts) == 4
+    assert [(p['Period']['value'], p['Period']['max']) for p in parts] == [(2, 6), (7, 11), (12, 16), (17, 21)]
+    assert all(p['Risk'] == param['Risk'] and p['Reverse'] == param['Reverse'] for p in parts)
+
+    # largest axis has fewer values than partitions, so the next axis is split too
+    parts = split_param(param, 40)
+    assert len(parts) == 20 * 2
+    assert sum(count_passes(p) for p in parts) == count_passes(param)
+    candidates = set()
+    for part in parts:
+        axes = dict(get_param_axes(part))
+        candidates.update((period, risk) for period in axes['Period'] for risk in axes['Risk'])
+    assert len(candidates) == 20 * 5
+    assert param['Period']['value'] == 2
+
+    assert len(split_param({'Period': {'type': 'int', 'value': 2}}, 4)) == 1
+
+
+def test_partitioned_optimization():
+    root = tempfile.mkdtemp()
+    aliases = ['part-1', 'part-2', 'part-3']
+    try:
+        for alias in aliases:
+            initialize(root, alias)
+
+        backtest = create_backtest(2)
+        backtest.param['Period'].update({'max': 31, 'interval': 1})
+        backtest.param['Risk'] = {'type': 'double', 'value': 0.1, 'max': 0.3, 'interval': 0.1}
+
+        optimization = PartitionedOptimization(backtest, aliases=aliases)
+        assert optimization.passes == 30 * 3
+        assert len(optimization.get_backtests()) == 3
+        results = optimization.run()
+        assert not optimization.failed
+        assert len(results) == optimization.passes
+        assert len(set((r.param['Period'], r.param['Risk']) for r in results)) == optimization.passes
+
+        whole = backtest.optimize(alias=aliases[0])
+        expected = dict(((r.param['Period'], r.param['Risk']), r.profit) for r in whole.results)
+        assert dict(((r.param['Period'], r.param['Risk']), r.profit) for r in results) == expected
+
+        # more partitions than terminals run one after another on them
+        assert len(PartitionedOptimization(backtest, aliases=aliases[:2], partitions=5).run()) == 90
+    finally:
+        for alias in aliases:
+            mt5._mt5s.pop(alias, None)
+        shutil.rmtree(root)
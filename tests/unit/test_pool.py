@@ -0,0 +1,64 @@
+'''
+unit test of metatrader.pool
+'''
+import os
+import shutil
+import stat
+import tempfile
+
+from metatrader import mt5
+from metatrader.farm import BacktestFarm
+from metatrader.pool import TerminalPool
+from tests.unit.test_farm import create_terminal, create_backtest
+
+
+def test_pool_links_immutable_files():
+    root = tempfile.mkdtemp()
+    try:
+        install = create_terminal(root, 'install')
+        os.makedirs(os.path.join(install, 'Bases', 'Demo', 'history', 'USDJPY'))
+        history = os.path.join('Bases', 'Demo', 'history', 'USDJPY', '2018.hcc')
+        with open(os.path.join(install, history), 'wb') as fp:
+            fp.write(b'\0' * 4096)
+        with open(os.path.join(install, 'Tester', 'old.ini'), 'w') as fp:
+            fp.write('[Tester]\n')
+        # tick cache of tester is shared, log of agent is private
+        tick_cache = os.path.join('Tester', 'bases', 'Demo', 'ticks', 'USDJPY', '201801.tkc')
+        agent_log = os.path.join('Tester', 'Agent-127.0.0.1-3000', 'logs', '20180101.log')
+        for path in (tick_cache, agent_log):
+            os.makedirs(os.path.dirname(os.path.join(install, path)))
+            with open(os.path.join(install, path), 'wb') as fp:
+                fp.write(b'\0' * 4096)
+
+        os.chmod(os.path.join(install, tick_cache), 0o644)
+
+        pool = TerminalPool(install, os.path.join(root, 'pool'), 3, prefix='pool')
+        with pool:
+            assert pool.aliases == ['pool-1', 'pool-2', 'pool-3']
+            assert pool.copied == 6
+            for alias in pool.aliases:
+                clone = pool.get_clone_path(alias)
+                assert mt5.get_mt5(alias, portable_mode=True).appdata_path == clone
+                # immutable files share the inode with the install
+                assert os.path.samefile(os.path.join(clone, history), os.path.join(install, history))
+                assert os.path.samefile(os.path.join(clone, mt5.MT5_EXE), os.path.join(install, mt5.MT5_EXE))
+                assert not os.path.samefile(os.path.join(clone, 'Tester', 'old.ini'),
+                                            os.path.join(install, 'Tester', 'old.ini'))
+                assert not os.path.samefile(os.path.join(clone, agent_log), os.path.join(install, agent_log))
+                assert os.path.samefile(os.path.join(clone, tick_cache), os.path.join(install, tick_cache))
+                assert not os.stat(os.path.join(clone, tick_cache)).st_mode & stat.S_IWUSR
+            # the install shares the inode, so it is read only while the pool is used
+            assert stat.S_IMODE(os.stat(os.path.join(install, tick_cache)).st_mode) == 0o444
+
+            results = list(BacktestFarm(pool.aliases).run([create_backtest(period) for period in range(6)]))
+            assert all(result.succeeded for result in results)
+            # runs leave nothing in the install
+            assert sorted(os.listdir(os.path.join(install, 'Tester'))) == ['Agent-127.0.0.1-3000', 'bases', 'old.ini']
+
+        assert not os.path.exists(os.path.join(root, 'pool', 'pool-1'))
+        assert 'pool-1' not in mt5._mt5s
+        assert os.path.isfile(os.path.join(install, history))
+        # mode of the install is restored
+        assert stat.S_IMODE(os.stat(os.path.join(install, tick_cache)).st_mode) == 0o644
+    finally:
+        shutil.rmtree(root)
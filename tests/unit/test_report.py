@@ -0,0 +1,263 @@
+'''
+unit test of metatrader.report with synthetic reports
+'''
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from metatrader.backtest import BackTest
+from metatrader.exception import InvalidReportFormat
+from metatrader.report import OptimizationReport
+from tests.assets.report_generator import optimization_report
+
+
+def create_backtest():
+    return BackTest('Moving Average', {}, 1234, 'USDJPY', 'M5',
+                    datetime(2014, 9, 1), datetime(2015, 1, 1), 10000, 'USD', 100)
+
+
+def write_report(html):
+    work_dir = tempfile.mkdtemp()
+    report_file = os.path.join(work_dir, 'Moving Average.htm')
+    with open(report_file, 'w') as fp:
+        fp.write(html)
+    return work_dir, report_file
+
+
+def test_optimization_report():
+    work_dir, report_file = write_report(optimization_report(120))
+    try:
+        report = OptimizationReport(create_backtest(), report_file=report_file)
+
+        assert len(report.results) == 120
+        assert report.profitable_sets == len([r for r in report.results if r.profit > 0])
+        first = report.results[0]
+        assert first.param == {'MovingPeriod': '2', 'MovingShift': '0', 'MaximumRisk': '0.01'}
+        assert first.initial_deposit == 10000.0
+        assert isinstance(first.total_trades, int)
+        assert report.results[51].param['MovingShift'] == '1'
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_invalid_optimization_report():
+    work_dir, report_file = write_report(optimization_report(1).replace('Optimization Report', 'Strategy Tester Report'))
+    try:
+        OptimizationReport(create_backtest(), report_file=report_file)
+    except InvalidReportFormat:
+        pass
+    else:
+        assert False, 'InvalidReportFormat not raised'
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_iter_results_streams_passes():
+    work_dir, report_file = write_report(optimization_report(300))
+    try:
+        backtest = create_backtest()
+        passes = OptimizationReport.iter_results(backtest, report_file=report_file)
+        assert not isinstance(passes, list)
+
+        profitable = [p.profit for p in passes if p.profit > 0]
+        report = OptimizationReport(backtest, report_file=report_file)
+        assert profitable == [r.profit for r in report.results if r.profit > 0]
+        assert len(profitable) == report.profitable_sets
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_optimization_result_table():
+    import numpy as np
+    from metatrader.table import OptimizationResultTable
+
+    work_dir, report_file = write_report(optimization_report(500))
+    try:
+        backtest = create_backtest()
+        results = OptimizationReport(backtest, report_file=report_file).results
+        table = OptimizationResultTable.from_report(backtest, report_file=report_file)
+
+        assert len(table) == 500
+        assert table.params['MovingPeriod'].dtype.kind == 'i'
+        assert table.params['MaximumRisk'].dtype.kind == 'f'
+        assert table.total_trades.dtype.kind == 'i'
+
+        profitable = table.filter(table.profit > 0)
+        assert len(profitable) == len([r for r in results if r.profit > 0])
+
+        best = table.top(5, 'profit_factor')
+        expected = sorted((r.profit_factor for r in results), reverse=True)[:5]
+        assert list(best.profit_factor) == expected
+        assert best.row(0).profit_factor == expected[0]
+        assert list(table.sort('profit').profit) == sorted(r.profit for r in results)
+
+        keys, counts = table.groupby('MovingShift', func='count')
+        assert list(keys) == list(range(10)) and all(counts == 50)
+        keys, means = table.groupby('MovingShift', 'profit')
+        shift0 = [r.profit for r in results if r.param['MovingShift'] == '0']
+        assert abs(means[0] - sum(shift0) / len(shift0)) < 1e-9
+    finally:
+        shutil.rmtree(work_dir)
+
+    # xml report without Trades column
+    xml = ['<Workbook><DocumentProperties><Deposit>10000 USD</Deposit></DocumentProperties><Table>',
+           '<Row><Cell><Data>Pass</Data></Cell><Cell><Data>Profit</Data></Cell><Cell><Data>Period</Data></Cell></Row>']
+    for period in range(5):
+        xml.append('<Row><Cell><Data>%d</Data></Cell><Cell><Data>%d.5</Data></Cell><Cell><Data>%d</Data></Cell></Row>'
+                   % (period, period, period))
+    xml.append('</Table></Workbook>')
+    work_dir, report_file = write_report('\n'.join(xml))
+    try:
+        xml_file = report_file[:-len('.htm')] + '.xml'
+        os.rename(report_file, xml_file)
+        table = OptimizationResultTable.from_report(create_backtest(), report_file=xml_file)
+        assert len(table) == 5
+        assert table.total_trades.dtype.kind == 'f' and np.isnan(table.total_trades).all()
+        best = table.top(1, 'profit').row(0)
+        assert (best.profit, best.total_trades, best.param) == (4.5, None, {'Period': 4})
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_xml_optimization_report():
+    from metatrader.report import XmlOptimizationReport
+    from tests.assets.report_generator import xml_optimization_report
+
+    work_dir, report_file = write_report(xml_optimization_report(200, initial_deposit=5000))
+    try:
+        report = XmlOptimizationReport(create_backtest(), report_file=report_file)
+
+        assert len(report.results) == 200
+        first = report.results[0]
+        assert first.pass_number == 0
+        assert first.initial_deposit == 5000
+        assert first.param == {'MovingPeriod': '2', 'MaximumRisk': '0.01'}
+        assert isinstance(first.total_trades, int)
+        assert abs(first.result - (5000 + first.profit)) < 1e-6
+        assert first.max_drawdown is None
+        assert report.profitable_sets == len([r for r in report.results if r.profit > 0])
+    finally:
+        shutil.rmtree(work_dir)
+
+    # header without Profit column
+    xml = xml_optimization_report(2).replace('>Profit<', '>Gain<')
+    work_dir, report_file = write_report(xml)
+    try:
+        XmlOptimizationReport(create_backtest(), report_file=report_file)
+    except InvalidReportFormat:
+        pass
+    else:
+        assert False, 'InvalidReportFormat not raised'
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_genetic_optimization_conf():
+    from metatrader.backtest import OPTIMIZATION_FAST_GENETIC, CRITERION_CUSTOM
+
+    backtest = create_backtest()
+    backtest.optimization = True
+    backtest.optimization_mode = OPTIMIZATION_FAST_GENETIC
+    backtest.optimization_criterion = CRITERION_CUSTOM
+    conf = backtest._get_conf()
+    assert 'Optimization=2\n' in conf
+    assert 'OptimizationCriterion=6\n' in conf
+
+    backtest.optimization = False
+    assert 'Optimization=0\n' in backtest._get_conf()
+
+
+def test_backtest_report():
+    from metatrader import mt5
+    from metatrader.report import BacktestReport
+    from tests.assets.report_generator import iter_backtest_report, iter_deals, write_report
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        for sub_dir in ['Profiles', 'Tester', os.path.join('MQL5', 'Experts'), os.path.join('MQL5', 'Libraries')]:
+            os.makedirs(os.path.join(work_dir, sub_dir))
+        mt5.initialize(work_dir, portable_mode=True, alias='report')
+        backtest = create_backtest()
+        backtest.run_name = 'Moving Average_0'
+        write_report(os.path.join(work_dir, 'Moving Average_0.htm'), iter_backtest_report(201))
+
+        report = BacktestReport(backtest, alias='report')
+        profits = [deal[9] for deal in iter_deals(201) if deal[3] == 'out']
+        assert report.initial_deposit == 10000.0
+        assert report.total_trades == len(profits) == 100
+        assert abs(report.profit - sum(profits)) < 0.01
+        assert report.profit_trades == len([p for p in profits if p > 0])
+        assert report.largest_loss_trade == min(profits)
+        assert report.max_drawdown > 0
+    finally:
+        mt5._mt5s.pop('report', None)
+        shutil.rmtree(work_dir)
+
+
+def test_backtest_report_deals():
+    import numpy as np
+    from metatrader import mt5
+    from metatrader.report import BacktestReport
+    from tests.assets.report_generator import iter_backtest_report, iter_deals, write_report
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        for sub_dir in ['Profiles', 'Tester', os.path.join('MQL5', 'Experts'), os.path.join('MQL5', 'Libraries')]:
+            os.makedirs(os.path.join(work_dir, sub_dir))
+        mt5.initialize(work_dir, portable_mode=True, alias='report')
+        backtest = create_backtest()
+        backtest.run_name = 'Moving Average_0'
+        write_report(os.path.join(work_dir, 'Moving Average_0.htm'), iter_backtest_report(51))
+        expected = list(iter_deals(51))
+
+        for lazy_deals in (False, True):
+            report = BacktestReport(backtest, alias='report', lazy_deals=lazy_deals)
+            assert report.initial_deposit == 10000.0
+            assert (report._deals is None) == lazy_deals
+
+            deals = report.deals
+            assert len(deals) == 51
+            assert deals.time[0] == np.datetime64('2018-01-01T00:00:00')
+            assert deals.time[-1] == np.datetime64(expected[-1][0].strftime('%Y-%m-%dT%H:%M:%S'))
+            assert list(deals.type) == [deal[2] for deal in expected]
+            assert list(deals.direction) == [deal[3] for deal in expected]
+            assert np.isnan(deals.volume[0]) and np.isnan(deals.price[0])
+            assert np.allclose(deals.volume[1:], [deal[4] for deal in expected[1:]])
+            assert np.allclose(deals.commission, [deal[7] for deal in expected])
+            assert np.allclose(deals.profit, [deal[9] for deal in expected])
+            assert np.allclose(deals.balance, [deal[10] for deal in expected])
+            closed = deals.direction == 'out'
+            assert abs(deals.profit[closed].sum() - report.profit) < 0.01
+    finally:
+        mt5._mt5s.pop('report', None)
+        shutil.rmtree(work_dir)
+
+
+def test_lazy_backtest_report():
+    import pickle
+    from metatrader.report import BacktestReport
+    from tests.assets.report_generator import iter_backtest_report, iter_deals, write_report
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        report_file = os.path.join(work_dir, 'Moving Average.htm')
+        write_report(report_file, iter_backtest_report(301))
+        eager = BacktestReport(create_backtest(), report_file=report_file)
+
+        report = BacktestReport(create_backtest(), report_file=report_file, lazy=True)
+        assert report._labels is None
+        assert report.profit == eager.profit
+        # only the values of the label read are decoded
+        assert 'profit' in report.__dict__
+        assert 'max_drawdown' not in report.__dict__
+        assert (report.max_drawdown, report.max_drawdown_rate) == (eager.max_drawdown, eager.max_drawdown_rate)
+        assert report.largest_loss_trade == eager.largest_loss_trade
+        assert report.abs_drawdown_rate is None
+
+        restored = pickle.loads(pickle.dumps(report))
+        assert restored.total_trades == eager.total_trades
+        assert len(restored.deals) == len(list(iter_deals(301)))
+        assert list(report.deals.balance) == list(eager.deals.balance)
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,100 @@
+'''
+unit test of metatrader.scheduler
+'''
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from metatrader import mt5
+from metatrader.backtest import OPTIMIZATION_FAST_GENETIC
+from metatrader.farm import BacktestFarm
+from metatrader.scheduler import CostModel, get_days, order_jobs, predict_makespan
+from tests.unit.test_fake_terminal import initialize
+from tests.unit.test_farm import create_backtest
+
+
+def create_job(days, model=0, symbol='USDJPY'):
+    backtest = create_backtest(days)
+    backtest.symbol = symbol
+    backtest.model = model
+    backtest.to_date = backtest.from_date + timedelta(days=days - 1)
+    return backtest
+
+
+def test_cost_model():
+    work_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work_dir, 'costs.json')
+        cost_model = CostModel(path, min_seconds=0.5)
+        assert cost_model.predict(create_job(10)) == 10.0
+
+        cost_model.observe(create_job(10), 20.0)
+        cost_model.observe(create_job(30), 40.0)
+        cost_model.observe(create_job(10, model=2), 1.0)
+        cost_model.observe(create_job(10, model=2), 0.1)
+        assert cost_model.predict(create_job(100)) == 150.0
+        assert cost_model.predict(create_job(100, model=2)) == 10.0
+        # unknown symbol falls back to the same model
+        assert cost_model.predict(create_job(100, model=2, symbol='EURUSD')) == 10.0
+
+        optimization = create_job(10)
+        optimization.optimization = True
+        optimization.param['Period'].update({'max': 13, 'interval': 1})
+        assert cost_model.predict(optimization) == 4 * 15.0
+
+        # genetic optimization runs a part of passes and is not learned
+        genetic = create_job(10, model=3)
+        genetic.optimization = True
+        genetic.optimization_mode = OPTIMIZATION_FAST_GENETIC
+        genetic.param['Period'].update({'max': 13, 'interval': 1})
+        cost_model.observe(genetic, 10.0)
+        assert not [key for key in cost_model.costs if key[3] == '3']
+
+        cost_model.save()
+        assert CostModel(path).costs == cost_model.costs
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_predict_makespan():
+    cost_model = CostModel()
+    jobs = [create_job(days) for days in (3, 3, 2, 2, 2)]
+    assert [get_days(job) for job in order_jobs(jobs, cost_model)][:2] == [3, 3]
+    makespan, loads = predict_makespan(jobs, 2, cost_model)
+    # longest first gives 3+2+2 and 3+2
+    assert makespan == 7.0
+    assert sorted(loads) == [5.0, 7.0]
+    assert predict_makespan(jobs, 10, cost_model)[0] == 3.0
+
+
+def test_farm_with_cost_model():
+    root = tempfile.mkdtemp()
+    aliases = ['cost-1', 'cost-2']
+    try:
+        for alias in aliases:
+            initialize(root, alias, seconds_per_day=0.004)
+        cost_model = CostModel(min_seconds=0.0)
+        farm = BacktestFarm(aliases, cost_model=cost_model)
+
+        warmup = [create_job(20), create_job(40)]
+        list(farm.run(warmup))
+        assert len(cost_model.costs) == 1
+        seconds_per_day = cost_model.seconds_per_day(warmup[0])
+        assert 0.004 <= seconds_per_day < 0.1
+
+        jobs = [create_job(days) for days in (10, 80, 20, 60, 10)]
+        predicted = farm.predict_makespan(jobs)
+        assert abs(predicted - 90 * seconds_per_day) < 1e-9
+        started = datetime.now()
+        results = list(farm.run(jobs))
+        assert farm.completed == 5
+        assert (datetime.now() - started).total_seconds() >= 80 * 0.004
+
+        # one terminal completes jobs in order of dispatch, longest first
+        single = BacktestFarm(aliases[:1], cost_model=cost_model)
+        assert [get_days(r.backtest) for r in single.run(jobs)] == [80, 60, 20, 10, 10]
+    finally:
+        for alias in aliases:
+            mt5._mt5s.pop(alias, None)
+        shutil.rmtree(root)
@@ -0,0 +1,71 @@
+'''
+unit test of metatrader.screening
+'''
+import shutil
+import tempfile
+from datetime import datetime
+
+from metatrader import mt5
+from metatrader.backtest import MODEL_EVERY_TICK, MODEL_MATH, MODEL_OHLC_M1, MODEL_OPEN_PRICES, MODEL_REAL_TICKS
+from metatrader.screening import Rung, SuccessiveHalving, get_models, get_rungs
+from tests.unit.test_farm import create_terminal, create_backtest
+
+
+def test_rungs():
+    # 2018-01-01..2018-02-01 is 32 days
+    backtest = create_backtest(0)
+    rungs = get_rungs(backtest)
+    assert [rung.model for rung in rungs] == [MODEL_OPEN_PRICES, MODEL_OHLC_M1, MODEL_REAL_TICKS]
+    assert [rung.from_date for rung in rungs] == [datetime(2018, 1, 26), datetime(2018, 1, 22), datetime(2018, 1, 1)]
+
+    rungs = get_rungs(backtest, models=(MODEL_OPEN_PRICES, MODEL_REAL_TICKS), eta=2, min_days=1)
+    assert [rung.from_date for rung in rungs] == [datetime(2018, 1, 17), datetime(2018, 1, 1)]
+
+    # no rung is more expensive than the backtest itself
+    backtest.model = MODEL_EVERY_TICK
+    assert get_models(backtest) == (MODEL_OPEN_PRICES, MODEL_OHLC_M1, MODEL_EVERY_TICK)
+    backtest.model = MODEL_OHLC_M1
+    assert get_models(backtest) == (MODEL_OPEN_PRICES, MODEL_OHLC_M1, MODEL_OHLC_M1)
+    backtest.model = MODEL_MATH
+    assert get_models(backtest) == (MODEL_MATH, MODEL_MATH, MODEL_MATH)
+    backtest.model = MODEL_OPEN_PRICES
+    assert [rung.model for rung in get_rungs(backtest)] == [MODEL_OPEN_PRICES] * 3
+
+
+def test_screening_on_farm():
+    root = tempfile.mkdtemp()
+    try:
+        mt5.initialize(create_terminal(root, 'screening'), portable_mode=True, alias='screening')
+        backtest = create_backtest(0)
+        backtest.param['Period'].update({'max': 26, 'interval': 1})
+
+        screening = SuccessiveHalving(backtest, aliases=['screening'] * 3, eta=3)
+        evaluations = screening.run()
+        assert [len(ranked) for ranked in screening.history] == [27, 9, 3]
+        assert [evaluation.candidate['Period'] for evaluation in evaluations] == [26, 25, 24]
+        assert screening.best.candidate == {'Period': 26}
+        assert screening.best.param['Period'] == {'type': 'int', 'value': 26}
+        assert screening.backtests == 39
+        assert screening.units == 27 * 7 + 9 * 11 + 3 * 32
+        assert screening.full_units == 27 * 32
+
+        last = screening.get_backtest(screening.best.candidate, screening.rungs[-1])
+        assert last.model == backtest.model
+        assert (last.from_date, last.to_date) == (backtest.from_date, backtest.to_date)
+
+        backtest.model = MODEL_EVERY_TICK
+        screening = SuccessiveHalving(backtest, aliases=['screening'] * 3, eta=3)
+        assert [rung.model for rung in screening.rungs] == [MODEL_OPEN_PRICES, MODEL_OHLC_M1, MODEL_EVERY_TICK]
+        assert screening.run()[0].candidate == {'Period': 26}
+        last = screening.get_backtest(screening.best.candidate, screening.rungs[-1])
+        assert last.model == MODEL_EVERY_TICK
+
+        rungs = [Rung(MODEL_OPEN_PRICES, datetime(2018, 1, 20)), Rung(MODEL_REAL_TICKS, backtest.from_date)]
+        screening = SuccessiveHalving(backtest, aliases=['screening'] * 2, rungs=rungs, eta=4, maximize=False,
+                                      min_survivors=10)
+        evaluations = screening.run()
+        assert [len(ranked) for ranked in screening.history] == [27, 10]
+        assert screening.best.candidate == {'Period': 0}
+    finally:
+        mt5._mt5s.pop('screening', None)
+        shutil.rmtree(root)
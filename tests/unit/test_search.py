@@ -0,0 +1,61 @@
+'''
+unit test of metatrader.search
+'''
+import shutil
+import tempfile
+
+from metatrader import mt5
+from metatrader.search import ParameterSearch, TPESearch, count_passes, fix_param, get_param_values
+from tests.unit.test_farm import create_terminal, create_backtest
+
+
+def test_param_values():
+    assert get_param_values({'type': 'int', 'value': 2, 'max': 10, 'interval': 4}) == [2, 6, 10]
+    assert get_param_values({'type': 'double', 'value': 0.02, 'max': 0.2, 'interval': 0.06}) == [0.02, 0.08, 0.14, 0.2]
+    assert get_param_values({'type': 'bool', 'value': False, 'max': True, 'interval': 1}) == [False, True]
+
+    param = {'A': {'type': 'int', 'value': 1, 'max': 3, 'interval': 1},
+             'B': {'type': 'bool', 'value': True, 'max': True, 'interval': 1},
+             'C': {'type': 'int', 'value': 7}}
+    assert count_passes(param) == 6
+    assert fix_param(param, {'A': 2, 'B': False}) == {'A': {'type': 'int', 'value': 2},
+                                                      'B': {'type': 'bool', 'value': False},
+                                                      'C': {'type': 'int', 'value': 7}}
+
+
+def test_tpe_finds_maximum():
+    axes = [('x', list(range(50))), ('y', list(range(50)))]
+    tpe = TPESearch(axes, seed=1)
+    best = None
+    for _ in range(80):
+        candidate = tpe.suggest()
+        score = -((candidate['x'] - 30) ** 2 + (candidate['y'] - 12) ** 2)
+        tpe.observe(candidate, score)
+        best = score if best is None else max(best, score)
+    # random search over 2500 points would rarely get this close in 80 trials
+    assert best >= -20
+
+
+def test_search_on_farm():
+    root = tempfile.mkdtemp()
+    try:
+        mt5.initialize(create_terminal(root, 'search'), portable_mode=True, alias='search')
+        backtest = create_backtest(0)
+        backtest.param['Period'].update({'max': 20, 'interval': 1})
+
+        search = ParameterSearch(backtest, aliases=['search'] * 3, strategy='grid')
+        evaluations = list(search.run())
+        assert len(evaluations) == 21
+        assert search.best.candidate == {'Period': 20}
+        assert search.best.param['Period'] == {'type': 'int', 'value': 20}
+
+        search = ParameterSearch(backtest, aliases=['search'] * 3, strategy='random', budget=5, seed=0)
+        assert len(list(search.run())) == 5
+
+        # profit decreases along the grid when minimized, so patience stops the search.
+        # the worker may pull one more job before the 4th result is observed
+        search = ParameterSearch(backtest, aliases=['search'], strategy='grid', maximize=False, patience=3)
+        assert 4 <= len(list(search.run())) <= 5
+    finally:
+        mt5._mt5s.pop('search', None)
+        shutil.rmtree(root)
@@ -0,0 +1,101 @@
+'''
+unit test of metatrader.store
+'''
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from metatrader import mt5
+from metatrader.backtest import BackTest
+from metatrader.report import OptimizationReport
+from metatrader.search import ParameterSearch
+from metatrader.store import PassStore, get_param_hash, get_run_key
+from tests.assets.report_generator import optimization_report
+from tests.unit.test_farm import create_terminal, create_backtest
+
+
+def test_param_hash_is_canonical():
+    backtest = create_backtest(12)
+    backtest.param['Risk'] = {'type': 'double', 'value': 0.1}
+    backtest.param['Trail'] = {'type': 'bool', 'value': True}
+
+    expected = get_param_hash(backtest)
+    assert get_param_hash(backtest, {'Period': '12', 'Risk': '0.10', 'Trail': 'true'}) == expected
+    assert get_param_hash(backtest, {'Period': 12.0, 'Unknown': 1}) == expected
+    assert get_param_hash(backtest, {'Period': 13}) != expected
+
+    other = create_backtest(12)
+    other.symbol = 'EURUSD'
+    assert get_run_key(other) != get_run_key(backtest)
+
+
+def test_store_optimization_report():
+    work_dir = tempfile.mkdtemp()
+    try:
+        report_file = os.path.join(work_dir, 'Moving Average.htm')
+        with open(report_file, 'w') as fp:
+            fp.write(optimization_report(300))
+        backtest = BackTest('Moving Average', {}, 1234, 'USDJPY', 'M5',
+                            datetime(2014, 9, 1), datetime(2015, 1, 1), 10000, 'USD', 100)
+        results = OptimizationReport(backtest, report_file=report_file).results
+
+        with PassStore(os.path.join(work_dir, 'passes.sqlite')) as store:
+            assert store.put_results(backtest, results, batch_size=64) == 300
+            # same passes replace stored ones
+            store.put_results(backtest, results[:10])
+            assert store.count(backtest) == 300
+
+        with PassStore(os.path.join(work_dir, 'passes.sqlite')) as store:
+            best = store.query(backtest, where='max_drawdown_rate < ?', args=(10,), order_by='profit_factor', limit=1)
+            expected = max([r for r in results if r.max_drawdown_rate < 10], key=lambda r: r.profit_factor)
+            assert best[0].profit_factor == expected.profit_factor
+            assert best[0].param == {'MovingPeriod': expected.param['MovingPeriod'],
+                                     'MovingShift': expected.param['MovingShift'],
+                                     'MaximumRisk': expected.param['MaximumRisk']}
+
+            stored = store.get(backtest, results[7].param)
+            assert stored.total_trades == results[7].total_trades
+            assert store.get(backtest, {'MovingPeriod': '999'}) is None
+
+        def broken_stream():
+            for i, result in enumerate(OptimizationReport.iter_results(backtest, report_file=report_file)):
+                if i == 100:
+                    raise IOError('report is truncated')
+                yield result
+
+        # committed batches of a stream are kept when reading fails
+        with PassStore(os.path.join(work_dir, 'streamed.sqlite')) as store:
+            try:
+                store.put_results(backtest, broken_stream(), batch_size=64)
+            except IOError:
+                pass
+            assert store.count(backtest) == 64
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_search_resumes_from_store():
+    root = tempfile.mkdtemp()
+    try:
+        mt5.initialize(create_terminal(root, 'store'), portable_mode=True, alias='store')
+        backtest = create_backtest(0)
+        backtest.param['Period'].update({'max': 9, 'interval': 1})
+        store = PassStore(os.path.join(root, 'passes.sqlite'))
+
+        # interrupted after 4 backtests
+        search = ParameterSearch(backtest, aliases=['store'], strategy='grid', budget=4, store=store)
+        assert len(list(search.run())) == 4
+        assert store.count(backtest) == 4
+
+        search = ParameterSearch(backtest, aliases=['store'] * 2, strategy='grid', store=store)
+        evaluations = list(search.run())
+        assert search.restored == 4
+        assert len(evaluations) == 6
+        assert len(search.evaluations) == 10
+        assert search.best.candidate == {'Period': 9}
+        assert store.count(backtest) == 10
+        store.close()
+    finally:
+        mt5._mt5s.pop('store', None)
+        shutil.rmtree(root)
@@ -0,0 +1,58 @@
+'''
+unit test of metatrader.walkforward with a stand-in terminal64.exe
+'''
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from metatrader import mt5
+from metatrader.walkforward import WalkForward, get_windows
+from tests.unit.test_farm import create_terminal, create_backtest
+
+
+def test_windows():
+    start = datetime(2018, 1, 1)
+    rolling = get_windows(start, datetime(2018, 7, 1), timedelta(days=60), timedelta(days=30))
+    assert len(rolling) == 4
+    assert rolling[0] == (start, start + timedelta(days=60), start + timedelta(days=90))
+    assert rolling[1][0] == start + timedelta(days=30)
+    # out-of-sample spans are back to back
+    for (_, _, end), (_, begin, _) in zip(rolling, rolling[1:]):
+        assert end == begin
+
+    anchored = get_windows(start, datetime(2018, 7, 1), timedelta(days=60), timedelta(days=30), anchored=True)
+    assert [w[0] for w in anchored] == [start] * 4
+    assert [w[1:] for w in anchored] == [w[1:] for w in rolling]
+
+
+def test_walk_forward():
+    root = tempfile.mkdtemp()
+    aliases = ['wf-1', 'wf-2']
+    try:
+        for alias in aliases:
+            mt5.initialize(create_terminal(root, alias), portable_mode=True, alias=alias)
+
+        backtest = create_backtest(2)
+        backtest.param['Period'].update({'max': 9, 'interval': 1})
+        backtest.from_date = datetime(2018, 1, 1)
+        backtest.to_date = datetime(2018, 7, 1)
+
+        walk_forward = WalkForward(backtest, timedelta(days=60), timedelta(days=30), aliases=aliases)
+        windows = walk_forward.run()
+
+        assert len(windows) == 4
+        for window in windows:
+            assert window.succeeded
+            assert window.best.param['Period'] == '9'
+            assert window.validation.profit == 9
+            # same profit in half the days
+            assert abs(window.efficiency - 2.0) < 1e-9
+        assert walk_forward.out_of_sample_profit == 36
+        assert walk_forward.profitable_rate == 1.0
+
+        walk_forward = WalkForward(backtest, timedelta(days=60), timedelta(days=30), aliases=aliases, maximize=False)
+        assert [w.validation.profit for w in walk_forward.run()] == [2] * 4
+    finally:
+        for alias in aliases:
+            mt5._mt5s.pop(alias, None)
+        shutil.rmtree(root)